@@ -10,6 +10,7 @@ class SlurpitConfig(PluginConfig):
     description = "Sync Slurp'it into NetBox"
     version = '0.9.84'
     base_url = "slurpit"   
+    middleware = ['slurpit_netbox.middleware.SlurpitLogMiddleware']
     default_settings = {
         'DeviceType': {'model': "Slurp'it", 'slug': 'slurpit'},
         'DeviceRole': {'name': "Slurp'it", 'slug': 'slurpit'},
@@ -21,11 +22,13 @@ class SlurpitConfig(PluginConfig):
         'ConfigTemplate': {'name': 'Slurp\'it'},
         'Manufacturer': {'name': 'OEM', 'slug': 'oem'},
         'unattended_import': False,
+        'job_timeout': 3600,
         'version': version
     }
 
     def ready(self):
         from .models import post_migration
+        from . import signals
         deps_app = apps.get_app_config("virtualization")
         post_migrate.connect(post_migration, sender=deps_app, weak=False)
         super().ready()
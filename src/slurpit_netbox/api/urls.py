@@ -6,6 +6,7 @@ router.APIRootView = views.SlurpitRootView
 router.register("planning", views.SlurpitPlanningViewSet)
 router.register("planning-data", views.SlurpitSnapshotViewSet)
 router.register("device", views.DeviceViewSet)
+router.register("job", views.SlurpitJobView, basename="job")
 router.register("test", views.SlurpitTestAPIView, basename="test")
 router.register("netbox-device", views.SlurpitDeviceView)
 router.register("ipam", views.SlurpitIPAMView)
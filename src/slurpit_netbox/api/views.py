@@ -1,5 +1,7 @@
 import json
+import netaddr
 from datetime import timedelta
+from functools import lru_cache
 
 from rest_framework.routers import APIRootView
 from rest_framework_bulk import BulkCreateModelMixin, BulkDestroyModelMixin
@@ -7,14 +9,16 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
-from rest_framework import status, mixins
+from rest_framework import status, mixins, viewsets
 
 from django.db import transaction
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.contenttypes.models import ContentType
 from django.forms.models import model_to_dict
 from django.utils import timezone
-from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.db.models import Model, Q
+from django.core.exceptions import ValidationError
 from django.core.serializers import serialize
 
 from .serializers import (
@@ -33,9 +37,11 @@ from ..validator import (
     prefix_validator,
     vlan_validator
 )
-from ..importer import process_import, import_devices, import_plannings, start_device_import, BATCH_SIZE
+from ..importer import process_import, import_devices, import_plannings, start_device_import, get_device_watermark, get_snapshot_cache_key, save_snapshots, BATCH_SIZE
+from ..jobs import enqueue_job, get_job_status, process_import_job, process_delta_job, import_plannings_job, refresh_planning_snapshots_job
+from ..reconcile import content_hash, field_values, mark_reconcile_rows_stale, save_reconcile_rows
 from ..management.choices import *
-from ..views.datamapping import get_device_dict
+from ..views.datamapping import get_device_lookups, get_values_fields, map_device_values
 from ..references import base_name 
 from ..references.generic import status_offline, SlurpitViewSet, status_decommissioning
 from ..references.imports import * 
@@ -56,12 +62,11 @@ from ..views.setting import sync_snapshot
 from ipam.models import (
     FHRPGroup, VRF, IPAddress, VLAN, Role, Prefix, VLANGroup
 )
-from dcim.models import Interface, Site
-from dcim.forms import InterfaceForm
-from ipam.forms import (
-    IPAddressForm, PrefixForm, VLANForm
-)
+from dcim.models import Interface, Module, Site
 from tenancy.models import Tenant
+from ipam.constants import IPADDRESS_ROLES_NONUNIQUE
+from netbox.config import get_config as get_netbox_config
+from netbox.search.backends import search_backend
 from django.core.cache import cache
 
 __all__ = (
@@ -119,8 +124,16 @@ class SlurpitPlanningViewSet(
     def sync(self, request):
         if not isinstance(request.data, list):
             return Response("Should be a list", status=status.HTTP_400_BAD_REQUEST)
-        import_plannings(request.data)
-        return JsonResponse({'status': 'success'})
+        job_id = enqueue_job(import_plannings_job, request.data, name='import_plannings')
+        return JsonResponse({'status': 'success', 'job_id': job_id})
+    
+    @action(detail=False, methods=['post'],  url_path=r'refresh/(?P<planning_id>\d+)')
+    def refresh(self, request, *args, **kwargs):
+        planning_id = int(kwargs['planning_id'])
+        if not SlurpitPlanning.objects.filter(planning_id=planning_id).exists():
+            return Response(f"Unknown planning id {planning_id}", status=status.HTTP_400_BAD_REQUEST)
+        job_id = enqueue_job(refresh_planning_snapshots_job, planning_id, name=f'refresh_snapshots_{planning_id}', unique=True)
+        return JsonResponse({'status': 'success', 'job_id': job_id})
     
     def create(self, request):
         if not isinstance(request.data, list):
@@ -149,14 +162,10 @@ class SlurpitSnapshotViewSet(
         if not hostname:
             return Response(f"No hostname was given", status=status.HTTP_400_BAD_REQUEST)
 
-        cache_key1 = (
-                f"slurpit_plan_{planning_id}_{hostname}_template"
-            )
-        cache_key2 = (
-                f"slurpit_plan_{planning_id}_{hostname}_planning"
-            )
-        cache.delete(cache_key1)
-        cache.delete(cache_key2)
+        cache.delete_many([
+            get_snapshot_cache_key(planning_id, hostname, 'template'),
+            get_snapshot_cache_key(planning_id, hostname, 'planning'),
+        ])
         
         count = SlurpitSnapshot.objects.filter(hostname=hostname, planning_id=planning_id).delete()[0]
         SlurpitLog.info(category=LogCategoryChoices.PLANNING, message=f"Api deleted all {count} snapshots for planning {planning.name} and hostname {hostname}")
@@ -176,28 +185,23 @@ class SlurpitSnapshotViewSet(
     def create(self, request):
 
         try:
-            items = []
+            results = {}
             for record in request.data:
-                if record['content']['template_result']:
-                    items.append(SlurpitSnapshot(
-                        hostname=record['hostname'], 
-                        planning_id=record['planning_id'],
-                        content=record['content']['template_result'], 
-                        result_type="template_result"))
-                
-                if record['content']['planning_result']:
-                    items.append(SlurpitSnapshot(
-                        hostname=record['hostname'], 
-                        planning_id=record['planning_id'],
-                        content=record['content']['planning_result'], 
-                        result_type="planning_result"))
-            
-            SlurpitSnapshot.objects.bulk_create(items, batch_size=BATCH_SIZE, ignore_conflicts=True)
-            SlurpitLog.info(category=LogCategoryChoices.PLANNING, message=f"Created {len(items)} snapshots for Planning by API")
-
-            
-        except:
-            return JsonResponse({'status': 'error'}, status=500)
+                for result_type in ('template_result', 'planning_result'):
+                    if row := record['content'][result_type]:
+                        if not isinstance(row, dict):
+                            raise TypeError(result_type)
+                        key = (record['hostname'], int(record['planning_id']), result_type)
+                        results.setdefault(key, []).append(row)
+        except (KeyError, TypeError, ValueError):
+            return JsonResponse({'status': 'error', 'errors': ['Should be a list of snapshots with hostname, planning_id and content']}, status=status.HTTP_400_BAD_REQUEST)
+
+        # The rows are added to the packed snapshot of their device, Slurp'it can push a device's results in parts
+        count = sum(len(rows) for rows in results.values())
+        save_snapshots(results, replace=False)
+        for hostname, planning_id, result_type in results:
+            cache.delete(get_snapshot_cache_key(planning_id, hostname, result_type))
+        SlurpitLog.info(category=LogCategoryChoices.PLANNING, message=f"Created {count} snapshot rows for Planning by API")
 
         return JsonResponse({'status': 'success'}, status=200)
 
@@ -263,8 +267,44 @@ class DeviceViewSet(
 
     @action(detail=False, methods=['post'],  url_path='sync_end')
     def sync_end(self, request):
-        process_import()
-        return JsonResponse({'status': 'success'})
+        job_id = enqueue_job(process_import_job, name='process_import', unique=True)
+        return JsonResponse({'status': 'success', 'job_id': job_id})
+
+    @action(detail=False, methods=['get', 'post'],  url_path='sync_delta')
+    def sync_delta(self, request):
+        if request.method == 'GET':
+            watermark = get_device_watermark()
+            return JsonResponse({'status': 'success', 'changeddate': timezone.localtime(watermark).strftime('%Y-%m-%d %H:%M:%S') if watermark else None})
+
+        if not isinstance(request.data, dict):
+            return JsonResponse({'status': 'error', 'errors': ['Should be an object with devices and deleted']}, status=status.HTTP_400_BAD_REQUEST)
+        devices = request.data.get('devices', [])
+        deleted = request.data.get('deleted', [])
+        if not isinstance(devices, list) or not isinstance(deleted, list):
+            return JsonResponse({'status': 'error', 'errors': ['devices and deleted should be lists']}, status=status.HTTP_400_BAD_REQUEST)
+        if not all(
+            (isinstance(slurpit_id, int) and not isinstance(slurpit_id, bool)) or (isinstance(slurpit_id, str) and slurpit_id.isdigit())
+            for slurpit_id in deleted
+        ):
+            return JsonResponse({'status': 'error', 'errors': ['deleted should be a list of device ids']}, status=status.HTTP_400_BAD_REQUEST)
+        deleted = [int(slurpit_id) for slurpit_id in deleted]
+        errors = device_validator(devices)
+        if errors:
+            return JsonResponse({'status': 'error', 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        # The devices are staged by the job, while it holds the import lock
+        job_id = enqueue_job(process_delta_job, devices, deleted, name='process_delta')
+        return JsonResponse({'status': 'success', 'job_id': job_id})
+
+
+class SlurpitJobView(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+
+    def retrieve(self, request, pk=None):
+        job = get_job_status(pk)
+        if job is None:
+            return JsonResponse({'status': 'error', 'errors': [f"Unknown job id {pk}"]}, status=status.HTTP_404_NOT_FOUND)
+        return JsonResponse({'status': 'success', 'job': job})
     
 class SlurpitTestAPIView(SlurpitViewSet):
     queryset = SlurpitImportedDevice.objects.all()
@@ -285,22 +325,147 @@ class SlurpitDeviceView(SlurpitViewSet):
 
     @action(detail=False, methods=['get'], url_path='all')
     def all(self, request, *args, **kwargs):
-        request_body = []
+        """
+        Export the NetBox devices through the data mapping.
+
+        Optional query parameters:
+        - `last_updated__gte`: only devices changed since this (ISO 8601) time.
+        - `after` and `limit`: keyset pagination on the device id. A page carries the cursor of the next page
+          in `next` (JSON) or the `X-Next-Cursor` header (NDJSON).
+        - `format=ndjson`: one JSON object per line instead of a single document.
+        Without `limit` all devices are streamed.
+        """
+        lookups = get_device_lookups(SlurpitMapping.objects.all())
+        devices = Device.objects.order_by('pk')
+        ndjson = request.GET.get('format') == 'ndjson'
 
-        devices_array = [get_device_dict(device) for device in Device.objects.all()]
+        try:
+            if last_updated := request.GET.get('last_updated__gte'):
+                changed_since = parse_datetime(last_updated)
+                if changed_since is None:
+                    raise ValueError(f"Invalid last_updated__gte: {last_updated}")
+                if timezone.is_naive(changed_since):
+                    changed_since = timezone.make_aware(changed_since)
+                devices = devices.filter(last_updated__gte=changed_since)
+            if after := request.GET.get('after'):
+                devices = devices.filter(pk__gt=int(after))
+            limit = request.GET.get('limit')
+            if limit is not None:
+                limit = int(limit)
+                if limit < 1:
+                    raise ValueError("limit must be a positive number")
+                if max_page_size := get_netbox_config().MAX_PAGE_SIZE:
+                    limit = min(limit, max_page_size)
+        except ValueError as e:
+            return JsonResponse({'status': 'error', 'errors': str(e)}, status=400)
 
-        objs = SlurpitMapping.objects.all()
-        
-        for device in devices_array:
-            row = {}
-            for obj in objs:
-                target_field = obj.target_field.split('|')[1]
-                row[obj.source_field] = str(device[target_field])
-            request_body.append(row)
+        devices = devices.values('pk', *get_values_fields(lookups))
+
+        def to_row(values):
+            return {source_field: str(value) for source_field, value in map_device_values(values, lookups).items()}
+
+        if limit is not None:
+            # A page is bounded by the limit, so it is read at once to know the cursor of the next page
+            page = list(devices[:limit + 1])
+            next_cursor = page[limit - 1]['pk'] if len(page) > limit else None
+            rows = [to_row(values) for values in page[:limit]]
+
+            if ndjson:
+                response = HttpResponse(''.join(f'{json.dumps(row)}\n' for row in rows), content_type='application/x-ndjson')
+                if next_cursor is not None:
+                    response['X-Next-Cursor'] = str(next_cursor)
+                return response
+            return JsonResponse({'data': rows, 'next': next_cursor})
+
+        def stream_json():
+            # The devices are read with a server side cursor and written out chunk by chunk
+            yield '{"data": ['
+            chunk = []
+            separator = ''
+            for values in devices.iterator(chunk_size=BATCH_SIZE):
+                chunk.append(json.dumps(to_row(values)))
+                if len(chunk) == BATCH_SIZE:
+                    yield separator + ', '.join(chunk)
+                    separator = ', '
+                    chunk = []
+            if chunk:
+                yield separator + ', '.join(chunk)
+            yield ']}'
+
+        def stream_ndjson():
+            chunk = []
+            for values in devices.iterator(chunk_size=BATCH_SIZE):
+                chunk.append(f'{json.dumps(to_row(values))}\n')
+                if len(chunk) == BATCH_SIZE:
+                    yield ''.join(chunk)
+                    chunk = []
+            if chunk:
+                yield ''.join(chunk)
+
+        if ndjson:
+            return StreamingHttpResponse(stream_ndjson(), content_type='application/x-ndjson')
+        return StreamingHttpResponse(stream_json(), content_type='application/json')
+    
 
+INTERFACE_UPDATE_FIELDS = ('label', 'speed', 'type', 'duplex', 'description', 'module')
 
-        return JsonResponse({'data': request_body})
-    
+def get_devices_by_name(hostnames):
+    """
+    Resolve hostnames to devices with one query. Names matching several devices are left out, as
+    `Device.objects.get(name=...)` would fail for them.
+    """
+    devices = {}
+    ambiguous = set()
+    for device in Device.objects.filter(name__in=set(hostnames)):
+        if device.name in devices:
+            ambiguous.add(device.name)
+        devices[device.name] = device
+    for name in ambiguous:
+        del devices[name]
+    return devices
+
+@lru_cache(maxsize=None)
+def get_form_fields(model):
+    form_fields = {}
+    for field in model._meta.concrete_fields:
+        if field.is_relation or not field.editable:
+            continue
+        form_field = field.formfield()
+        if form_field is not None:
+            form_fields[field.name] = (field, form_field)
+    return form_fields
+
+def clean_model_data(model, data, exclude=()):
+    """
+    Validate plain values with the form fields and validators of `model`, without building a model form per
+    record. Returns the errors in the same `{field: [messages]}` shape as `form.errors`.
+    """
+    errors = {}
+    form_fields = get_form_fields(model)
+    for field_name, value in data.items():
+        if field_name in exclude or field_name not in form_fields:
+            continue
+        model_field, form_field = form_fields[field_name]
+        try:
+            value = form_field.clean(value)
+            if value not in model_field.empty_values:
+                model_field.run_validators(value)
+        except ValidationError as e:
+            errors[field_name] = list(e.messages)
+    return errors
+
+def clean_interface_data(data, modules):
+    errors = clean_model_data(Interface, data, exclude=('device', 'module'))
+
+    module = data.get('module')
+    if module not in (None, ''):
+        try:
+            valid = (data['device'].pk, int(module)) in modules
+        except (TypeError, ValueError):
+            valid = False
+        if not valid:
+            errors['module'] = ["Select a valid choice. That choice is not one of the available choices."]
+    return errors
 
 class SlurpitInterfaceView(SlurpitViewSet):
     queryset = SlurpitInterface.objects.all()
@@ -341,64 +506,47 @@ class SlurpitInterfaceView(SlurpitViewSet):
                     'module': None
                 }
 
-                # device = None
+            # The last record of an interface wins
+            records = {}
+            for record in request.data[::-1]:
+                records.setdefault((record['name'], record['hostname']), record)
+
+            devices = get_devices_by_name(hostname for _, hostname in records)
+            device_ids = [device.pk for device in devices.values()]
 
-                # if initial_interface_values['device'] is not None:
-                #     device = Device.objects.get(name=initial_interface_values['device'])
+            existing_interfaces = {}
+            for interface in Interface.objects.filter(device_id__in=device_ids).select_related('module'):
+                existing_interfaces[(interface.device_id, interface.name)] = interface
 
-                # initial_interface_values['device'] = device
+            modules = set()
+            if any(record.get('module') not in (None, '') for record in records.values()) or initial_interface_values.get('module') is not None:
+                modules = set(Module.objects.filter(device_id__in=device_ids).values_list('device_id', 'pk'))
 
             total_errors = {}
             insert_data = []
             update_data = []
             total_data = []
-            duplicates = []
-            # Form validation 
-            for record in request.data[::-1]:
-                unique_interface = f'{record["name"]}/{record["hostname"]}'
-
-                if unique_interface in duplicates:
-                    continue
-                duplicates.append(unique_interface)
-
-                obj = Interface()
-                
-                device = None
-                try:
-                    device = Device.objects.get(name=record['hostname'])
-                except: 
-                    device = None
-
+            # Field validation
+            for record in records.values():
+                device = devices.get(record['hostname'])
                 if device is None: 
                     continue
                 record['device'] = device
                 del record['hostname']
                 
                 new_data = {**initial_interface_values, **record}
-                form = InterfaceForm(data=new_data, instance=obj)
                 total_data.append(new_data)
-                
-                # Fail case
-                if form.is_valid() is False:
-                    form_errors = form.errors
-                    error_list_dict = {}
 
-                    for field, errors in form_errors.items():
-                        error_list_dict[field] = list(errors)
-
-                    # Duplicate Interface
-                    keys = error_list_dict.keys()
-                    
-                    if len(keys) ==1 and '__all__' in keys and len(error_list_dict['__all__']) == 1 and error_list_dict['__all__'][0].endswith("already exists."):
-                        update_data.append(new_data)
-                        continue
-                    if '__all__' in keys and len(error_list_dict['__all__']) == 1 and error_list_dict['__all__'][0].endswith("already exists."):
-                        del error_list_dict['__all__']
-                    
+                error_list_dict = clean_interface_data(new_data, modules)
+                if error_list_dict:
                     error_key = f'{new_data["name"]}({"Global" if new_data["device"] is None else new_data["device"]})'
                     total_errors[error_key] = error_list_dict
 
                     return JsonResponse({'status': 'error', 'errors': total_errors}, status=400)
+
+                # Duplicate Interface
+                if (device.pk, new_data['name']) in existing_interfaces:
+                    update_data.append(new_data)
                 else:
                     insert_data.append(new_data)
        
@@ -406,38 +554,35 @@ class SlurpitInterfaceView(SlurpitViewSet):
                 batch_update_qs = []
                 batch_insert_qs = []
 
-                for item in total_data:
-                    device = None
-
-                    if item['device'] is not None:
-                        device = Device.objects.get(name=item['device'])
-                        
-                    item['device'] = device
+                slurpit_interfaces = {
+                    (interface.device_id, interface.name): interface
+                    for interface in SlurpitInterface.objects.filter(device_id__in=device_ids)
+                }
 
-                    slurpit_interface_item = SlurpitInterface.objects.filter(name=item['name'], device=item['device'])
+                for item in total_data:
+                    slurpit_interface_item = slurpit_interfaces.get((item['device'].pk, item['name']))
                     
                     if slurpit_interface_item:
-                        slurpit_interface_item = slurpit_interface_item.first()
-
+                        staged_hash = content_hash(field_values(slurpit_interface_item, INTERFACE_UPDATE_FIELDS))
                         # Update
-                        allowed_fields_with_none = {}
                         allowed_fields = {'duplex', 'label', 'description', 'speed', 'type', 'module'}
 
                         for field, value in item.items():
                             if field in allowed_fields and value is not None and value != "":
                                 setattr(slurpit_interface_item, field, value)
-                            if field in allowed_fields_with_none:
-                                setattr(slurpit_interface_item, field, value)
 
+                        # Records that don't change the staged row are dropped without a write
+                        if content_hash(field_values(slurpit_interface_item, INTERFACE_UPDATE_FIELDS)) == staged_hash:
+                            continue
                         batch_update_qs.append(slurpit_interface_item)
                     else:
-                        obj = Interface.objects.filter(name=item['name'], device=item['device'])
+                        obj = existing_interfaces.get((item['device'].pk, item['name']))
                         fields = {'label', 'device', 'module', 'type', 'duplex', 'speed', 'description'}
                         not_null_fields = {'label', 'device', 'module', 'type', 'duplex', 'speed', 'description'}
 
                         new_interface = {}
                         if obj:
-                            obj = obj.first()
+                            obj.device = item['device']
                             old_interface = {}
 
                             for field in fields:
@@ -450,7 +595,7 @@ class SlurpitInterfaceView(SlurpitViewSet):
                                 if field in not_null_fields and (new_interface[field] is None or new_interface[field] == ""):
                                     new_interface[field] = old_interface[field]
 
-                            if new_interface == old_interface:
+                            if content_hash(new_interface) == content_hash(old_interface):
                                 continue
                         else:
                             for field in fields: 
@@ -461,54 +606,23 @@ class SlurpitInterfaceView(SlurpitViewSet):
                             **new_interface
                         ))
                 
-                count = len(batch_insert_qs)
-                offset = 0
-
-                while offset < count:
-                    batch_qs = batch_insert_qs[offset:offset + BATCH_SIZE]
-                    to_import = []        
-                    for interface_item in batch_qs:
-                        to_import.append(interface_item)
-
-                    SlurpitInterface.objects.bulk_create(to_import)
-                    offset += BATCH_SIZE
-
-
-                count = len(batch_update_qs)
-                offset = 0
-                while offset < count:
-                    batch_qs = batch_update_qs[offset:offset + BATCH_SIZE]
-                    to_import = []        
-                    for interface_item in batch_qs:
-                        to_import.append(interface_item)
-
-                    SlurpitInterface.objects.bulk_update(to_import, 
-                        fields={'label', 'speed', 'type', 'duplex', 'description', 'module'}
-                    )
-                    offset += BATCH_SIZE
+                save_reconcile_rows(SlurpitInterface, batch_insert_qs, batch_update_qs, INTERFACE_UPDATE_FIELDS)
 
             else:
-
                 # Batch Insert
-                count = len(insert_data)
-                offset = 0
-                while offset < count:
-                    batch_qs = insert_data[offset:offset + BATCH_SIZE]
-                    to_import = []        
-                    for interface_item in batch_qs:
-                        filtered_interface_item = {k: v for k, v in interface_item.items() if not k.startswith('ignore_')}
-                        to_import.append(Interface(**filtered_interface_item))
-                    Interface.objects.bulk_create(to_import)
-                    offset += BATCH_SIZE
-                
+                to_import = []
+                for interface_item in insert_data:
+                    filtered_interface_item = {k: v for k, v in interface_item.items() if not k.startswith('ignore_')}
+                    to_import.append(Interface(**filtered_interface_item))
+                Interface.objects.bulk_create(to_import, batch_size=BATCH_SIZE)
+                mark_reconcile_rows_stale(to_import)
                 
                 # Batch Update
                 batch_update_qs = []
                 for update_item in update_data:
-                    item = Interface.objects.get(name=update_item['name'], device=update_item['device'])
+                    item = existing_interfaces[(update_item['device'].pk, update_item['name'])]
                     
                     # Update
-                    allowed_fields_with_none = {}
                     allowed_fields = {'duplex', 'label', 'speed', 'type', 'description', 'module'}
 
                     for field, value in update_item.items():
@@ -518,30 +632,61 @@ class SlurpitInterfaceView(SlurpitViewSet):
 
                         if field in allowed_fields and value is not None and value != "":
                             setattr(item, field, value)
-                        if field in allowed_fields_with_none:
-                            setattr(item, field, value)
 
                     batch_update_qs.append(item)
 
-                
-                count = len(batch_update_qs)
-                offset = 0
-                while offset < count:
-                    batch_qs = batch_update_qs[offset:offset + BATCH_SIZE]
-                    to_import = []        
-                    for interface_item in batch_qs:
-                        to_import.append(interface_item)
-
-                    Interface.objects.bulk_update(to_import, 
-                        fields={'label', 'speed', 'type', 'duplex', 'description', 'module'}
-                    )
-                    offset += BATCH_SIZE
-
+                Interface.objects.bulk_update(batch_update_qs, fields=INTERFACE_UPDATE_FIELDS, batch_size=BATCH_SIZE)
+                mark_reconcile_rows_stale(batch_update_qs)
 
             return JsonResponse({'status': 'success'})
         except Exception as e:
             return JsonResponse({'status': 'errors', 'errors': str(e)}, status=400)
         
+IPADDRESS_UPDATE_FIELDS = ('status', 'role', 'tenant', 'dns_name', 'description')
+LOOKUP_BATCH_SIZE = 5000
+
+def chunked(values, size=LOOKUP_BATCH_SIZE):
+    # Keeps `__in` lookups below the database's bind parameter limit
+    values = list(values)
+    for offset in range(0, len(values), size):
+        yield values[offset:offset + size]
+
+def get_objects_by_pk(model, values):
+    pks = set()
+    for value in values:
+        try:
+            pks.add(int(value))
+        except (TypeError, ValueError):
+            continue
+    return model.objects.in_bulk(pks)
+
+def get_related(objects, value):
+    """
+    Resolve a primary key against a preloaded `in_bulk` map, the way a model choice field would.
+    """
+    if value in (None, ''):
+        return None
+    if isinstance(value, Model):
+        return value
+    try:
+        return objects[int(value)]
+    except (KeyError, TypeError, ValueError):
+        raise ValidationError("Select a valid choice. That choice is not one of the available choices.")
+
+def parse_ip_network(value, object_name='IP address'):
+    if not value or '/' not in str(value):
+        raise ValidationError("CIDR mask (e.g. /24) is required.")
+    try:
+        network = netaddr.IPNetwork(value)
+    except (netaddr.AddrFormatError, TypeError, ValueError):
+        raise ValidationError("Please specify a valid IPv4 or IPv6 address.")
+    if network.prefixlen == 0:
+        raise ValidationError(f"Cannot create {object_name} with /0 mask.")
+    return network
+
+def vrf_filter(vrf_id):
+    return {'vrf__isnull': True} if vrf_id is None else {'vrf_id': vrf_id}
+
 class SlurpitIPAMView(SlurpitViewSet):
     queryset = IPAddress.objects.all()
     
@@ -554,9 +699,6 @@ class SlurpitIPAMView(SlurpitViewSet):
         if errors:
             return JsonResponse({'status': 'error', 'errors': errors}, status=400)
 
-        vrf = None
-        tenant = None
-
         try:
             # Get initial values for IPAM
             enable_reconcile = True
@@ -566,23 +708,11 @@ class SlurpitIPAMView(SlurpitViewSet):
 
             initial_ipaddress_values = {}
             ipaddress_update_ignore_values = []
-            vrf = None
-            tenant = None
             if initial_obj:
                 enable_reconcile = initial_obj['enable_reconcile']
                 del initial_obj['enable_reconcile']
                 initial_ipaddress_values = {**initial_obj}
 
-                obj = SlurpitInitIPAddress.objects.filter(address=None).get()
-
-                if initial_ipaddress_values['vrf'] is not None:
-                    vrf = VRF.objects.get(pk=initial_ipaddress_values['vrf'])
-                if initial_ipaddress_values['tenant'] is not None:
-                    tenant = Tenant.objects.get(pk=initial_ipaddress_values['tenant'])
-
-                initial_ipaddress_values['vrf'] = vrf
-                initial_ipaddress_values['tenant'] = tenant
-
                 for key in initial_ipaddress_values.keys():
                     if key.startswith('ignore_') and initial_ipaddress_values[key]:
                         ipaddress_update_ignore_values.append(key)
@@ -594,62 +724,85 @@ class SlurpitIPAMView(SlurpitViewSet):
                 initial_ipaddress_values['description'] = ''
                 initial_ipaddress_values['status'] = 'active'
 
-            total_errors = {}
-            insert_ips = []
-            update_ips = []
-            total_ips = []
-
-            duplicates = []
-            # Form validation 
+            # The last record of an address wins
+            records = {}
             for record in request.data[::-1]:
-                unique_ipaddress = f'{record["address"]}'
+                records.setdefault(f'{record["address"]}', record)
 
-                if unique_ipaddress in duplicates:
-                    continue
-                duplicates.append(unique_ipaddress)
+            vrfs = get_objects_by_pk(VRF, [initial_ipaddress_values['vrf'], *(record.get('vrf') for record in records.values())])
+            tenants = get_objects_by_pk(Tenant, [initial_ipaddress_values['tenant'], *(record.get('tenant') for record in records.values())])
 
-                obj = IPAddress()
+            total_errors = {}
+            total_ips = []
+            # Field validation, addresses are parsed once here
+            for record in records.values():
                 new_data = {**initial_ipaddress_values, **record}
-                form = IPAddressForm(data=new_data, instance=obj)
-                total_ips.append(new_data)
-                
-                # Fail case
-                if form.is_valid() is False:
-                    form_errors = form.errors
-                    error_list_dict = {}
+                error_list_dict = clean_model_data(IPAddress, new_data, exclude=('address',))
 
-                    for field, errors in form_errors.items():
-                        error_list_dict[field] = list(errors)
+                for field, objects in (('vrf', vrfs), ('tenant', tenants)):
+                    try:
+                        new_data[field] = get_related(objects, new_data[field])
+                    except ValidationError as e:
+                        error_list_dict[field] = list(e.messages)
+                try:
+                    new_data['address'] = parse_ip_network(new_data['address'])
+                except ValidationError as e:
+                    error_list_dict['address'] = list(e.messages)
 
-                    # Duplicate IP Address
-                    keys = error_list_dict.keys()
-                    
-                    if len(keys) ==1 and 'address' in keys and len(error_list_dict['address']) == 1 and error_list_dict['address'][0].startswith("Duplicate"):
-                        update_ips.append(new_data)
-                        continue
-                    if 'address' in keys and len(error_list_dict['address']) == 1 and error_list_dict['address'][0].startswith("Duplicate"):
-                        del error_list_dict['address']
-                    
-                    error_key = f'{new_data["address"]}({"Global" if new_data["vrf"] is None else new_data["vrf"]})'
+                if error_list_dict:
+                    error_key = f'{record["address"]}({"Global" if new_data["vrf"] is None else new_data["vrf"]})'
                     total_errors[error_key] = error_list_dict
 
                     return JsonResponse({'status': 'error', 'errors': total_errors}, status=400)
-                else:
-                    insert_ips.append(new_data)
+                total_ips.append(new_data)
+
+            # Existing addresses, one query per VRF
+            ips_by_vrf = {}
+            for item in total_ips:
+                ips_by_vrf.setdefault(item['vrf'].pk if item['vrf'] else None, []).append(item)
 
+            existing_hosts = {}
+            existing_ips = {}
+            for vrf_id, items in ips_by_vrf.items():
+                for hosts in chunked({str(item['address'].ip) for item in items}):
+                    for ipaddress in IPAddress.objects.filter(address__net_in=hosts, **vrf_filter(vrf_id)).select_related('tenant'):
+                        existing_hosts.setdefault((vrf_id, str(ipaddress.address.ip)), []).append(ipaddress)
+                        existing_ips.setdefault((vrf_id, str(ipaddress.address)), ipaddress)
 
+            enforce_global_unique = get_netbox_config().ENFORCE_GLOBAL_UNIQUE
+            insert_ips = []
+            update_ips = []
+            for item in total_ips:
+                vrf = item['vrf']
+                vrf_id = vrf.pk if vrf else None
+                duplicates = existing_hosts.get((vrf_id, str(item['address'].ip)), [])
+                enforce_unique = vrf.enforce_unique if vrf else enforce_global_unique
+
+                # Duplicate IP Address
+                if enforce_unique and duplicates and (
+                    item['role'] not in IPADDRESS_ROLES_NONUNIQUE or
+                    any(duplicate.role not in IPADDRESS_ROLES_NONUNIQUE for duplicate in duplicates)
+                ):
+                    update_ips.append(item)
+                else:
+                    insert_ips.append(item)
 
             if enable_reconcile:
                 batch_update_qs = []
                 batch_insert_qs = []
 
-                for item in total_ips:
+                slurpit_ips = {}
+                for vrf_id, items in ips_by_vrf.items():
+                    for addresses in chunked({str(item['address']) for item in items}):
+                        for slurpit_ipaddress in SlurpitInitIPAddress.objects.filter(address__in=addresses, **vrf_filter(vrf_id)):
+                            slurpit_ips.setdefault((vrf_id, str(slurpit_ipaddress.address)), slurpit_ipaddress)
 
-                    slurpit_ipaddress_item = SlurpitInitIPAddress.objects.filter(address=item['address'], vrf=item['vrf'])
+                for item in total_ips:
+                    key = (item['vrf'].pk if item['vrf'] else None, str(item['address']))
+                    slurpit_ipaddress_item = slurpit_ips.get(key)
                     
                     if slurpit_ipaddress_item:
-                        slurpit_ipaddress_item = slurpit_ipaddress_item.first()
-
+                        staged_hash = content_hash(field_values(slurpit_ipaddress_item, IPADDRESS_UPDATE_FIELDS))
                         allowed_fields_with_none = {'status'}
                         allowed_fields = {'role', 'tenant', 'dns_name', 'description'}
 
@@ -659,15 +812,17 @@ class SlurpitIPAMView(SlurpitViewSet):
                             if field in allowed_fields_with_none:
                                 setattr(slurpit_ipaddress_item, field, value)
 
+                        # Records that don't change the staged row are dropped without a write
+                        if content_hash(field_values(slurpit_ipaddress_item, IPADDRESS_UPDATE_FIELDS)) == staged_hash:
+                            continue
                         batch_update_qs.append(slurpit_ipaddress_item)
                     else:
-                        obj = IPAddress.objects.filter(address=item['address'], vrf=vrf)
+                        obj = existing_ips.get(key)
                         fields = ['status', 'role', 'description', 'tenant', 'dns_name']
                         not_null_fields = {'role', 'description', 'tenant', 'dns_name'}
                         new_ipaddress = {}
 
                         if obj:
-                            obj = obj.first()
                             old_ipaddress = {}
                             
                             for field in fields:
@@ -675,70 +830,40 @@ class SlurpitIPAMView(SlurpitViewSet):
                                 if field_name in ipaddress_update_ignore_values:
                                     continue
                                 old_ipaddress[field] = getattr(obj, field)
-                                new_ipaddress[field] = item[field]
+                                new_ipaddress[field] = item.get(field)
 
                                 if field in not_null_fields and (new_ipaddress[field] is None or new_ipaddress[field] == ""):
                                     new_ipaddress[field] = old_ipaddress[field]
 
-                            if new_ipaddress == old_ipaddress:
+                            if content_hash(new_ipaddress) == content_hash(old_ipaddress):
                                 continue
                         else:
                             for field in fields:
-                                new_ipaddress[field] = item[field]
+                                new_ipaddress[field] = item.get(field)
                         
-                        obj = SlurpitInitIPAddress(
+                        batch_insert_qs.append(SlurpitInitIPAddress(
                             address = item['address'], 
-                            vrf = vrf,
+                            vrf = item['vrf'],
                             **new_ipaddress
-                        )
-
-                        batch_insert_qs.append(obj)
+                        ))
                 
-                count = len(batch_insert_qs)
-                offset = 0
-
-                while offset < count:
-                    batch_qs = batch_insert_qs[offset:offset + BATCH_SIZE]
-                    to_import = []        
-                    for ipaddress_item in batch_qs:
-                        to_import.append(ipaddress_item)
-
-                    created_items = SlurpitInitIPAddress.objects.bulk_create(to_import)
-                    offset += BATCH_SIZE
-
-
-
-                count = len(batch_update_qs)
-                offset = 0
-                while offset < count:
-                    batch_qs = batch_update_qs[offset:offset + BATCH_SIZE]
-                    to_import = []        
-                    for ipaddress_item in batch_qs:
-                        to_import.append(ipaddress_item)
-
-                    SlurpitInitIPAddress.objects.bulk_update(to_import, fields={'status', 'role', 'tenant', 'dns_name', 'description'})
-
-
-                    offset += BATCH_SIZE
+                save_reconcile_rows(SlurpitInitIPAddress, batch_insert_qs, batch_update_qs, IPADDRESS_UPDATE_FIELDS)
                 
             else:
                 # Batch Insert
-                count = len(insert_ips)
-                offset = 0
-                while offset < count:
-                    batch_qs = insert_ips[offset:offset + BATCH_SIZE]
-                    to_import = []        
-                    for ipaddress_item in batch_qs:
-                        filtered_ipaddress_item = {k: v for k, v in ipaddress_item.items() if not k.startswith('ignore_')}
-                        to_import.append(IPAddress(**filtered_ipaddress_item))
-
-                    IPAddress.objects.bulk_create(to_import)
-                    offset += BATCH_SIZE
+                to_import = []
+                for ipaddress_item in insert_ips:
+                    filtered_ipaddress_item = {k: v for k, v in ipaddress_item.items() if not k.startswith('ignore_')}
+                    to_import.append(IPAddress(**filtered_ipaddress_item))
+                IPAddress.objects.bulk_create(to_import, batch_size=BATCH_SIZE)
+                mark_reconcile_rows_stale(to_import)
                 
                 # Batch Update
                 batch_update_qs = []
                 for update_item in update_ips:
-                    item = IPAddress.objects.get(address=update_item['address'], vrf=update_item['vrf'])
+                    item = existing_ips.get((update_item['vrf'].pk if update_item['vrf'] else None, str(update_item['address'])))
+                    if item is None:
+                        raise IPAddress.DoesNotExist("IPAddress matching query does not exist.")
 
                     # Update
                     allowed_fields_with_none = {'status'}
@@ -756,17 +881,8 @@ class SlurpitIPAMView(SlurpitViewSet):
 
                     batch_update_qs.append(item)
 
-                count = len(batch_update_qs)
-                offset = 0
-                while offset < count:
-                    batch_qs = batch_update_qs[offset:offset + BATCH_SIZE]
-                    to_import = []        
-                    for ipaddress_item in batch_qs:
-                        to_import.append(ipaddress_item)
-
-                    IPAddress.objects.bulk_update(to_import, fields={'status', 'role', 'tenant', 'dns_name', 'description'})
-                    offset += BATCH_SIZE
-
+                IPAddress.objects.bulk_update(batch_update_qs, fields=IPADDRESS_UPDATE_FIELDS, batch_size=BATCH_SIZE)
+                mark_reconcile_rows_stale(batch_update_qs)
 
             return JsonResponse({'status': 'success'})
         except Exception as e:
@@ -774,6 +890,22 @@ class SlurpitIPAMView(SlurpitViewSet):
         
 
 
+PREFIX_UPDATE_FIELDS = ('description', 'vrf', 'tenant', 'status', 'vlan', 'site', 'role')
+
+def get_or_create_vrfs(names):
+    """
+    Return a name to VRF map, creating the missing VRFs with one bulk_create.
+    """
+    vrfs = {}
+    for vrf in VRF.objects.filter(name__in=names):
+        vrfs.setdefault(vrf.name, vrf)
+    created = VRF.objects.bulk_create([VRF(name=name) for name in names if name not in vrfs])
+    if created:
+        search_backend.cache(created)
+    for vrf in created:
+        vrfs[vrf.name] = vrf
+    return vrfs
+
 class SlurpitPrefixView(SlurpitViewSet):
     queryset = SlurpitPrefix.objects.all()
 
@@ -786,12 +918,6 @@ class SlurpitPrefixView(SlurpitViewSet):
         if errors:
             return JsonResponse({'status': 'error', 'errors': errors}, status=400)
 
-        vrf = None
-        site = None
-        tenant = None
-        vlan = None
-        role = None
-            
         try:
             # Get initial values for prefix
             enable_reconcile = True
@@ -806,23 +932,6 @@ class SlurpitPrefixView(SlurpitViewSet):
                 del initial_obj['enable_reconcile']
                 initial_prefix_values = {**initial_obj}
 
-                if initial_prefix_values['vrf'] is not None:
-                    vrf = VRF.objects.get(pk=initial_prefix_values['vrf'])
-                if initial_prefix_values['site'] is not None:
-                    site = Site.objects.get(pk=initial_prefix_values['site'])
-                if initial_prefix_values['tenant'] is not None:
-                    tenant = Tenant.objects.get(pk=initial_prefix_values['tenant'])
-                if initial_prefix_values['vlan'] is not None:
-                    vlan = VLAN.objects.get(pk=initial_prefix_values['vlan'])
-                if initial_prefix_values['role'] is not None:
-                    role = Role.objects.get(pk=initial_prefix_values['role'])
-
-                initial_prefix_values['vrf'] = vrf
-                initial_prefix_values['site'] = site
-                initial_prefix_values['tenant'] = tenant
-                initial_prefix_values['vlan'] = vlan
-                initial_prefix_values['role'] = role
-
                 for key in initial_prefix_values.keys():
                     if key.startswith('ignore_') and initial_prefix_values[key]:
                         prefix_update_ignore_values.append(key)
@@ -838,71 +947,88 @@ class SlurpitPrefixView(SlurpitViewSet):
                     'description': ''
                 }
 
-            total_errors = {}
-            insert_data = []
-            update_data = []
-            total_data = []
-
-            duplicates = []
-            # Form validation 
+            # The last record of a prefix wins
+            records = {}
             for record in request.data[::-1]:
-                unique_prefix = f'{record["prefix"]}'
+                records.setdefault(f'{record["prefix"]}', record)
 
-                if unique_prefix in duplicates:
-                    continue
-                duplicates.append(unique_prefix)
+            # VRFs are referenced by name and created when missing
+            vrfs = get_or_create_vrfs({record['vrf'] for record in records.values() if record.get('vrf')})
+            for record in records.values():
+                if record.get('vrf'):
+                    record['vrf'] = vrfs[record['vrf']]
+                elif 'vrf' in record:
+                    del record['vrf']
 
-                obj = Prefix()
-                if 'vrf' in record and len(record['vrf']) > 0:
-                    vrf = VRF.objects.filter(name=record['vrf'])
-                    if vrf:
-                        record['vrf'] = vrf.first()
-                    else:
-                        vrf = VRF.objects.create(name=record['vrf'])
-                        record['vrf'] = vrf
-                else:
-                    if 'vrf' in record:
-                        del record['vrf']
+            related_objects = {
+                field: get_objects_by_pk(model, [initial_prefix_values[field], *(record.get(field) for record in records.values())])
+                for field, model in (('vrf', VRF), ('site', Site), ('tenant', Tenant), ('vlan', VLAN), ('role', Role))
+            }
 
+            total_errors = {}
+            total_data = []
+            # Field validation, prefixes are parsed once here
+            for record in records.values():
                 new_data = {**initial_prefix_values, **record}
-                form = PrefixForm(data=new_data, instance=obj)
-                total_data.append(new_data)
-                
-                # Fail case
-                if form.is_valid() is False:
-                    form_errors = form.errors
-                    error_list_dict = {}
+                error_list_dict = clean_model_data(Prefix, new_data, exclude=('prefix',))
 
-                    for field, errors in form_errors.items():
-                        error_list_dict[field] = list(errors)
+                for field, objects in related_objects.items():
+                    try:
+                        new_data[field] = get_related(objects, new_data[field])
+                    except ValidationError as e:
+                        error_list_dict[field] = list(e.messages)
+                try:
+                    new_data['prefix'] = parse_ip_network(new_data['prefix'], 'prefix').cidr
+                except ValidationError as e:
+                    error_list_dict['prefix'] = list(e.messages)
 
-                    # Duplicate Prefix
-                    keys = error_list_dict.keys()
-                    
-                    if len(keys) ==1 and 'prefix' in keys and len(error_list_dict['prefix']) == 1 and error_list_dict['prefix'][0].startswith("Duplicate"):
-                        update_data.append(new_data)
-                        continue
-                    if 'prefix' in keys and len(error_list_dict['prefix']) == 1 and error_list_dict['prefix'][0].startswith("Duplicate"):
-                        del error_list_dict['prefix']
-                    
-                    error_key = f'{new_data["prefix"]}({"Global" if new_data["vrf"] is None else new_data["vrf"]})'
+                if error_list_dict:
+                    error_key = f'{record["prefix"]}({"Global" if new_data["vrf"] is None else new_data["vrf"]})'
                     total_errors[error_key] = error_list_dict
 
                     return JsonResponse({'status': 'error', 'errors': total_errors}, status=400)
+                total_data.append(new_data)
+
+            # Existing prefixes, one query per VRF
+            prefixes_by_vrf = {}
+            for item in total_data:
+                prefixes_by_vrf.setdefault(item['vrf'].pk if item['vrf'] else None, []).append(item)
+
+            existing_prefixes = {}
+            for vrf_id, items in prefixes_by_vrf.items():
+                for prefixes in chunked({str(item['prefix']) for item in items}):
+                    for prefix in Prefix.objects.filter(prefix__in=prefixes, **vrf_filter(vrf_id)).select_related('vrf', 'site', 'tenant', 'vlan', 'role'):
+                        existing_prefixes.setdefault((vrf_id, str(prefix.prefix)), prefix)
+
+            enforce_global_unique = get_netbox_config().ENFORCE_GLOBAL_UNIQUE
+            insert_data = []
+            update_data = []
+            for item in total_data:
+                vrf = item['vrf']
+                enforce_unique = vrf.enforce_unique if vrf else enforce_global_unique
+
+                # Duplicate Prefix
+                if enforce_unique and (vrf.pk if vrf else None, str(item['prefix'])) in existing_prefixes:
+                    update_data.append(item)
                 else:
-                    insert_data.append(new_data)
+                    insert_data.append(item)
         
             if enable_reconcile:
                 batch_update_qs = []
                 batch_insert_qs = []
 
-                for item in total_data:
+                slurpit_prefixes = {}
+                for vrf_id, items in prefixes_by_vrf.items():
+                    for prefixes in chunked({str(item['prefix']) for item in items}):
+                        for slurpit_prefix in SlurpitPrefix.objects.filter(prefix__in=prefixes, **vrf_filter(vrf_id)):
+                            slurpit_prefixes.setdefault((vrf_id, str(slurpit_prefix.prefix)), slurpit_prefix)
 
-                    slurpit_prefix_item = SlurpitPrefix.objects.filter(prefix=item['prefix'], vrf=item['vrf'])
+                for item in total_data:
+                    key = (item['vrf'].pk if item['vrf'] else None, str(item['prefix']))
+                    slurpit_prefix_item = slurpit_prefixes.get(key)
                     
                     if slurpit_prefix_item:
-                        slurpit_prefix_item = slurpit_prefix_item.first()
-
+                        staged_hash = content_hash(field_values(slurpit_prefix_item, PREFIX_UPDATE_FIELDS))
                         allowed_fields_with_none = {'status'}
                         allowed_fields = {'role', 'tenant', 'site', 'vlan', 'vrf', 'description'}
 
@@ -912,9 +1038,12 @@ class SlurpitPrefixView(SlurpitViewSet):
                             if field in allowed_fields_with_none:
                                 setattr(slurpit_prefix_item, field, value)
 
+                        # Records that don't change the staged row are dropped without a write
+                        if content_hash(field_values(slurpit_prefix_item, PREFIX_UPDATE_FIELDS)) == staged_hash:
+                            continue
                         batch_update_qs.append(slurpit_prefix_item)
                     else:
-                        obj = Prefix.objects.filter(prefix=item['prefix'], vrf=item['vrf'])
+                        obj = existing_prefixes.get(key)
                         
                         fields = {'status', 'vrf', 'vlan', 'tenant', 'site', 'role', 'description'}
                         not_null_fields = {'vlan', 'tenant', 'site', 'role', 'description'}
@@ -922,7 +1051,6 @@ class SlurpitPrefixView(SlurpitViewSet):
                         new_prefix = {}
 
                         if obj:
-                            obj = obj.first()
                             old_prefix = {}
                             
                             for field in fields:
@@ -935,7 +1063,7 @@ class SlurpitPrefixView(SlurpitViewSet):
                                 if field in not_null_fields and (new_prefix[field] is None or new_prefix[field] == ""):
                                     new_prefix[field] = old_prefix[field]
 
-                            if new_prefix == old_prefix:
+                            if content_hash(new_prefix) == content_hash(old_prefix):
                                 continue
                         else:
                             for field in fields:
@@ -946,51 +1074,21 @@ class SlurpitPrefixView(SlurpitViewSet):
                             **new_prefix
                         ))
                 
-                count = len(batch_insert_qs)
-                offset = 0
-
-                while offset < count:
-                    batch_qs = batch_insert_qs[offset:offset + BATCH_SIZE]
-                    to_import = []        
-                    for prefix_item in batch_qs:
-                        to_import.append(prefix_item)
-
-                    SlurpitPrefix.objects.bulk_create(to_import)
-                    offset += BATCH_SIZE
-
-
-                count = len(batch_update_qs)
-                offset = 0
-                while offset < count:
-                    batch_qs = batch_update_qs[offset:offset + BATCH_SIZE]
-                    to_import = []        
-                    for prefix_item in batch_qs:
-                        to_import.append(prefix_item)
-
-                    SlurpitPrefix.objects.bulk_update(to_import, 
-                        fields={'description', 'vrf', 'tenant', 'status', 'vlan', 'site', 'role'},
-                    )
-                    offset += BATCH_SIZE
+                save_reconcile_rows(SlurpitPrefix, batch_insert_qs, batch_update_qs, PREFIX_UPDATE_FIELDS)
 
             else:
-
                 # Batch Insert
-                count = len(insert_data)
-                offset = 0
-                while offset < count:
-                    batch_qs = insert_data[offset:offset + BATCH_SIZE]
-                    to_import = []        
-                    for prefix_item in batch_qs:
-                        filtered_prefix_item = {k: v for k, v in prefix_item.items() if not k.startswith('ignore_')}
-                        to_import.append(Prefix(**filtered_prefix_item))
-                    Prefix.objects.bulk_create(to_import)
-                    offset += BATCH_SIZE
-                
+                to_import = []
+                for prefix_item in insert_data:
+                    filtered_prefix_item = {k: v for k, v in prefix_item.items() if not k.startswith('ignore_')}
+                    to_import.append(Prefix(**filtered_prefix_item))
+                Prefix.objects.bulk_create(to_import, batch_size=BATCH_SIZE)
+                mark_reconcile_rows_stale(to_import)
                 
                 # Batch Update
                 batch_update_qs = []
                 for update_item in update_data:
-                    item = Prefix.objects.get(prefix=update_item['prefix'], vrf=update_item['vrf'])
+                    item = existing_prefixes[(update_item['vrf'].pk if update_item['vrf'] else None, str(update_item['prefix']))]
                     
                     # Update
                     allowed_fields_with_none = {'status'}
@@ -1008,28 +1106,16 @@ class SlurpitPrefixView(SlurpitViewSet):
                     
                     batch_update_qs.append(item)
 
-                
-                count = len(batch_update_qs)
-                offset = 0
-                while offset < count:
-                    batch_qs = batch_update_qs[offset:offset + BATCH_SIZE]
-                    to_import = []        
-                    for prefix_item in batch_qs:
-                        to_import.append(prefix_item)
-
-                    Prefix.objects.bulk_update(to_import, 
-                        fields={
-                            'description', 'vrf', 'tenant', 'status', 'vlan', 'site', 'role'
-                        }
-                    )
-                    offset += BATCH_SIZE
-
+                Prefix.objects.bulk_update(batch_update_qs, fields=PREFIX_UPDATE_FIELDS, batch_size=BATCH_SIZE)
+                mark_reconcile_rows_stale(batch_update_qs)
 
             return JsonResponse({'status': 'success'})
         except Exception as e:
             return JsonResponse({'status': 'errors', 'errors': str(e)}, status=400)
 
 
+VLAN_UPDATE_FIELDS = ('description', 'tenant', 'status', 'role')
+
 class SlurpitVLANView(SlurpitViewSet):
     queryset = SlurpitVLAN.objects.all()
 
@@ -1080,64 +1166,69 @@ class SlurpitVLANView(SlurpitViewSet):
                     'description': ''
                 }
 
-            total_errors = {}
-            insert_data = []
-            update_data = []
-            total_data = []
-
-            duplicates = []
-            # Form validation 
+            # The last record of a (hostname, name) or (hostname, vid) wins
+            records = []
+            duplicates = set()
             for record in request.data[::-1]:
-                unique_group_name = f'{record["hostname"]}_{record["vlan_name"]}'
-                unique_group_id = f'{record["hostname"]}_{record["vlan_id"]}'
+                unique_group_name = (record['hostname'], 'name', record['vlan_name'])
+                unique_group_id = (record['hostname'], 'vid', str(record['vlan_id']))
                 if unique_group_name in duplicates or unique_group_id in duplicates:
                     continue
-                duplicates.append(unique_group_name)
-                duplicates.append(unique_group_id)
-
-                obj = VLAN()
+                duplicates.add(unique_group_name)
+                duplicates.add(unique_group_id)
+                records.append(record)
+
+            # One VLAN group per host
+            hostnames = {record['hostname'] for record in records}
+            groups = {}
+            for group in VLANGroup.objects.filter(name__in=hostnames):
+                groups.setdefault(group.name, group)
+
+            existing_by_name = {}
+            existing_by_vid = {}
+            for group_ids in chunked(group.pk for group in groups.values()):
+                for vlan in VLAN.objects.filter(group_id__in=group_ids).select_related('tenant', 'role'):
+                    existing_by_name.setdefault((vlan.group_id, vlan.name), vlan)
+                    existing_by_vid.setdefault((vlan.group_id, vlan.vid), vlan)
+
+            def get_existing_vlan(item):
+                group = groups.get(item['hostname'])
+                if group is None:
+                    return None
+                return existing_by_name.get((group.pk, item['name'])) or existing_by_vid.get((group.pk, item['vid']))
 
+            total_errors = {}
+            insert_data = []
+            update_data = []
+            total_data = []
+            # Field validation
+            for record in records:
                 new_data = {
                     **initial_vlan_values, 
                     "vid": record['vlan_id'],
                     "name": record['vlan_name'],
                     "hostname": record['hostname']
                 }
-                # Get VLANGroup ID 
-                group = VLANGroup.objects.filter(name=record['hostname'])
+                group = groups.get(record['hostname'])
                 if group:
-                    group = group.first()
                     new_data['group'] = group
 
-                form = VLANForm(data=new_data, instance=obj)
-                total_data.append(new_data)
-                
-                # Fail case
-                if form.is_valid() is False:
-                    form_errors = form.errors
-                    error_list_dict = {}
-
-                    for field, errors in form_errors.items():
-                        error_list_dict[field] = list(errors)
-
-                    # Duplicate VLAN
-                    keys = error_list_dict.keys()
-                    if len(keys) ==1 and '__all__' in keys:
-                        flag = True
-                        for errorItem in error_list_dict['__all__']:
-                            if not errorItem.endswith("already exists."):
-                                flag = False
-                                break
-                        if flag:
-                            update_data.append(new_data)
-                            continue
-                    if '__all__' in keys:
-                        del error_list_dict['__all__']
-                    
+                error_list_dict = clean_model_data(VLAN, new_data)
+                if 'vid' not in error_list_dict:
+                    new_data['vid'] = int(new_data['vid'])
+                    if group and hasattr(group, 'min_vid') and not group.min_vid <= new_data['vid'] <= group.max_vid:
+                        error_list_dict['vid'] = [f"VID must be between {group.min_vid} and {group.max_vid} for VLANs in group {group}"]
+
+                if error_list_dict:
                     error_key = f'{new_data["name"]}({new_data["vid"]})'
                     total_errors[error_key] = error_list_dict
 
                     return JsonResponse({'status': 'error', 'errors': total_errors}, status=400)
+
+                total_data.append(new_data)
+                # Duplicate VLAN
+                if get_existing_vlan(new_data):
+                    update_data.append(new_data)
                 else:
                     insert_data.append(new_data)
         
@@ -1145,15 +1236,18 @@ class SlurpitVLANView(SlurpitViewSet):
                 batch_update_qs = []
                 batch_insert_qs = []
 
-                for item in total_data:
+                slurpit_by_name = {}
+                slurpit_by_vid = {}
+                for group_names in chunked(hostnames):
+                    for slurpit_vlan in SlurpitVLAN.objects.filter(group__in=group_names):
+                        slurpit_by_name.setdefault((slurpit_vlan.group, slurpit_vlan.name), slurpit_vlan)
+                        slurpit_by_vid.setdefault((slurpit_vlan.group, slurpit_vlan.vid), slurpit_vlan)
 
-                    slurpit_vlan_item = SlurpitVLAN.objects.filter(name=item['name'], group=item['hostname'])
-                    if not slurpit_vlan_item:
-                        slurpit_vlan_item = SlurpitVLAN.objects.filter(vid=item['vid'], group=item['hostname'])
+                for item in total_data:
+                    slurpit_vlan_item = slurpit_by_name.get((item['hostname'], item['name'])) or slurpit_by_vid.get((item['hostname'], item['vid']))
 
                     if slurpit_vlan_item:
-                        slurpit_vlan_item = slurpit_vlan_item.first()
-
+                        staged_hash = content_hash(field_values(slurpit_vlan_item, VLAN_UPDATE_FIELDS))
                         allowed_fields_with_none = {'status'}
                         allowed_fields = {'role', 'tenant', 'description'}
 
@@ -1163,11 +1257,12 @@ class SlurpitVLANView(SlurpitViewSet):
                             if field in allowed_fields_with_none:
                                 setattr(slurpit_vlan_item, field, value)
 
+                        # Records that don't change the staged row are dropped without a write
+                        if content_hash(field_values(slurpit_vlan_item, VLAN_UPDATE_FIELDS)) == staged_hash:
+                            continue
                         batch_update_qs.append(slurpit_vlan_item)
                     else:
-                        obj = VLAN.objects.filter(name=item['name'], group__name=item['hostname'])
-                        if not obj:
-                            obj = VLAN.objects.filter(vid=item['vid'], group__name=item['hostname'])
+                        obj = get_existing_vlan(item)
 
                         fields = {'status', 'tenant', 'role', 'description'}
                         not_null_fields = {'tenant', 'role', 'description'}
@@ -1175,7 +1270,6 @@ class SlurpitVLANView(SlurpitViewSet):
                         new_vlan = {}
 
                         if obj:
-                            obj = obj.first()
                             old_vlan = {}
                             
                             for field in fields:
@@ -1188,7 +1282,7 @@ class SlurpitVLANView(SlurpitViewSet):
                                 if field in not_null_fields and (new_vlan[field] is None or new_vlan[field] == ""):
                                     new_vlan[field] = old_vlan[field]
 
-                            if new_vlan == old_vlan:
+                            if content_hash(new_vlan) == content_hash(old_vlan):
                                 continue
                         else:
                             for field in fields:
@@ -1201,61 +1295,32 @@ class SlurpitVLANView(SlurpitViewSet):
                             **new_vlan
                         ))
                 
-                count = len(batch_insert_qs)
-                offset = 0
-
-                while offset < count:
-                    batch_qs = batch_insert_qs[offset:offset + BATCH_SIZE]
-                    to_import = []        
-                    for vlan_item in batch_qs:
-                        to_import.append(vlan_item)
-
-                    SlurpitVLAN.objects.bulk_create(to_import)
-                    offset += BATCH_SIZE
-
-
-                count = len(batch_update_qs)
-                offset = 0
-                while offset < count:
-                    batch_qs = batch_update_qs[offset:offset + BATCH_SIZE]
-                    to_import = []        
-                    for vlan_item in batch_qs:
-                        to_import.append(vlan_item)
-
-                    SlurpitVLAN.objects.bulk_update(to_import, 
-                        fields={'description', 'tenant', 'status', 'role'},
-                    )
-                    offset += BATCH_SIZE
+                save_reconcile_rows(SlurpitVLAN, batch_insert_qs, batch_update_qs, VLAN_UPDATE_FIELDS)
 
             else:
+                # Missing VLAN groups are created once per host
+                new_groups = VLANGroup.objects.bulk_create([
+                    VLANGroup(name=hostname, slug=hostname) for hostname in hostnames if hostname not in groups
+                ])
+                if new_groups:
+                    search_backend.cache(new_groups)
+                for group in new_groups:
+                    groups[group.name] = group
 
                 # Batch Insert
-                count = len(insert_data)
-                offset = 0
-                while offset < count:
-                    batch_qs = insert_data[offset:offset + BATCH_SIZE]
-                    to_import = []        
-                    for vlan_item in batch_qs:
-                        filtered_vlan_item = {k: v for k, v in vlan_item.items() if not k.startswith('ignore_')}
-                        if not 'group' in filtered_vlan_item:
-                            vlan_group = VLANGroup.objects.create(name=filtered_vlan_item['hostname'],slug=filtered_vlan_item['hostname'])
-                            filtered_vlan_item['group'] = vlan_group
-                        del filtered_vlan_item['hostname']
-                        to_import.append(VLAN(**filtered_vlan_item))
-                    VLAN.objects.bulk_create(to_import)
-                    offset += BATCH_SIZE
-                
+                to_import = []
+                for vlan_item in insert_data:
+                    filtered_vlan_item = {k: v for k, v in vlan_item.items() if not k.startswith('ignore_')}
+                    filtered_vlan_item['group'] = groups[filtered_vlan_item.pop('hostname')]
+                    to_import.append(VLAN(**filtered_vlan_item))
+                VLAN.objects.bulk_create(to_import, batch_size=BATCH_SIZE)
+                mark_reconcile_rows_stale(to_import)
                 
                 # Batch Update
                 batch_update_qs = []
                 for update_item in update_data:
-                    if not 'group' in update_item:
-                        vlan_group = VLANGroup.objects.create(name=update_item['hostname'],slug=update_item['hostname'])
-                        update_item['group'] = vlan_group
+                    item = get_existing_vlan(update_item)
 
-                    item = VLAN.objects.get(name=update_item['name'], group=update_item['group'])
-                    if item is None:
-                        item = VLAN.objects.get(vid=update_item['vid'], group=update_item['group'])
                     # Update
                     allowed_fields_with_none = {'status'}
                     allowed_fields = {'role', 'tenant', 'description'}
@@ -1272,24 +1337,9 @@ class SlurpitVLANView(SlurpitViewSet):
                     
                     batch_update_qs.append(item)
 
-                
-                count = len(batch_update_qs)
-                offset = 0
-                while offset < count:
-                    batch_qs = batch_update_qs[offset:offset + BATCH_SIZE]
-                    to_import = []        
-                    for vlan_item in batch_qs:
-                        to_import.append(vlan_item)
-
-                    VLAN.objects.bulk_update(to_import, 
-                        fields={
-                            'description', 'tenant', 'status', 'role'
-                        }
-                    )
-                    offset += BATCH_SIZE
-
+                VLAN.objects.bulk_update(batch_update_qs, fields=VLAN_UPDATE_FIELDS, batch_size=BATCH_SIZE)
+                mark_reconcile_rows_stale(batch_update_qs)
 
             return JsonResponse({'status': 'success'})
         except Exception as e:
             return JsonResponse({'status': 'errors', 'errors': str(e)}, status=400)
-
@@ -2,6 +2,7 @@ import django_filters
 from core.choices import DataSourceStatusChoices
 from django.db.models import Q
 from netbox.filtersets import NetBoxModelFilterSet, BaseFilterSet
+from .management.choices import ReconcileActionChoices
 from .models import SlurpitLog, SlurpitPlanning, SlurpitSnapshot, SlurpitImportedDevice, SlurpitInitIPAddress, SlurpitInterface, SlurpitPrefix, SlurpitVLAN
 from django.utils.translation import gettext as _
 from utilities.filters import (
@@ -93,6 +94,11 @@ class SlurpitPrefixFilterSet(BaseFilterSet):
         label=_('Search'),
     )
 
+    reconcile_action = django_filters.MultipleChoiceFilter(
+        choices=ReconcileActionChoices,
+        label=_('Commit action'),
+    )
+
     prefix = MultiValueCharFilter(
         method='filter_prefix',
         label=_('Prefix'),
@@ -126,6 +132,11 @@ class SlurpitIPAddressFilterSet(BaseFilterSet):
         label=_('Search'),
     )
 
+    reconcile_action = django_filters.MultipleChoiceFilter(
+        choices=ReconcileActionChoices,
+        label=_('Commit action'),
+    )
+
     address = MultiValueCharFilter(
         method='filter_address',
         label=_('Address'),
@@ -153,6 +164,11 @@ class SlurpitInterfaceFilterSet(BaseFilterSet):
         label=_('Search'),
     )
 
+    reconcile_action = django_filters.MultipleChoiceFilter(
+        choices=ReconcileActionChoices,
+        label=_('Commit action'),
+    )
+
     class Meta:
         model = SlurpitInterface
         fields = [
@@ -176,6 +192,11 @@ class SlurpitVLANFilterSet(BaseFilterSet):
         label=_('Search'),
     )
 
+    reconcile_action = django_filters.MultipleChoiceFilter(
+        choices=ReconcileActionChoices,
+        label=_('Commit action'),
+    )
+
     class Meta:
         model = SlurpitVLAN
         fields = [
@@ -1,24 +1,40 @@
+import netaddr
 import requests
+import time
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import connection, transaction
-from django.db.models import QuerySet, F, OuterRef, Subquery
+from django.db.models import QuerySet, F, Max, OuterRef, Q, Subquery
 from django.utils import timezone
 from django.db.models.expressions import RawSQL
 from django.utils.text import slugify
 
 from . import get_config
-from .models import SlurpitImportedDevice, SlurpitStagedDevice, ensure_slurpit_tags, SlurpitLog, SlurpitSetting, SlurpitPlanning, SlurpitSnapshot
+from .models import SlurpitDeviceName, SlurpitImportedDevice, SlurpitStagedDevice, ensure_slurpit_tags, SlurpitLog, SlurpitSetting, SlurpitPlanning, SlurpitSnapshot
 from .management.choices import *
+from .slurpitch import SlurpitSession
+from .jobs import JobProgress, import_lock
 from .references import base_name, plugin_type, custom_field_data_name
-from .references.generic import get_default_objects, status_inventory, status_offline, get_create_dcim_objects, set_device_custom_fields
+from .references.generic import get_default_objects, status_inventory, status_offline, get_create_dcim_objects, set_device_custom_fields, DcimObjectResolver
 from .references.imports import *
-from dcim.models import Interface
+from dcim.models import Device, Interface
 from ipam.models import IPAddress
 
 BATCH_SIZE = 256
+PULL_CONCURRENCY = 4
+SNAPSHOT_CONCURRENCY = 8
+SNAPSHOT_CACHE_TIMEOUT = 60 * 60 * 8
+ONBOARDING_COUNTS_CACHE_KEY = 'slurpit_onboarding_counts'
+ONBOARDING_COUNTS_VERSION_KEY = 'slurpit_onboarding_counts_version'
+IMPORTED_DEVICE_FIELDS = ('disabled', 'hostname', 'fqdn', 'ipv4', 'device_os', 'device_type', 'brand', 'createddate', 'changeddate', 'last_updated')
+DRIFT_UPDATE_FIELDS = ('slurpit_hash', 'applied_hash', 'drift')
 columns = ('slurpit_id', 'disabled', 'hostname', 'fqdn', 'ipv4', 'device_os', 'device_type', 'brand', 'createddate', 'changeddate')
 
 
@@ -47,12 +63,92 @@ def get_devices(offset):
         log_message = "Please confirm the Slurp'it server is running and reachable."
         return None, log_message
 
+def iter_device_pages(session, concurrency=PULL_CONCURRENCY):
+    """
+    Yield the Slurp'it device inventory page by page, in order.
+
+    Up to `concurrency` pages are requested ahead over the pooled session, so only a bounded number of
+    pages is held in memory at any time. The first short page ends the inventory.
+    """
+    def fetch(offset):
+        r = session.get(f"/api/devices?offset={offset}&limit={BATCH_SIZE}", timeout=15)
+        r.raise_for_status()
+        page = r.json()
+        if not isinstance(page, list):
+            raise ValueError(f"Unexpected response from Slurp'it at offset {offset}")
+        return page
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = deque()
+        offset = 0
+        while True:
+            while len(pending) < concurrency:
+                pending.append(executor.submit(fetch, offset))
+                offset += BATCH_SIZE
+
+            page = pending.popleft().result()
+            if page:
+                yield page
+            if len(page) < BATCH_SIZE:
+                for future in pending:
+                    future.cancel()
+                return
+
+def pull_devices():
+    """
+    Stage the whole Slurp'it device inventory in a single server side pass.
+
+    Returns the number of staged devices and an error message, the count is None on failure.
+    """
+    try:
+        setting = SlurpitSetting.objects.get()
+    except ObjectDoesNotExist:
+        log_message = "Need to set the setting parameter"
+        SlurpitLog.failure(category=LogCategoryChoices.ONBOARD, message=log_message)
+        return None, log_message
+
+    started = time.monotonic()
+    pages = 0
+    pulled = 0
+    count = 0
+    try:
+        start_device_import()
+        with SlurpitSession.from_setting(setting, pool_size=PULL_CONCURRENCY) as session:
+            for page in iter_device_pages(session):
+                count += import_devices(page)
+                pages += 1
+                pulled += len(page)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        log_message = "Please confirm the Slurp'it server is running and reachable."
+        SlurpitLog.failure(category=LogCategoryChoices.ONBOARD, message=f"Failed to pull the devices from Slurp'it. {e}"[:200])
+        return None, log_message
+
+    elapsed = max(time.monotonic() - started, 0.001)
+    log_message = f"Pulled {pulled} devices from Slurp'it in {pages} pages ({pages / elapsed:.1f} pages/sec), staged {count}."
+    SlurpitLog.info(category=LogCategoryChoices.ONBOARD, message=log_message)
+    return count, ""
+
 def start_device_import():
-    with connection.cursor() as cursor:
-        cursor.execute(f"truncate {SlurpitStagedDevice._meta.db_table} cascade")
+    # Not while a delta sync is staging and applying its devices
+    with import_lock():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f"truncate {SlurpitStagedDevice._meta.db_table} cascade")
+        else:
+            SlurpitStagedDevice.objects.all().delete()
 
-def import_devices(devices):
-    to_insert = []
+def parse_slurpit_datetime(value):
+    # The current timezone can be activated per request, so it is part of the cache key
+    return _parse_slurpit_datetime(value, timezone.get_current_timezone())
+
+@lru_cache(maxsize=4096)
+def _parse_slurpit_datetime(value, tz):
+    # Slurp'it sends naive 'YYYY-mm-dd HH:MM:SS' strings and many devices share the same timestamps
+    if len(value) != 19:
+        raise ValueError(value)
+    return timezone.make_aware(datetime.fromisoformat(value), tz)
+
+def stage_rows(devices):
     for device in devices:
         # if device.get('disabled') == '1':
         #     continue
@@ -62,40 +158,117 @@ def import_devices(devices):
         device['slurpit_id'] = device.pop('id')
         
         try:
-            device['createddate'] = timezone.make_aware(datetime.strptime(device['createddate'], '%Y-%m-%d %H:%M:%S'), timezone.get_current_timezone())
-            device['changeddate'] = timezone.make_aware(datetime.strptime(device['changeddate'], '%Y-%m-%d %H:%M:%S'), timezone.get_current_timezone())          
-        except ValueError:
+            device['createddate'] = parse_slurpit_datetime(device['createddate'])
+            device['changeddate'] = parse_slurpit_datetime(device['changeddate'])
+        except (ValueError, TypeError):
             SlurpitLog.failure(category=LogCategoryChoices.ONBOARD, message=f"Failed to convert to datetime, cannot import {device.get('hostname')}")
             continue
-        to_insert.append(SlurpitStagedDevice(**{key: value for key, value in device.items() if key in columns}))
-    SlurpitStagedDevice.objects.bulk_create(to_insert)
-    SlurpitLog.info(category=LogCategoryChoices.ONBOARD, message=f"Sync staged {len(to_insert)} devices")
+        yield {key: value for key, value in device.items() if key in columns}
 
+def copy_staged_devices(rows):
+    """
+    Stream staged rows into the staging table with COPY FROM STDIN.
 
-def process_import(delete=True):
-    if delete:
-        handle_parted()
-    handle_changed()
-    handle_new_comers()
-    
+    Returns None when the database driver has no COPY support, so the caller can fall back to bulk_create.
+    """
+    now = timezone.now()
+    fields = [SlurpitStagedDevice._meta.get_field(key) for key in columns]
+    copy_columns = (*columns, 'created', 'last_updated', 'custom_field_data')
+    sql = f"COPY {SlurpitStagedDevice._meta.db_table} ({', '.join(copy_columns)}) FROM STDIN"
+
+    with connection.cursor() as cursor:
+        if not hasattr(cursor.cursor, 'copy'):
+            return None
+        count = 0
+        with cursor.cursor.copy(sql) as copy:
+            for row in rows:
+                values = (field.get_prep_value(row[field.name]) if field.name in row else field.get_default() for field in fields)
+                copy.write_row((*values, now, now, '{}'))
+                count += 1
+    return count
+
+def import_devices(devices):
+    # Rows are validated up front, failures are logged on the same connection the COPY runs on
+    rows = list(stage_rows(devices))
+    count = None
+    if connection.vendor == 'postgresql':
+        count = copy_staged_devices(rows)
+    if count is None:
+        to_insert = [SlurpitStagedDevice(**row) for row in rows]
+        SlurpitStagedDevice.objects.bulk_create(to_insert, batch_size=BATCH_SIZE)
+        count = len(to_insert)
+    SlurpitLog.info(category=LogCategoryChoices.ONBOARD, message=f"Sync staged {count} devices")
+    return count
+
+
+def process_import(delete=True, progress=None, slurpit_ids=None, tombstones=None):
+    """
+    Apply the staged devices to the imported devices.
+
+    A delta sync passes the `slurpit_ids` it staged and the `tombstones` of the devices removed from Slurp'it,
+    so only those rows are compared instead of the whole inventory.
+    """
+    progress = progress or JobProgress()
+    resolver = DcimObjectResolver()
+    counts = {'parted': 0}
+    try:
+        if tombstones is not None:
+            counts['parted'] = handle_tombstones(tombstones, progress)
+        elif delete:
+            counts['parted'] = handle_parted(progress)
+        counts['updated'] = handle_changed(resolver, progress, slurpit_ids)
+        counts['imported'] = handle_new_comers(resolver, progress, slurpit_ids)
+
+        # Catch up with devices renamed in NetBox without signals, the conflict checks match against these names
+        SlurpitDeviceName.rebuild()
+    finally:
+        # A failed sync can still have applied some of its batches
+        mark_onboarding_counts_stale()
     SlurpitLog.success(category=LogCategoryChoices.ONBOARD, message="Sync job completed.")
+    return counts
 
 
-def run_import():
-    devices = get_devices()
-    if devices is not None:
-        start_device_import()
+def process_delta(devices, tombstones, progress=None):
+    """
+    Stage the changed devices of a delta sync and apply them together with the `tombstones`.
+    """
+    slurpit_ids = [device['id'] for device in devices]
+    hostnames = [device['hostname'] for device in devices]
+    with transaction.atomic():
+        SlurpitStagedDevice.objects.filter(Q(hostname__in=hostnames) | Q(slurpit_id__in=slurpit_ids)).delete()
         import_devices(devices)
+    return process_import(False, progress, slurpit_ids=slurpit_ids, tombstones=tombstones)
+
+
+def get_onboarding_counts_version():
+    cache.add(ONBOARDING_COUNTS_VERSION_KEY, 0, None)
+    return cache.get(ONBOARDING_COUNTS_VERSION_KEY, 0)
+
+
+def mark_onboarding_counts_stale():
+    """
+    Flag the cached onboarding tab counters as stale. They are still shown until they are recounted.
+
+    The version is bumped atomically, counters taken while it moved keep the old version and stay stale.
+    """
+    cache.add(ONBOARDING_COUNTS_VERSION_KEY, 0, None)
+    cache.incr(ONBOARDING_COUNTS_VERSION_KEY)
+
+
+def run_import():
+    count, _ = pull_devices()
+    if count is not None:
         process_import()
         return 'done'
     else:
         return 'none'
 
 
-def handle_parted():
+def handle_parted(progress):
     parted_qs = SlurpitImportedDevice.objects.exclude(
         slurpit_id__in=SlurpitStagedDevice.objects.values('slurpit_id')
     )
+    progress.phase('parted')
     
     count = 0
     for device in parted_qs:
@@ -107,103 +280,205 @@ def handle_parted():
         #     device.mapped_device.status=status_offline()
         #     device.mapped_device.save()
         count += 1
+    progress.advance(count)
     SlurpitLog.info(category=LogCategoryChoices.ONBOARD, message=f"Sync parted {count} devices")
+    return count
+
+def handle_tombstones(slurpit_ids, progress):
+    progress.phase('parted', len(slurpit_ids))
+
+    with transaction.atomic():
+        parted_qs = SlurpitImportedDevice.objects.filter(slurpit_id__in=slurpit_ids)
+        count = parted_qs.count()
+        parted_qs.filter(mapped_device__isnull=True).delete()
+        SlurpitStagedDevice.objects.filter(slurpit_id__in=slurpit_ids).delete()
+
+    progress.advance(count)
+    SlurpitLog.info(category=LogCategoryChoices.ONBOARD, message=f"Sync parted {count} devices")
+    return count
+
+def get_device_watermark():
+    """
+    Return the highest Slurp'it `changeddate` applied to the imported devices, the starting point of the next delta sync.
+    """
+    return SlurpitImportedDevice.objects.aggregate(watermark=Max('changeddate'))['watermark']
+
+def staged_queryset(slurpit_ids=None):
+    if slurpit_ids is None:
+        return SlurpitStagedDevice.objects.all()
+    return SlurpitStagedDevice.objects.filter(slurpit_id__in=slurpit_ids)
     
 
-def handle_new_comers():
+def handle_new_comers(resolver, progress, slurpit_ids=None):
     unattended = get_config('unattended_import')
     
-    qs = SlurpitStagedDevice.objects.exclude(
+    qs = staged_queryset(slurpit_ids).exclude(
         slurpit_id__in=SlurpitImportedDevice.objects.values('slurpit_id')
     )
 
     offset = 0
     count = len(qs)
+    progress.phase('imported', count)
 
     while offset < count:
         batch_qs = qs[offset:offset + BATCH_SIZE]
+        resolver.prefetch(batch_qs)
         to_import = []        
         for device in batch_qs:
-            to_import.append(get_from_staged(device, unattended))
+            imported = get_from_staged(device, unattended, resolver)
+            imported.refresh_drift()
+            to_import.append(imported)
         SlurpitImportedDevice.objects.bulk_create(to_import, ignore_conflicts=True)
         offset += BATCH_SIZE
+        progress.advance(len(to_import))
 
     SlurpitLog.info(category=LogCategoryChoices.ONBOARD, message=f"Sync imported {count} devices")
+    return count
 
-def handle_changed():
+def handle_changed(resolver, progress, slurpit_ids=None):
     latest_changeddate_subquery = SlurpitImportedDevice.objects.filter(
         slurpit_id=OuterRef('slurpit_id')
     ).order_by('-changeddate').values('changeddate')[:1]
-    qs = SlurpitStagedDevice.objects.annotate(
+    qs = staged_queryset(slurpit_ids).annotate(
         latest_changeddate=Subquery(latest_changeddate_subquery)
     ).filter(
         changeddate__gt=F('latest_changeddate')
     )
     offset = 0
     count = len(qs)
+    progress.phase('updated', count)
 
     while offset < count:
-        batch_qs = qs[offset:offset + BATCH_SIZE]
-        to_import = []        
-        for device in batch_qs:
-            result = SlurpitImportedDevice.objects.get(slurpit_id=device.slurpit_id)
-            result.copy_staged_values(device)
-            result.save()
-            get_create_dcim_objects(device)
-            if result.mapped_device:
-                if device.disabled == False:
-                    if result.mapped_device.status==status_offline():
-                        result.mapped_device.status=status_inventory()
-                else:
-                    if result.mapped_device.status != status_offline():
-                        result.mapped_device.status=status_offline()
-
-                    
-                set_device_custom_fields(result.mapped_device, {
-                    'slurpit_hostname': device.hostname,
-                    'slurpit_fqdn': device.fqdn,
-                    'slurpit_ipv4': device.ipv4,
-                })   
-                
-                if device.ipv4:
-                    interface = Interface.objects.filter(device=result.mapped_device)
-                    if interface:
-                        interface = interface.first()
-                    else:
-                        interface = Interface.objects.create(name='management1', device=result.mapped_device, type='other')
-
-                    address = f'{device.ipv4}/32'
-                    ipaddress = IPAddress.objects.filter(address=address)
-                    if ipaddress:
-                        ipaddress = ipaddress.first()
-                    else:
-                        ipaddress = IPAddress.objects.create(address=address, status='active')
-                    
-                    ipaddress.assigned_object = interface
-                    ipaddress.save()
-                    result.mapped_device.primary_ip4 = ipaddress
-
-                result.mapped_device.name = device.hostname
-                result.mapped_device.save()
+        apply_changed_devices(qs[offset:offset + BATCH_SIZE], resolver)
         offset += BATCH_SIZE
+        progress.advance(min(BATCH_SIZE, count - progress.state['rows_done']))
 
     SlurpitLog.info(category=LogCategoryChoices.ONBOARD, message=f"Sync updated {count} devices")
+    return count
+
+def apply_changed_devices(staged_batch, resolver):
+    """
+    Apply one batch of changed staged devices to the imported devices and their mapped NetBox devices.
+
+    Everything the batch touches is loaded with a handful of `__in` queries. The imported devices are
+    written back with `bulk_update`, the NetBox objects are saved one by one so they are change logged,
+    indexed for search and seen by other receivers, as before.
+    """
+    now = timezone.now()
+    resolver.prefetch(staged_batch)
+    imported = {
+        device.slurpit_id: device
+        for device in SlurpitImportedDevice.objects.filter(
+            slurpit_id__in=[staged.slurpit_id for staged in staged_batch]
+        ).select_related('mapped_device')
+    }
+
+    to_update = []
+    mapped_devices = []
+    management_ips = []
+    for device in staged_batch:
+        result = imported[device.slurpit_id]
+        result.copy_staged_values(device)
+        result.last_updated = now
+        to_update.append(result)
+
+        get_create_dcim_objects(device, resolver)
+
+        mapped_device = result.mapped_device
+        if mapped_device is None:
+            result.refresh_drift()
+            continue
+
+        mapped_device.snapshot()
+        if device.disabled == False:
+            if mapped_device.status == status_offline():
+                mapped_device.status = status_inventory()
+        else:
+            if mapped_device.status != status_offline():
+                mapped_device.status = status_offline()
+
+        set_device_custom_fields(mapped_device, {
+            'slurpit_hostname': device.hostname,
+            'slurpit_fqdn': device.fqdn,
+            'slurpit_ipv4': device.ipv4,
+        })
+        mapped_device.name = device.hostname
+        mapped_devices.append(mapped_device)
+        result.refresh_drift()
+
+        if device.ipv4:
+            management_ips.append((mapped_device, device.ipv4))
+
+    SlurpitImportedDevice.objects.bulk_update(to_update, fields=(*IMPORTED_DEVICE_FIELDS, *DRIFT_UPDATE_FIELDS))
+
+    assign_management_ipv4(management_ips)
+
+    for mapped_device in mapped_devices:
+        mapped_device.save()
+    SlurpitDeviceName.update_names(mapped_devices)
+
+def host_address(ipv4):
+    try:
+        return str(netaddr.IPNetwork(f'{ipv4}/32'))
+    except netaddr.AddrFormatError:
+        return f'{ipv4}/32'
+
+def assign_management_ipv4(management_ips):
+    """
+    Set the primary IPv4 of each (device, ipv4) pair to a /32 address on the device's first interface,
+    creating the `management1` interface and the address where they do not exist yet.
+    """
+    if not management_ips:
+        return
+
+    interfaces = {}
+    for interface in Interface.objects.filter(device__in=[device for device, _ in management_ips]):
+        interfaces.setdefault(interface.device_id, interface)
+
+    for device, _ in management_ips:
+        if device.pk not in interfaces:
+            # Created one by one so the device component counters stay correct
+            interfaces[device.pk] = Interface.objects.create(name='management1', device=device, type='other')
+
+    addresses = {host_address(ipv4) for _, ipv4 in management_ips}
+    ipaddresses = {}
+    for ipaddress in IPAddress.objects.filter(address__in=addresses):
+        ipaddresses.setdefault(str(ipaddress.address), ipaddress)
+
+    interface_type = ContentType.objects.get_for_model(Interface)
+    for device, ipv4 in management_ips:
+        address = host_address(ipv4)
+        interface = interfaces[device.pk]
+        ipaddress = ipaddresses.get(address)
+        if ipaddress is None:
+            ipaddress = ipaddresses[address] = IPAddress.objects.create(address=address, status='active', assigned_object=interface)
+        elif ipaddress.assigned_object_type_id != interface_type.pk or ipaddress.assigned_object_id != interface.pk:
+            # Saved one by one like the interfaces, so the change is logged and the reconcile rows go stale
+            ipaddress.snapshot()
+            ipaddress.assigned_object = interface
+            ipaddress.save()
+        device.primary_ip4 = ipaddress
 
 def import_from_queryset(qs: QuerySet, **extra):
+    resolver = DcimObjectResolver()
     count = len(qs)
     offset = 0
 
     while offset < count:
         batch_qs = qs[offset:offset + BATCH_SIZE]
+        resolver.prefetch(batch_qs)
         to_import = []        
         for device in batch_qs:
-            device.mapped_device = get_dcim_device(device, **extra)
+            device.mapped_device = get_dcim_device(device, resolver, **extra)
+            device.refresh_drift()
             to_import.append(device)
-        SlurpitImportedDevice.objects.bulk_update(to_import, fields={'mapped_device_id'})
+        SlurpitImportedDevice.objects.bulk_update(to_import, fields=('mapped_device_id', *DRIFT_UPDATE_FIELDS))
         offset += BATCH_SIZE
 
-def get_dcim_device(staged: SlurpitStagedDevice | SlurpitImportedDevice, **extra) -> Device:
-    kw = get_default_objects()
+def get_dcim_device(staged: SlurpitStagedDevice | SlurpitImportedDevice, resolver: DcimObjectResolver = None, **extra) -> Device:
+    if resolver is None:
+        resolver = DcimObjectResolver()
+    kw = dict(resolver.defaults)
     cf = extra.pop(custom_field_data_name, {})
     interface_name = extra.pop('interface_name', 'management1')
 
@@ -216,10 +491,7 @@ def get_dcim_device(staged: SlurpitStagedDevice | SlurpitImportedDevice, **extra
         'slurpit_ipv4': staged.ipv4
     })    
 
-    try:
-        platform = Platform.objects.get(name=staged.device_os)
-    except:
-        platform = Platform.objects.get(slug=slugify(staged.device_os))
+    platform = resolver.get_platform(staged.device_os)
     
     devicetype = None
     if 'device_type' in extra:
@@ -276,15 +548,16 @@ def get_dcim_device(staged: SlurpitStagedDevice | SlurpitImportedDevice, **extra
 
 def get_from_staged(
         staged: SlurpitStagedDevice,
-        add_dcim: bool
+        add_dcim: bool,
+        resolver: DcimObjectResolver = None
 ) -> SlurpitImportedDevice:
     device = SlurpitImportedDevice()
     device.copy_staged_values(staged)
 
-    device.mapped_devicetype = get_create_dcim_objects(staged)
+    device.mapped_devicetype = get_create_dcim_objects(staged, resolver)
     if add_dcim:
         extra = {'device_type': device.mapped_devicetype} if device.mapped_devicetype else {}
-        device.mapped_device = get_dcim_device(staged, **extra)
+        device.mapped_device = get_dcim_device(staged, resolver, **extra)
     return device
 
 
@@ -315,8 +588,143 @@ def get_latest_data_on_planning(hostname, planning_id):
         SlurpitLog.failure(category=LogCategoryChoices.ONBOARD, message=log_message)
         return None
 
-def import_plannings(plannings, delete=True):
+def pack_snapshot_rows(rows):
+    """
+    Pack result rows into a column list and a row-major list of values. Columns keep the order in which
+    they first appear.
+    """
+    columns = {}
+    for row in rows:
+        for column in row:
+            columns.setdefault(column, None)
+    columns = list(columns)
+    return columns, [[row.get(column) for column in columns] for row in rows]
+
+
+def save_snapshots(results, replace=True):
+    """
+    Store planning results, a dict of (hostname, planning_id, result_type) to a list of result rows, as one
+    packed snapshot per key. Without `replace` the rows are added to the ones already stored.
+    """
+    if not results:
+        return 0
+
+    keys_q = Q()
+    for hostname, planning_id, result_type in results:
+        keys_q |= Q(hostname=hostname, planning_id=planning_id, result_type=result_type)
+
+    with transaction.atomic():
+        # Make sure every key has a row before locking, so concurrent pushes for a new key queue up on the
+        # same row instead of both inserting one
+        SlurpitSnapshot.objects.bulk_create([
+            SlurpitSnapshot(hostname=hostname, planning_id=planning_id, result_type=result_type)
+            for hostname, planning_id, result_type in sorted(results)
+        ], batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+        items = []
+        emptied = []
+        # bulk_update skips auto_now, the device tab keys its cached pages on this timestamp
+        now = timezone.now()
+        for snapshot in SlurpitSnapshot.objects.filter(keys_q).order_by('pk').select_for_update():
+            key = (snapshot.hostname, int(snapshot.planning_id), snapshot.result_type)
+            if key not in results:
+                continue
+            rows = results[key]
+            if not replace:
+                rows = [dict(zip(snapshot.columns, values)) for values in snapshot.content] + rows
+            if not rows:
+                emptied.append(snapshot.pk)
+                continue
+            snapshot.columns, snapshot.content = pack_snapshot_rows(rows)
+            snapshot.row_count = len(snapshot.content)
+            snapshot.last_updated = now
+            items.append(snapshot)
+
+        SlurpitSnapshot.objects.bulk_update(items, ['columns', 'content', 'row_count', 'last_updated'], batch_size=BATCH_SIZE)
+        SlurpitSnapshot.objects.filter(pk__in=emptied).delete()
+
+    return sum(item.row_count for item in items)
+
+def get_snapshot_cache_key(planning_id, hostname, result_type):
+    return f"slurpit_plan_{planning_id}_{hostname}_{result_type.removesuffix('_result')}"
+
+
+def warm_snapshot_cache(planning_id, hostnames):
+    """
+    Cache the snapshots of `hostnames` for the device tab, the same way the tab caches them when it reads them.
+    """
+    now = datetime.now()
+    entries = {
+        get_snapshot_cache_key(planning_id, hostname, result_type): None
+        for hostname in hostnames for result_type in ('planning_result', 'template_result')
+    }
+    for snapshot in SlurpitSnapshot.objects.filter(planning_id=planning_id, hostname__in=hostnames).defer('content'):
+        entries[get_snapshot_cache_key(planning_id, snapshot.hostname, snapshot.result_type)] = (now, snapshot)
+
+    cache.delete_many([key for key, value in entries.items() if value is None])
+    cache.set_many({key: value for key, value in entries.items() if value is not None}, SNAPSHOT_CACHE_TIMEOUT)
+
+
+def refresh_planning_snapshots(planning_id, progress=None):
+    """
+    Fetch the latest results of a planning for every device onboarded from Slurp'it and replace their snapshots.
+
+    Devices are fetched concurrently over a pooled session. The snapshots of a batch of devices are replaced
+    in one transaction and the device tab cache is warmed with them.
+    """
+    progress = progress or JobProgress()
+    planning = SlurpitPlanning.objects.get(planning_id=planning_id)
+    try:
+        setting = SlurpitSetting.objects.get()
+    except ObjectDoesNotExist:
+        SlurpitLog.failure(category=LogCategoryChoices.PLANNING, message="Need to set the setting parameter")
+        raise
+
+    hostnames = list(
+        Device.objects.filter(**{f'{custom_field_data_name}__slurpit_hostname__isnull': False})
+        .exclude(**{f'{custom_field_data_name}__slurpit_hostname': None})
+        .order_by('name').values_list('name', flat=True)
+    )
+    progress.phase('snapshots', len(hostnames))
+
+    def fetch(hostname):
+        try:
+            r = session.get(f"/api/devices/snapshot/single/{hostname}/{planning.planning_id}", timeout=15)
+            if r.status_code != 200:
+                return hostname, None
+            return hostname, r.json().get(planning.name)
+        except (requests.exceptions.RequestException, ValueError, AttributeError):
+            return hostname, None
+
+    refreshed = failed = 0
+    with SlurpitSession.from_setting(setting, pool_size=SNAPSHOT_CONCURRENCY) as session, \
+            ThreadPoolExecutor(max_workers=SNAPSHOT_CONCURRENCY) as executor:
+        for start in range(0, len(hostnames), BATCH_SIZE):
+            results = {}
+            batch_failed = 0
+            for hostname, data in executor.map(fetch, hostnames[start:start + BATCH_SIZE]):
+                if not data or data.get('planning_results') is None:
+                    batch_failed += 1
+                    continue
+                results[(hostname, planning.planning_id, 'planning_result')] = data['planning_results']
+                results[(hostname, planning.planning_id, 'template_result')] = data.get('template_results') or []
+
+            refreshed_hostnames = {hostname for hostname, _, _ in results}
+            save_snapshots(results)
+            warm_snapshot_cache(planning.planning_id, refreshed_hostnames)
+
+            refreshed += len(refreshed_hostnames)
+            failed += batch_failed
+            progress.advance(len(refreshed_hostnames) + batch_failed, refreshed=len(refreshed_hostnames), failed=batch_failed)
+
+    SlurpitLog.info(category=LogCategoryChoices.PLANNING, message=f"Refreshed the snapshots of {refreshed} devices for planning {planning.name}, {failed} failed")
+    return {'refreshed': refreshed, 'failed': failed}
+
+def import_plannings(plannings, delete=True, progress=None):
+    progress = progress or JobProgress()
     ids = {str(row['id']) : row for row in plannings if row['disabled'] == '0'}
+    progress.phase('plannings', len(ids))
+    count = 0
 
     with transaction.atomic():
         if delete:
@@ -325,17 +733,22 @@ def import_plannings(plannings, delete=True):
             SlurpitLog.info(category=LogCategoryChoices.PLANNING, message=f"Api parted {count} plannings")
     
         update_objects = SlurpitPlanning.objects.filter(planning_id__in=ids.keys())
-        SlurpitLog.info(category=LogCategoryChoices.PLANNING, message=f"Api updated {update_objects.count()} plannings")
+        updated = update_objects.count()
+        SlurpitLog.info(category=LogCategoryChoices.PLANNING, message=f"Api updated {updated} plannings")
         for planning in update_objects:
             obj = ids.pop(str(planning.planning_id))
             planning.name = obj['name']
             planning.comments = obj['comment']
             planning.save()
+        progress.advance(updated)
         
         to_save = []
         for obj in ids.values():
             to_save.append(SlurpitPlanning(name=obj['name'], comments=obj['comment'], planning_id=obj['id']))
         SlurpitPlanning.objects.bulk_create(to_save)
+        progress.advance(len(to_save))
         
         SlurpitLog.info(category=LogCategoryChoices.PLANNING, message=f"Api imported {len(to_save)} plannings")
-        SlurpitLog.success(category=LogCategoryChoices.PLANNING, message=f"Sync job completed.")
\ No newline at end of file
+        SlurpitLog.success(category=LogCategoryChoices.PLANNING, message=f"Sync job completed.")
+
+    return {'parted': count, 'updated': updated, 'imported': len(to_save)}
\ No newline at end of file
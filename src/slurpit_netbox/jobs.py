@@ -0,0 +1,244 @@
+import time
+
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django_rq import get_queue
+from netbox.constants import RQ_QUEUE_DEFAULT
+from rq import get_current_job
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
+
+from . import get_config
+from .models import SlurpitLog
+
+JOB_CACHE_TIMEOUT = 60 * 60 * 24
+JOB_LOCK_TIMEOUT = 30
+JOB_LOCK_WAIT = 10
+
+
+class JobProgress:
+    """
+    Progress of a queued Slurp'it job.
+
+    The state lives in the cache under the rq job id, so the API can report it while the worker is still
+    running. A progress without a job id (inline execution) tracks the state without storing it.
+    """
+    def __init__(self, job_id=None, name=''):
+        self.job_id = job_id
+        self.state = {
+            'name': name,
+            'phase': 'queued',
+            'rows_done': 0,
+            'rows_total': None,
+            'started': None,
+            'finished': None,
+            'counts': {},
+            'error': None,
+        }
+
+    @staticmethod
+    def cache_key(job_id):
+        return f"slurpit_job_{job_id}"
+
+    @classmethod
+    def current(cls):
+        """
+        Return the progress of the rq job running in this worker, if any.
+        """
+        job = get_current_job()
+        if job is None:
+            return cls()
+        progress = cls.load(job.id) or cls(job.id)
+        progress.job_id = job.id
+        return progress
+
+    @classmethod
+    def load(cls, job_id):
+        state = cache.get(cls.cache_key(job_id))
+        if state is None:
+            return None
+        progress = cls(job_id)
+        progress.state.update(state)
+        return progress
+
+    def save(self):
+        if self.job_id is not None:
+            cache.set(self.cache_key(self.job_id), self.state, JOB_CACHE_TIMEOUT)
+
+    def start(self):
+        self.state['started'] = time.time()
+        self.save()
+
+    def phase(self, name, total=None):
+        # Write the log entries of the previous phase
+        SlurpitLog.flush()
+        if self.state['started'] is None:
+            self.state['started'] = time.time()
+        self.state.update({'phase': name, 'rows_done': 0, 'rows_total': total})
+        self.save()
+
+    def advance(self, count, **counts):
+        self.state['rows_done'] += count
+        for key, value in counts.items():
+            self.state['counts'][key] = self.state['counts'].get(key, 0) + value
+        self.save()
+
+    def finish(self, **counts):
+        self.state['counts'].update(counts)
+        self.state.update({'phase': 'done', 'finished': time.time()})
+        self.save()
+
+    def fail(self, error):
+        self.state.update({'error': str(error), 'finished': time.time()})
+        self.save()
+
+    @property
+    def elapsed(self):
+        if self.state['started'] is None:
+            return 0
+        return round((self.state['finished'] or time.time()) - self.state['started'], 1)
+
+
+@contextmanager
+def cache_lock(key, timeout, wait):
+    """
+    Hold a lock shared by all processes for the duration of the block. cache.add is atomic, so only one
+    caller gets the key.
+    """
+    deadline = time.monotonic() + wait
+    while not cache.add(key, True, timeout):
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Timed out waiting for {key}")
+        time.sleep(0.1)
+    try:
+        yield
+    finally:
+        cache.delete(key)
+
+
+def enqueue_job(func, *args, name, unique=False):
+    """
+    Queue `func` as a NetBox background job and return the job id.
+
+    With `unique`, an already queued or running job of the same name is returned instead of queueing the
+    work twice, e.g. when Slurp'it retries a request that timed out. The name should include the arguments
+    that make the work different.
+    """
+    queue = get_queue(RQ_QUEUE_DEFAULT)
+    if not unique:
+        return _enqueue(queue, func, args, name)
+
+    # Of two concurrent requests only one checks and queues the job at a time
+    with cache_lock(f"slurpit_job_lock_{name}", JOB_LOCK_TIMEOUT, JOB_LOCK_WAIT):
+        active_key = f"slurpit_job_active_{name}"
+        if job_id := cache.get(active_key):
+            try:
+                if Job.fetch(job_id, connection=queue.connection).get_status() in ('queued', 'started'):
+                    return job_id
+            except NoSuchJobError:
+                pass
+
+        job_id = _enqueue(queue, func, args, name)
+        cache.set(active_key, job_id, JOB_CACHE_TIMEOUT)
+        return job_id
+
+
+def _enqueue(queue, func, args, name):
+    job = queue.enqueue(func, *args, job_timeout=get_config('job_timeout'), result_ttl=JOB_CACHE_TIMEOUT)
+    JobProgress(job.id, name).save()
+    return job.id
+
+
+def get_job_status(job_id):
+    """
+    Return the status, progress and final counts of a queued job, or None for an unknown job.
+    """
+    queue = get_queue(RQ_QUEUE_DEFAULT)
+    try:
+        job = Job.fetch(job_id, connection=queue.connection)
+    except NoSuchJobError:
+        return None
+
+    progress = JobProgress.load(job_id) or JobProgress(job_id)
+    return {
+        'job_id': job_id,
+        'status': str(job.get_status()),
+        'name': progress.state['name'],
+        'phase': progress.state['phase'],
+        'rows_done': progress.state['rows_done'],
+        'rows_total': progress.state['rows_total'],
+        'elapsed': progress.elapsed,
+        'counts': progress.state['counts'],
+        'error': progress.state['error'],
+    }
+
+
+def run_job(func, *args, **kwargs):
+    progress = JobProgress.current()
+    progress.start()
+    with SlurpitLog.buffered():
+        try:
+            counts = func(*args, progress=progress, **kwargs) or {}
+        except Exception as e:
+            progress.fail(e)
+            raise
+    progress.finish(**counts)
+    return counts
+
+
+@contextmanager
+def import_lock():
+    # Full and delta imports work on the same staged table, so only one of them runs at a time
+    timeout = get_config('job_timeout')
+    with cache_lock("slurpit_import_lock", timeout, timeout):
+        yield
+
+
+def process_import_job(delete=True):
+    from .importer import process_import
+    from .views.onboarding import count_onboarding_tabs
+    with import_lock():
+        counts = run_job(process_import, delete)
+    count_onboarding_tabs()
+    return counts
+
+
+def process_delta_job(devices, tombstones):
+    from .importer import process_delta
+    from .views.onboarding import count_onboarding_tabs
+    # The devices are staged under the lock as well, so a full pull can't truncate them before they're applied
+    with import_lock():
+        counts = run_job(process_delta, devices, tombstones)
+    count_onboarding_tabs()
+    return counts
+
+
+def count_onboarding_tabs_job():
+    from .views.onboarding import count_onboarding_tabs
+    return count_onboarding_tabs()
+
+
+def import_plannings_job(plannings, delete=True):
+    from .importer import import_plannings
+    return run_job(import_plannings, plannings, delete)
+
+
+def accept_reconcile_job(tab, pk_list, accept_all):
+    from .views.reconcile import accept_reconcile_items
+    return run_job(accept_reconcile_items, tab, pk_list, accept_all)
+
+
+def refresh_reconcile_diffs_job():
+    from .reconcile import refresh_stale_reconcile_rows
+    return run_job(refresh_stale_reconcile_rows)
+
+
+def push_devices_job(device_status=None):
+    from .views.datamapping import push_devices
+    return run_job(push_devices, device_status)
+
+
+def refresh_planning_snapshots_job(planning_id):
+    from .importer import refresh_planning_snapshots
+    return run_job(refresh_planning_snapshots, planning_id)
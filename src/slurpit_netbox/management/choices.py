@@ -48,4 +48,16 @@ class SlurpitApplianceTypeChoices(ChoiceSet):
         (PUSH, _('PUSH')),
         (PULL, _('PULL')),
         (BOTH, _('BOTH')),
-    )
\ No newline at end of file
+    )
+
+class ReconcileActionChoices(ChoiceSet):
+
+    CREATE = 'create'
+    UPDATE = 'update'
+    NOOP = 'noop'
+
+    CHOICES = (
+        (CREATE, _('Adding'), 'green'),
+        (UPDATE, _('Changing'), 'orange'),
+        (NOOP, _('No change'), 'gray'),
+    )
@@ -0,0 +1,23 @@
+from django.conf import settings
+
+from . import config
+from .models import SlurpitLog
+
+
+class SlurpitLogMiddleware:
+    """
+    Buffer the Slurp'it log entries of a request to the plugin's views and API, and write them in bulk when
+    it's done. Other requests log as before.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefixes = (
+            f"/{settings.BASE_PATH}plugins/{config.base_url}/",
+            f"/{settings.BASE_PATH}api/plugins/{config.base_url}/",
+        )
+
+    def __call__(self, request):
+        if not request.path_info.startswith(self.prefixes):
+            return self.get_response(request)
+        with SlurpitLog.buffered():
+            return self.get_response(request)
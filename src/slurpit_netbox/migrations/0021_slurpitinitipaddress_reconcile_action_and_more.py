@@ -0,0 +1,81 @@
+# Generated by Django 5.0.6 on 2024-09-12 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("slurpit_netbox", "0020_alter_slurpitinitipaddress_ignore_description_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="slurpitinitipaddress",
+            name="reconcile_action",
+            field=models.CharField(
+                blank=True,
+                choices=[("create", "Adding"), ("update", "Changing"), ("noop", "No change")],
+                db_index=True,
+                editable=False,
+                max_length=10,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="slurpitinitipaddress",
+            name="reconcile_diff",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="slurpitinterface",
+            name="reconcile_action",
+            field=models.CharField(
+                blank=True,
+                choices=[("create", "Adding"), ("update", "Changing"), ("noop", "No change")],
+                db_index=True,
+                editable=False,
+                max_length=10,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="slurpitinterface",
+            name="reconcile_diff",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="slurpitprefix",
+            name="reconcile_action",
+            field=models.CharField(
+                blank=True,
+                choices=[("create", "Adding"), ("update", "Changing"), ("noop", "No change")],
+                db_index=True,
+                editable=False,
+                max_length=10,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="slurpitprefix",
+            name="reconcile_diff",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="slurpitvlan",
+            name="reconcile_action",
+            field=models.CharField(
+                blank=True,
+                choices=[("create", "Adding"), ("update", "Changing"), ("noop", "No change")],
+                db_index=True,
+                editable=False,
+                max_length=10,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="slurpitvlan",
+            name="reconcile_diff",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.6 on 2024-09-16 10:12
+
+import json
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def decode_snapshot_content(apps, schema_editor):
+    """
+    Snapshots used to store their content as a JSON encoded string. Store it as a JSON object and keep the
+    column order in `columns`.
+    """
+    SlurpitSnapshot = apps.get_model("slurpit_netbox", "SlurpitSnapshot")
+
+    last_pk = 0
+    while True:
+        batch = list(SlurpitSnapshot.objects.filter(pk__gt=last_pk).order_by("pk")[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+
+        for snapshot in batch:
+            content = snapshot.content
+            if isinstance(content, str):
+                try:
+                    content = json.loads(content)
+                except ValueError:
+                    content = {}
+            if not isinstance(content, dict):
+                content = {}
+            snapshot.content = content
+            snapshot.columns = list(content.keys())
+        SlurpitSnapshot.objects.bulk_update(batch, ["content", "columns"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("slurpit_netbox", "0021_slurpitinitipaddress_reconcile_action_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="slurpitsnapshot",
+            name="columns",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(decode_snapshot_content, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.0.6 on 2024-09-17 09:40
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def pack_snapshots(apps, schema_editor):
+    """
+    Snapshots used to hold one result row each. Pack the rows of every (hostname, planning, result type) into
+    a single snapshot with a row-major list of values.
+    """
+    SlurpitSnapshot = apps.get_model("slurpit_netbox", "SlurpitSnapshot")
+
+    last_pk = SlurpitSnapshot.objects.aggregate(models.Max("pk"))["pk__max"]
+    if last_pk is None:
+        return
+
+    items = []
+
+    def pack(key, rows):
+        columns = {}
+        for row in rows:
+            for column in row:
+                columns.setdefault(column, None)
+        columns = list(columns)
+        content = [[row.get(column) for column in columns] for row in rows]
+        items.append(SlurpitSnapshot(
+            hostname=key[0], planning_id=key[1], result_type=key[2],
+            columns=columns, content=content, row_count=len(content)
+        ))
+        if len(items) >= BATCH_SIZE:
+            SlurpitSnapshot.objects.bulk_create(items)
+            items.clear()
+
+    key = None
+    rows = []
+    queryset = SlurpitSnapshot.objects.filter(pk__lte=last_pk).order_by("hostname", "planning_id", "result_type", "pk").values_list(
+        "hostname", "planning_id", "result_type", "columns", "content"
+    )
+    for hostname, planning_id, result_type, columns, content in queryset.iterator(chunk_size=BATCH_SIZE):
+        if (hostname, planning_id, result_type) != key:
+            if rows:
+                pack(key, rows)
+            key = (hostname, planning_id, result_type)
+            rows = []
+        if isinstance(content, dict):
+            rows.append({column: content.get(column) for column in columns or content})
+    if rows:
+        pack(key, rows)
+    if items:
+        SlurpitSnapshot.objects.bulk_create(items)
+
+    SlurpitSnapshot.objects.filter(pk__lte=last_pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("slurpit_netbox", "0022_slurpitsnapshot_columns"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="slurpitsnapshot",
+            name="row_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name="slurpitsnapshot",
+            name="content",
+            field=models.JSONField(default=list),
+        ),
+        migrations.RunPython(pack_snapshots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="slurpitsnapshot",
+            constraint=models.UniqueConstraint(
+                fields=("hostname", "planning_id", "result_type"), name="slurpit_netbox_slurpitsnapshot_unique_result"
+            ),
+        ),
+    ]
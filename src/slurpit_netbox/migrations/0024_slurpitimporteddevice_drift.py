@@ -0,0 +1,73 @@
+# Generated by Django 5.0.6 on 2024-09-19 14:05
+
+import hashlib
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+DRIFT_FIELDS = (
+    ("slurpit_devicetype", "device_type"),
+    ("slurpit_hostname", "hostname"),
+    ("slurpit_fqdn", "fqdn"),
+    ("slurpit_platform", "device_os"),
+    ("slurpit_manufacturer", "brand"),
+    ("slurpit_ipv4", "ipv4"),
+)
+
+
+def get_fingerprint(values):
+    digest = hashlib.sha1(usedforsecurity=False)
+    for value in values:
+        digest.update(f"{'' if value is None else value}\x1e".encode())
+    return digest.hexdigest()
+
+
+def compute_drift(apps, schema_editor):
+    SlurpitImportedDevice = apps.get_model("slurpit_netbox", "SlurpitImportedDevice")
+
+    last_pk = 0
+    while True:
+        batch = list(
+            SlurpitImportedDevice.objects.filter(pk__gt=last_pk).select_related("mapped_device").order_by("pk")[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+
+        for device in batch:
+            device.slurpit_hash = get_fingerprint(getattr(device, field) for _, field in DRIFT_FIELDS)
+            if device.mapped_device is None:
+                device.applied_hash = ""
+                device.drift = False
+            else:
+                custom_field_data = device.mapped_device.custom_field_data or {}
+                device.applied_hash = get_fingerprint(custom_field_data.get(name) for name, _ in DRIFT_FIELDS)
+                device.drift = device.applied_hash != device.slurpit_hash
+        SlurpitImportedDevice.objects.bulk_update(batch, ["slurpit_hash", "applied_hash", "drift"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("slurpit_netbox", "0023_slurpitsnapshot_row_count_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="slurpitimporteddevice",
+            name="slurpit_hash",
+            field=models.CharField(blank=True, default="", editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name="slurpitimporteddevice",
+            name="applied_hash",
+            field=models.CharField(blank=True, default="", editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name="slurpitimporteddevice",
+            name="drift",
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.RunPython(compute_drift, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.6 on 2024-09-20 11:32
+
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def populate_device_names(apps, schema_editor):
+    SlurpitDeviceName = apps.get_model("slurpit_netbox", "SlurpitDeviceName")
+    Device = apps.get_model("dcim", "Device")
+    names = Device.objects.filter(name__isnull=False).values_list("pk", django.db.models.functions.text.Lower("name"))
+    SlurpitDeviceName.objects.bulk_create(
+        (SlurpitDeviceName(device_id=pk, name=name) for pk, name in names.iterator(chunk_size=BATCH_SIZE)),
+        batch_size=BATCH_SIZE
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dcim", "0187_alter_device_vc_position"),
+        ("slurpit_netbox", "0024_slurpitimporteddevice_drift"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SlurpitDeviceName",
+            fields=[
+                (
+                    "device",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="+",
+                        serialize=False,
+                        to="dcim.device",
+                    ),
+                ),
+                ("name", models.CharField(db_index=True, max_length=64)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="slurpitimporteddevice",
+            index=models.Index(
+                django.db.models.functions.text.Lower("hostname"), name="slurpit_imported_lower_host"
+            ),
+        ),
+        migrations.RunPython(populate_device_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2024-09-23 10:18
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("slurpit_netbox", "0025_slurpitdevicename_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="slurpitlog",
+            name="log_time",
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -6,7 +6,7 @@ from core.models import ObjectType
 from django.db.models import Q, Transform, CharField, TextField
 
 from .. import get_config
-from .device import SlurpitImportedDevice, SlurpitStagedDevice
+from .device import SlurpitDeviceName, SlurpitImportedDevice, SlurpitStagedDevice
 from .planning import SlurpitPlanning, SlurpitSnapshot
 from .setting import SlurpitSetting
 from .logs import SlurpitLog
@@ -1,4 +1,7 @@
+import hashlib
+
 from django.db import models
+from django.db.models.functions import Lower
 from dcim.models import Device, DeviceType
 
 """
@@ -29,6 +32,24 @@ class SlurpitStagedDevice(NetBoxModel):
         return f"{self.hostname}"
     
     
+# The Slurp'it custom fields of a device and the imported device attributes they are set from
+DRIFT_FIELDS = (
+    ('slurpit_devicetype', 'device_type'),
+    ('slurpit_hostname', 'hostname'),
+    ('slurpit_fqdn', 'fqdn'),
+    ('slurpit_platform', 'device_os'),
+    ('slurpit_manufacturer', 'brand'),
+    ('slurpit_ipv4', 'ipv4'),
+)
+
+
+def get_fingerprint(values):
+    digest = hashlib.sha1(usedforsecurity=False)
+    for value in values:
+        digest.update(f"{'' if value is None else value}\x1e".encode())
+    return digest.hexdigest()
+
+
 class SlurpitImportedDevice(NetBoxModel):
     slurpit_id = models.BigIntegerField(unique=True)
     disabled = models.BooleanField(default=False)
@@ -42,6 +63,17 @@ class SlurpitImportedDevice(NetBoxModel):
     changeddate = models.DateTimeField()
     mapped_devicetype = models.ForeignKey(to=DeviceType, null=True, on_delete=models.SET_NULL)
     mapped_device = models.OneToOneField(to=Device, null=True, on_delete=models.CASCADE)
+    # Fingerprints of the Slurp'it attributes and of the ones last applied to the mapped device. A mapped device
+    # whose fingerprints differ needs a migration.
+    slurpit_hash = models.CharField(max_length=40, blank=True, default='', editable=False)
+    applied_hash = models.CharField(max_length=40, blank=True, default='', editable=False)
+    drift = models.BooleanField(default=False, db_index=True, editable=False)
+
+    class Meta:
+        indexes = (
+            # Hostnames are matched case-insensitively against the NetBox device names
+            models.Index(Lower('hostname'), name='slurpit_imported_lower_host'),
+        )
 
     def get_absolute_url(self):
         return '/'
@@ -67,3 +99,72 @@ class SlurpitImportedDevice(NetBoxModel):
         self.changeddate = device.changeddate
 
     
+
+    def refresh_drift(self):
+        """
+        Recompute the fingerprints and the drift flag from the imported attributes and the custom fields of the
+        mapped device.
+        """
+        self.slurpit_hash = get_fingerprint(getattr(self, field) for _, field in DRIFT_FIELDS)
+        if self.mapped_device_id is None:
+            self.applied_hash = ''
+            self.drift = False
+        else:
+            custom_field_data = self.mapped_device.custom_field_data or {}
+            self.applied_hash = get_fingerprint(custom_field_data.get(name) for name, _ in DRIFT_FIELDS)
+            self.drift = self.applied_hash != self.slurpit_hash
+
+    def save(self, *args, **kwargs):
+        self.refresh_drift()
+        super().save(*args, **kwargs)
+
+
+NAME_BATCH_SIZE = 1000
+
+
+class SlurpitDeviceName(models.Model):
+    """
+    The lowercased name of every NetBox device, so hostnames are matched case-insensitively through an index
+    instead of scanning the devices. Refreshed by the device import paths and before the conflict actions.
+    """
+    device = models.OneToOneField(to=Device, primary_key=True, on_delete=models.CASCADE, related_name='+')
+    name = models.CharField(max_length=64, db_index=True)
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def update_names(cls, devices):
+        cls.sync_names([device.pk for device in devices])
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Bring the whole table in line with the NetBox devices, e.g. after devices were changed in NetBox.
+        """
+        cls.sync_names()
+
+    @classmethod
+    def sync_names(cls, device_ids=None):
+        devices = Device.objects.filter(name__isnull=False)
+        stored = cls.objects.all()
+        if device_ids is not None:
+            device_ids = list(device_ids)
+            if not device_ids:
+                return
+            devices = devices.filter(pk__in=device_ids)
+            stored = stored.filter(device_id__in=device_ids)
+
+        # Names are lowercased by the database, with the same LOWER() the hostname lookups use
+        names = dict(devices.values_list('pk', Lower('name')))
+        current = dict(stored.values_list('device_id', 'name'))
+
+        cls.objects.filter(device_id__in=[pk for pk in current if pk not in names]).delete()
+        cls.objects.bulk_create(
+            [cls(device_id=pk, name=name) for pk, name in names.items() if pk not in current],
+            batch_size=NAME_BATCH_SIZE, ignore_conflicts=True
+        )
+        cls.objects.bulk_update(
+            [cls(device_id=pk, name=name) for pk, name in names.items() if pk in current and current[pk] != name],
+            ['name'], batch_size=NAME_BATCH_SIZE
+        )
@@ -14,6 +14,7 @@ from dcim.fields import MACAddressField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from dcim.constants import INTERFACE_MTU_MIN, INTERFACE_MTU_MAX
 from urllib.parse import urlencode
+from ..management.choices import ReconcileActionChoices
 
 class ComponentModel(NetBoxModel):
     """
@@ -215,6 +216,23 @@ class SlurpitInterface(ModularComponentModel, BaseInterface, CabledObjectModel,
         null=True,
         verbose_name=_('ignore duplex'),
     )
+
+    reconcile_action = models.CharField(
+        max_length=10,
+        choices=ReconcileActionChoices,
+        blank=True,
+        null=True,
+        db_index=True,
+        editable=False,
+        verbose_name=_('commit action'),
+    )
+    reconcile_diff = models.JSONField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name=_('reconcile diff'),
+    )
+
     class Meta:
         verbose_name = _('Slurpit Device Interface')
         verbose_name_plural = _('Slurpit Device Interface')
@@ -14,6 +14,7 @@ from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
 from netbox.config import get_config
 from urllib.parse import urlencode
+from ..management.choices import ReconcileActionChoices
 
 class SlurpitInitIPAddress(PrimaryModel):
     """
@@ -103,6 +104,22 @@ class SlurpitInitIPAddress(PrimaryModel):
         verbose_name=_('ignore description'),
     )
 
+    reconcile_action = models.CharField(
+        max_length=10,
+        choices=ReconcileActionChoices,
+        blank=True,
+        null=True,
+        db_index=True,
+        editable=False,
+        verbose_name=_('commit action'),
+    )
+    reconcile_diff = models.JSONField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name=_('reconcile diff'),
+    )
+
     class Meta:
         verbose_name = _('Slurpit IP address')
         verbose_name_plural = _('Slurpit  IP addresses')
@@ -1,14 +1,27 @@
+import threading
+
+from contextlib import contextmanager
+
 from core.choices import DataSourceStatusChoices
 from ..management.choices import LogLevelChoices, LogCategoryChoices
 from django.db import models
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.module_loading import import_string
 from django.utils.translation import gettext as _
 from netbox.models import PrimaryModel
 from extras.querysets import ObjectChangeQuerySet
 
+# Buffered log entries are written once this many are gathered
+LOG_BUFFER_SIZE = 500
+LOG_MESSAGE_LENGTH = 200
+
+_local = threading.local()
+
+
 class SlurpitLog(models.Model):
-    log_time = models.DateTimeField(blank=True, auto_now=True, editable=False)
+    # Set when the entry is logged, a buffered entry keeps its time when it's written later
+    log_time = models.DateTimeField(blank=True, default=timezone.now, editable=False)
     level = models.CharField(
         max_length=100, 
         choices=LogLevelChoices,
@@ -21,21 +34,63 @@ class SlurpitLog(models.Model):
         default=LogCategoryChoices.INIT,
         editable=False,
     )
-    message = models.CharField(max_length=200)
+    message = models.CharField(max_length=LOG_MESSAGE_LENGTH)
 
     objects = ObjectChangeQuerySet.as_manager()
     
     def get_absolute_url(self):        
         return '/'
 
+    def log(level, category, message):
+        # A bulk insert fails as a whole on one message that doesn't fit, longer ones are cut and marked
+        message = str(message)
+        if len(message) > LOG_MESSAGE_LENGTH:
+            message = message[:LOG_MESSAGE_LENGTH - 1] + '…'
+        entry = SlurpitLog(level=level, category=category, message=message, log_time=timezone.now())
+        buffer = getattr(_local, 'buffer', None)
+        if buffer is None:
+            entry.save()
+            return
+        buffer.append(entry)
+        if len(buffer) >= LOG_BUFFER_SIZE:
+            SlurpitLog.flush()
+
     def info(category, message):
-        SlurpitLog.objects.create(level=LogLevelChoices.LOG_INFO, category=category, message=message)
+        SlurpitLog.log(LogLevelChoices.LOG_INFO, category, message)
 
     def warn(category, message):
-        SlurpitLog.objects.create(level=LogLevelChoices.LOG_WARNING, category=category, message=message)
+        SlurpitLog.log(LogLevelChoices.LOG_WARNING, category, message)
 
     def success(category, message):
-        SlurpitLog.objects.create(level=LogLevelChoices.LOG_SUCCESS, category=category, message=message)
+        SlurpitLog.log(LogLevelChoices.LOG_SUCCESS, category, message)
 
     def failure(category, message):
-        SlurpitLog.objects.create(level=LogLevelChoices.LOG_FAILURE, category=category, message=message)
+        SlurpitLog.log(LogLevelChoices.LOG_FAILURE, category, message)
+
+    def flush():
+        """
+        Write the buffered entries of this thread in one insert, in the order they were logged.
+        """
+        buffer = getattr(_local, 'buffer', None)
+        if buffer:
+            entries = buffer[:]
+            buffer.clear()
+            SlurpitLog.objects.bulk_create(entries)
+
+    @contextmanager
+    def buffered():
+        """
+        Gather the entries logged by this thread and write them in bulk, when the buffer fills up, on flush()
+        and when the block exits, also on an exception. A nested block joins the outer buffer.
+        """
+        if getattr(_local, 'buffer', None) is not None:
+            yield
+            return
+        _local.buffer = []
+        try:
+            yield
+        finally:
+            try:
+                SlurpitLog.flush()
+            finally:
+                _local.buffer = None
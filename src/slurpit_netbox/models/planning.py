@@ -1,4 +1,6 @@
-from django.db import models
+import json
+
+from django.db import connection, models
 from netbox.models import PrimaryModel
 from django.urls import reverse
 
@@ -13,11 +15,79 @@ class SlurpitPlanning(PrimaryModel):
     def get_absolute_url(self):
         return reverse("plugins:slurpit_netbox:slurpitplanning", args=[self.pk])
 
+class JSONBSlice(models.Func):
+    function = 'jsonb_path_query_array'
+    template = "%(function)s(%(expressions)s::jsonpath)"
+    output_field = models.JSONField()
+
+
 class SlurpitSnapshot(PrimaryModel):
     hostname = models.CharField(max_length=255)
     planning_id = models.BigIntegerField()
-    content = models.JSONField()
+    # All result rows of a device for a planning, as a row-major list of values in the order of `columns`
+    content = models.JSONField(default=list)
+    columns = models.JSONField(blank=True, default=list)
+    row_count = models.PositiveIntegerField(default=0)
     result_type = models.CharField(max_length=255, default="template_result")
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('hostname', 'planning_id', 'result_type'),
+                name='%(app_label)s_%(class)s_unique_result'
+            ),
+        )
+
     def __str__(self):
-        return f"{self.hostname}#{self.planning_id}"
\ No newline at end of file
+        return f"{self.hostname}#{self.planning_id}"
+
+    def get_rows(self, start=0, stop=None, search='', order_by=None):
+        """
+        Return the result rows from `start` up to `stop` as dicts. Rows can be filtered on a `search` string,
+        matched against all values, and ordered by a column name (prefixed with '-' for descending order).
+        Only the requested rows are read from the database.
+        """
+        if stop is None:
+            stop = self.row_count
+        if start >= stop:
+            return []
+
+        if not search and not order_by:
+            stop = min(stop, self.row_count)
+            values = SlurpitSnapshot.objects.filter(pk=self.pk).annotate(
+                rows=JSONBSlice('content', models.Value(f'$[{start} to {stop - 1}]'))
+            ).values_list('rows', flat=True).first() or []
+        else:
+            sql, params = self._rows_sql(search)
+            order = 'r.n'
+            if order_by and order_by.lstrip('-') in self.columns:
+                direction = 'DESC' if order_by.startswith('-') else 'ASC'
+                # Compare as jsonb so numbers sort numerically instead of as text
+                order = f"r.value -> {self.columns.index(order_by.lstrip('-'))} {direction}, r.n"
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT r.value {sql} ORDER BY {order} LIMIT %s OFFSET %s", (*params, stop - start, start))
+                values = [json.loads(row) if isinstance(row, str) else row for row, in cursor.fetchall()]
+
+        return [dict(zip(self.columns, row)) for row in values]
+
+    def count_rows(self, search=''):
+        if not search:
+            return self.row_count
+        sql, params = self._rows_sql(search)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) {sql}", params)
+            return cursor.fetchone()[0]
+
+    def _rows_sql(self, search):
+        # Unnest the packed rows of this snapshot, numbered to keep their stored order
+        sql = (
+            f"FROM {self._meta.db_table} s "
+            f"CROSS JOIN LATERAL jsonb_array_elements(s.content) WITH ORDINALITY AS r(value, n) "
+            f"WHERE s.id = %s"
+        )
+        params = [self.pk]
+        if search:
+            sql += " AND EXISTS (SELECT 1 FROM jsonb_array_elements_text(r.value) AS v(text) WHERE v.text ILIKE %s)"
+            search = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f'%{search}%')
+        return sql, params
@@ -11,6 +11,7 @@ from ipam.querysets import PrefixQuerySet
 from netbox.config import get_config
 from django.core.exceptions import ValidationError
 from urllib.parse import urlencode
+from ..management.choices import ReconcileActionChoices
 class GetAvailablePrefixesMixin:
 
     def get_available_prefixes(self):
@@ -139,6 +140,22 @@ class SlurpitPrefix(GetAvailablePrefixesMixin, PrimaryModel):
         null=True,
         verbose_name=_('ignore description'),
     )
+
+    reconcile_action = models.CharField(
+        max_length=10,
+        choices=ReconcileActionChoices,
+        blank=True,
+        null=True,
+        db_index=True,
+        editable=False,
+        verbose_name=_('commit action'),
+    )
+    reconcile_diff = models.JSONField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name=_('reconcile diff'),
+    )
     
 
     # Cached depth & child counts
@@ -13,6 +13,7 @@ from ipam.querysets import VLANQuerySet, VLANGroupQuerySet
 from dcim.models import Interface
 from virtualization.models import VMInterface
 from urllib.parse import urlencode
+from ..management.choices import ReconcileActionChoices
 
 class SlurpitVLAN(PrimaryModel):
     """
@@ -123,6 +124,23 @@ class SlurpitVLAN(PrimaryModel):
         null=True,
         verbose_name=_('ignore description'),
     )
+
+    reconcile_action = models.CharField(
+        max_length=10,
+        choices=ReconcileActionChoices,
+        blank=True,
+        null=True,
+        db_index=True,
+        editable=False,
+        verbose_name=_('commit action'),
+    )
+    reconcile_diff = models.JSONField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name=_('reconcile diff'),
+    )
+
     objects = VLANQuerySet.as_manager()
 
     clone_fields = [
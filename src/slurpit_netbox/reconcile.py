@@ -0,0 +1,225 @@
+import hashlib
+
+from django.db.models import Model, Q
+
+from .importer import BATCH_SIZE
+from .jobs import JobProgress
+from .management.choices import ReconcileActionChoices
+from .models import SlurpitInitIPAddress, SlurpitInterface, SlurpitPrefix, SlurpitVLAN
+from dcim.models import Interface
+from ipam.models import IPAddress, Prefix, VLAN, VLANGroup
+
+INTERFACE_DIFF_FIELDS = ('name', 'label', 'description', 'device', 'module', 'type', 'duplex', 'speed')
+PREFIX_DIFF_FIELDS = ('prefix', 'status', 'vrf', 'vlan', 'tenant', 'site', 'role', 'description')
+IPADDRESS_DIFF_FIELDS = ('address', 'status', 'dns_name', 'description', 'vrf', 'tenant', 'role')
+VLAN_DIFF_FIELDS = ('name', 'group', 'vid', 'status', 'role', 'tenant', 'description')
+
+
+def vrf_q(vrf_ids):
+    q = Q(vrf_id__in=vrf_ids - {None})
+    if None in vrf_ids:
+        q |= Q(vrf__isnull=True)
+    return q
+
+
+def current_interfaces(rows):
+    current = {}
+    for interface in Interface.objects.filter(
+        device_id__in={row['device'] for row in rows},
+        name__in={row['name'] for row in rows}
+    ).values(*INTERFACE_DIFF_FIELDS):
+        current.setdefault((interface['device'], interface['name']), interface)
+    return {row['pk']: current.get((row['device'], row['name'])) for row in rows}
+
+
+def current_prefixes(rows):
+    current = {}
+    for prefix in Prefix.objects.filter(
+        vrf_q({row['vrf'] for row in rows}),
+        prefix__in={row['prefix'] for row in rows}
+    ).values(*PREFIX_DIFF_FIELDS):
+        prefix['prefix'] = str(prefix['prefix'])
+        current.setdefault((prefix['vrf'], prefix['prefix']), prefix)
+    return {row['pk']: current.get((row['vrf'], row['prefix'])) for row in rows}
+
+
+def current_ipaddresses(rows):
+    current = {}
+    for ipaddress in IPAddress.objects.filter(
+        vrf_q({row['vrf'] for row in rows}),
+        address__in={row['address'] for row in rows}
+    ).values(*IPADDRESS_DIFF_FIELDS):
+        ipaddress['address'] = str(ipaddress['address'])
+        current.setdefault((ipaddress['vrf'], ipaddress['address']), ipaddress)
+    return {row['pk']: current.get((row['vrf'], row['address'])) for row in rows}
+
+
+def current_vlans(rows):
+    # Staged VLANs carry the name of their group, so the NetBox side is compared by group name as well
+    by_name = {}
+    by_vid = {}
+    fields = [field for field in VLAN_DIFF_FIELDS if field != 'group']
+    for vlan in VLAN.objects.filter(group__name__in={row['group'] for row in rows}).filter(
+        Q(name__in={row['name'] for row in rows}) | Q(vid__in={row['vid'] for row in rows})
+    ).values('group__name', *fields):
+        vlan = {field: vlan['group__name'] if field == 'group' else vlan[field] for field in VLAN_DIFF_FIELDS}
+        by_name.setdefault((vlan['group'], vlan['name']), vlan)
+        by_vid.setdefault((vlan['group'], vlan['vid']), vlan)
+    return {
+        row['pk']: by_name.get((row['group'], row['name'])) or by_vid.get((row['group'], row['vid']))
+        for row in rows
+    }
+
+
+RECONCILE_MODELS = {
+    SlurpitInterface: (INTERFACE_DIFF_FIELDS, current_interfaces, Q(name='')),
+    SlurpitPrefix: (PREFIX_DIFF_FIELDS, current_prefixes, Q(prefix=None)),
+    SlurpitInitIPAddress: (IPADDRESS_DIFF_FIELDS, current_ipaddresses, Q(address=None)),
+    SlurpitVLAN: (VLAN_DIFF_FIELDS, current_vlans, Q(name='')),
+}
+
+
+def get_reconcile_diff(incoming, current):
+    """
+    Compare a staged row with the NetBox object it would be applied to.
+    """
+    if current is None:
+        return ReconcileActionChoices.CREATE, {'incoming': incoming, 'current': None, 'changed': []}
+
+    changed = [field for field, value in incoming.items() if current.get(field) != value]
+    action = ReconcileActionChoices.UPDATE if changed else ReconcileActionChoices.NOOP
+    return action, {'incoming': incoming, 'current': current, 'changed': changed}
+
+
+def refresh_reconcile_diffs(queryset):
+    """
+    Recompute the stored action and diff of the reconcile rows in `queryset`.
+
+    Rows are read in batches of BATCH_SIZE and matched against NetBox with one keyed query per batch. The
+    settings row of a model (the one holding the ignore flags) is never diffed.
+    """
+    model = queryset.model
+    fields, get_current, settings_q = RECONCILE_MODELS[model]
+    queryset = queryset.exclude(settings_q)
+
+    count = 0
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk).order_by('pk').values('pk', *fields)[:BATCH_SIZE])
+        if not rows:
+            break
+        last_pk = rows[-1]['pk']
+
+        for row in rows:
+            for field in ('prefix', 'address'):
+                if row.get(field) is not None:
+                    row[field] = str(row[field])
+        current = get_current(rows)
+
+        items = []
+        for row in rows:
+            pk = row.pop('pk')
+            action, diff = get_reconcile_diff(row, current[pk])
+            items.append(model(pk=pk, reconcile_action=action, reconcile_diff=diff))
+        model.objects.bulk_update(items, fields=('reconcile_action', 'reconcile_diff'))
+        count += len(items)
+
+    return count
+
+
+def refresh_stale_reconcile_rows(progress=None):
+    """
+    Recompute the diffs of every stale reconcile row, e.g. the rows staged before diffs were stored or the
+    ones marked stale by changes in NetBox.
+    """
+    progress = progress or JobProgress()
+    refreshed = 0
+    for model, (_, _, settings_q) in RECONCILE_MODELS.items():
+        queryset = model.objects.filter(reconcile_action__isnull=True).exclude(settings_q)
+        progress.phase(model._meta.verbose_name_plural, queryset.count())
+        count = refresh_reconcile_diffs(queryset)
+        progress.advance(count)
+        refreshed += count
+    return {'refreshed': refreshed}
+
+
+def field_values(obj, fields):
+    # Foreign keys are read by id, so no related objects are loaded
+    return {field: getattr(obj, obj._meta.get_field(field).attname) for field in fields}
+
+
+def content_hash(values):
+    """
+    Hash a dict of reconcile values. Related objects hash as their pk and None as an empty string, so an
+    incoming record, a staged row and a NetBox object holding the same data hash the same.
+    """
+    digest = hashlib.sha1(usedforsecurity=False)
+    for field in sorted(values):
+        value = values[field]
+        if isinstance(value, Model):
+            value = value.pk
+        elif value is None:
+            value = ''
+        digest.update(f'{field}\x1f{value}\x1e'.encode())
+    return digest.hexdigest()
+
+
+def save_reconcile_rows(model, to_create, to_update, update_fields):
+    """
+    Write the reconcile rows of a push and refresh the diffs of the rows it touched.
+    """
+    for item in to_update:
+        item.reconcile_action = None
+    model.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+    model.objects.bulk_update(to_update, fields=(*update_fields, 'reconcile_action'), batch_size=BATCH_SIZE)
+
+    pks = sorted(item.pk for item in (*to_create, *to_update))
+    for start in range(0, len(pks), BATCH_SIZE):
+        refresh_reconcile_diffs(model.objects.filter(pk__in=pks[start:start + BATCH_SIZE]))
+
+
+def stale_interfaces_q(interfaces):
+    names = {}
+    for interface in interfaces:
+        names.setdefault(interface.device_id, set()).add(interface.name)
+    q = Q(pk__in=[])
+    for device_id, device_names in names.items():
+        q |= Q(device_id=device_id, name__in=device_names)
+    return q
+
+
+def stale_vlans_q(vlans):
+    # Staged VLANs are only compared within their group, VLANs without a group never match one
+    keys = {}
+    for vlan in vlans:
+        if vlan.group_id is not None:
+            names, vids = keys.setdefault(vlan.group_id, (set(), set()))
+            names.add(vlan.name)
+            vids.add(vlan.vid)
+    group_names = dict(VLANGroup.objects.filter(pk__in=keys).values_list('pk', 'name'))
+    q = Q(pk__in=[])
+    for group_id, (names, vids) in keys.items():
+        q |= Q(group=group_names.get(group_id)) & (Q(name__in=names) | Q(vid__in=vids))
+    return q
+
+
+# The reconcile rows matching a NetBox object, by the same keys as the signal receivers
+STALE_ROWS = {
+    Interface: (SlurpitInterface, stale_interfaces_q),
+    Prefix: (SlurpitPrefix, lambda prefixes: Q(prefix__in={str(prefix.prefix) for prefix in prefixes})),
+    IPAddress: (SlurpitInitIPAddress, lambda addresses: Q(address__in={str(address.address) for address in addresses})),
+    VLAN: (SlurpitVLAN, stale_vlans_q),
+}
+
+
+def mark_reconcile_rows_stale(objects):
+    """
+    Clear the stored action of the reconcile rows matching NetBox objects written with bulk operations, which
+    don't send the signals that normally do this.
+    """
+    objects = list(objects)
+    if not objects:
+        return
+    model, get_q = STALE_ROWS[type(objects[0])]
+    for start in range(0, len(objects), BATCH_SIZE):
+        model.objects.filter(get_q(objects[start:start + BATCH_SIZE])).update(reconcile_action=None)
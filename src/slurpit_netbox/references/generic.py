@@ -4,7 +4,11 @@ from .imports import *
 from .. import get_config
 from ..models import  SlurpitStagedDevice, ensure_slurpit_tags
 
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.functional import cached_property
 from django.utils.text import slugify
+from netbox.search.backends import search_backend
 
 def create_form(form, data, model, initial):
     return form(data, initial=initial)
@@ -51,40 +55,165 @@ def status_offline():
 def status_decommissioning():
     return DeviceStatusChoices.STATUS_DECOMMISSIONING
 
-def get_create_dcim_objects(staged):
-    try:
-        manu, new = Manufacturer.objects.get_or_create(name=staged.brand, defaults={'slug':slugify(staged.brand)})
-    except:
-        manu, new = Manufacturer.objects.get_or_create(slug=slugify(staged.brand), defaults={'name':staged.brand})
-    
-    if new:
-        ensure_slurpit_tags(manu)
-    
-    try:
-        platform, new = Platform.objects.get_or_create(name=staged.device_os, defaults={'slug':slugify(staged.device_os)})
-    except:
-        platform, new = Platform.objects.get_or_create(slug=slugify(staged.device_os), defaults={'name':staged.device_os})
-    try:
-        dtype, new = DeviceType.objects.get_or_create(
-            model=staged.device_type, 
-            manufacturer=manu, 
-            defaults={
-                'slug':slugify(f'{staged.brand}-{staged.device_type}'), 
-                'default_platform':platform
-            }
-        )
-    except:
-        dtype, new = DeviceType.objects.get_or_create(
-            slug=slugify(f'{staged.brand}-{staged.device_type}'), 
-            manufacturer=manu, 
-            defaults={
-                'model':staged.device_type, 
-                'default_platform':platform
-            }
-        )
-    if new:
-        ensure_slurpit_tags(dtype)
-    return dtype
+def get_create_dcim_objects(staged, resolver=None):
+    if resolver is None:
+        resolver = DcimObjectResolver()
+    return resolver.get_device_type(staged)
+
+class DcimObjectResolver:
+    """
+    Per-sync cache of the Manufacturers, Platforms and DeviceTypes referenced by Slurp'it devices.
+
+    Create one resolver per sync (or onboarding action) and drop it afterwards. `prefetch()` loads the
+    existing objects by name and slug and bulk creates the missing ones, after which every lookup is
+    answered from memory. Lookups for devices that were not prefetched fall back to a prefetch of one.
+    """
+    def __init__(self):
+        self.manufacturers = {}
+        self.manufacturer_slugs = {}
+        self.platforms = {}
+        self.platform_slugs = {}
+        self.device_types = {}
+        self.device_type_slugs = {}
+
+    @cached_property
+    def defaults(self):
+        return get_default_objects()
+
+    def prefetch(self, devices):
+        keys = {(device.brand, device.device_os, device.device_type) for device in devices}
+        if not keys:
+            return
+
+        self._resolve_named(Manufacturer, {brand for brand, _, _ in keys}, self.manufacturers, self.manufacturer_slugs, ensure_slurpit_tags)
+        self._resolve_named(Platform, {device_os for _, device_os, _ in keys}, self.platforms, self.platform_slugs)
+        self._resolve_device_types(keys)
+
+    def get_manufacturer(self, name):
+        if name not in self.manufacturers:
+            self._resolve_named(Manufacturer, {name}, self.manufacturers, self.manufacturer_slugs, ensure_slurpit_tags)
+        return self.manufacturers[name]
+
+    def get_platform(self, name):
+        if name not in self.platforms:
+            self._resolve_named(Platform, {name}, self.platforms, self.platform_slugs)
+        return self.platforms[name]
+
+    def get_device_type(self, staged):
+        manu = self.get_manufacturer(staged.brand)
+        key = (manu.pk, staged.device_type)
+        if key not in self.device_types:
+            self.prefetch([staged])
+        return self.device_types[key]
+
+    def _resolve_named(self, model, names, by_name, by_slug, on_create=None):
+        missing = {name for name in names if name not in by_name}
+        if not missing:
+            return
+
+        slugs = {name: slugify(name) for name in missing}
+        for obj in model.objects.filter(Q(name__in=missing) | Q(slug__in=slugs.values())):
+            by_name.setdefault(obj.name, obj)
+            by_slug.setdefault(obj.slug, obj)
+
+        to_create = {}
+        for name in missing:
+            if name in by_name or slugs[name] in by_slug:
+                continue
+            to_create.setdefault(slugs[name], model(name=name, slug=slugs[name]))
+
+        def get_or_create(obj):
+            try:
+                return model.objects.get_or_create(name=obj.name, defaults={'slug': obj.slug})
+            except IntegrityError:
+                return model.objects.get_or_create(slug=obj.slug, defaults={'name': obj.name})
+
+        resolved, created = self._bulk_create(model, list(to_create.values()), get_or_create)
+        for obj in resolved:
+            by_name.setdefault(obj.name, obj)
+            by_slug.setdefault(obj.slug, obj)
+        for name in missing:
+            by_name.setdefault(name, by_slug[slugs[name]])
+
+        if created and on_create:
+            on_create(*created)
+
+    def _resolve_device_types(self, keys):
+        wanted = {}
+        for brand, device_os, model in keys:
+            manu = self.manufacturers[brand]
+            if (manu.pk, model) not in self.device_types:
+                wanted[(manu.pk, model)] = (slugify(f'{brand}-{model}'), self.platforms[device_os])
+        if not wanted:
+            return
+
+        existing = DeviceType.objects.filter(
+            Q(manufacturer_id__in={manu_id for manu_id, _ in wanted}),
+            Q(model__in={model for _, model in wanted}) | Q(slug__in={slug for slug, _ in wanted.values()})
+        ).select_related('manufacturer', 'default_platform')
+        for dtype in existing:
+            self.device_types.setdefault((dtype.manufacturer_id, dtype.model), dtype)
+            self.device_type_slugs.setdefault((dtype.manufacturer_id, dtype.slug), dtype)
+
+        to_create = {}
+        for (manu_id, model), (slug, platform) in wanted.items():
+            if (manu_id, model) in self.device_types or (manu_id, slug) in self.device_type_slugs:
+                continue
+            to_create.setdefault((manu_id, slug), DeviceType(
+                manufacturer_id=manu_id,
+                model=model,
+                slug=slug,
+                default_platform=platform
+            ))
+
+        def get_or_create(obj):
+            try:
+                return DeviceType.objects.get_or_create(
+                    model=obj.model,
+                    manufacturer_id=obj.manufacturer_id,
+                    defaults={'slug': obj.slug, 'default_platform': obj.default_platform}
+                )
+            except IntegrityError:
+                return DeviceType.objects.get_or_create(
+                    slug=obj.slug,
+                    manufacturer_id=obj.manufacturer_id,
+                    defaults={'model': obj.model, 'default_platform': obj.default_platform}
+                )
+
+        resolved, created = self._bulk_create(DeviceType, list(to_create.values()), get_or_create)
+        for dtype in resolved:
+            self.device_types.setdefault((dtype.manufacturer_id, dtype.model), dtype)
+            self.device_type_slugs.setdefault((dtype.manufacturer_id, dtype.slug), dtype)
+        for (manu_id, model), (slug, _) in wanted.items():
+            self.device_types.setdefault((manu_id, model), self.device_type_slugs[(manu_id, slug)])
+
+        if created:
+            ensure_slurpit_tags(*created)
+
+    @staticmethod
+    def _bulk_create(model, objs, get_or_create):
+        """
+        Bulk create `objs`, returning the resolved objects and the subset that is new.
+        """
+        if not objs:
+            return [], []
+        try:
+            with transaction.atomic():
+                created = model.objects.bulk_create(objs)
+        except IntegrityError:
+            # Some of them were created concurrently, fall back to resolving one by one
+            resolved = []
+            created = []
+            for obj in objs:
+                obj, new = get_or_create(obj)
+                resolved.append(obj)
+                if new:
+                    created.append(obj)
+        else:
+            resolved = created
+        if created:
+            search_backend.cache(created)
+        return resolved, created
 
 class SlurpitViewMixim:
     slurpit_data = {
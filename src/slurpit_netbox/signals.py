@@ -0,0 +1,69 @@
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from dcim.models import Device, Interface
+from ipam.models import IPAddress, Prefix, VLAN, VLANGroup
+from .models import SlurpitImportedDevice, SlurpitInitIPAddress, SlurpitInterface, SlurpitPrefix, SlurpitVLAN
+
+# The stored reconcile diffs go stale when either side changes. Stale rows get a null action, the reconcile
+# list recomputes the rows of the page it shows and queues a job for the rest.
+
+
+def key_values(instance, field):
+    # Include the value from before an edit, so the rows that matched the old key are refreshed as well
+    values = {getattr(instance, field)}
+    snapshot = getattr(instance, '_prechange_snapshot', None) or {}
+    if field in snapshot:
+        values.add(snapshot[field])
+    return {str(value) for value in values if value is not None}
+
+
+@receiver(post_save, sender=SlurpitInterface)
+@receiver(post_save, sender=SlurpitPrefix)
+@receiver(post_save, sender=SlurpitInitIPAddress)
+@receiver(post_save, sender=SlurpitVLAN)
+def reconcile_row_changed(sender, instance, **kwargs):
+    sender.objects.filter(pk=instance.pk).update(reconcile_action=None)
+
+
+@receiver((post_save, post_delete), sender=Interface)
+def interface_changed(instance, **kwargs):
+    SlurpitInterface.objects.filter(
+        device_id=instance.device_id, name__in=key_values(instance, 'name')
+    ).update(reconcile_action=None)
+
+
+@receiver((post_save, post_delete), sender=Prefix)
+def prefix_changed(instance, **kwargs):
+    SlurpitPrefix.objects.filter(prefix__in=key_values(instance, 'prefix')).update(reconcile_action=None)
+
+
+@receiver((post_save, post_delete), sender=IPAddress)
+def ipaddress_changed(instance, **kwargs):
+    SlurpitInitIPAddress.objects.filter(address__in=key_values(instance, 'address')).update(reconcile_action=None)
+
+
+@receiver((post_save, post_delete), sender=VLAN)
+def vlan_changed(instance, **kwargs):
+    # Staged VLANs are matched within their group, which they refer to by name
+    snapshot = getattr(instance, '_prechange_snapshot', None) or {}
+    group_ids = {instance.group_id, snapshot.get('group')} - {None}
+    if not group_ids:
+        return
+    SlurpitVLAN.objects.filter(
+        Q(name__in=key_values(instance, 'name')) | Q(vid__in=key_values(instance, 'vid')),
+        group__in=VLANGroup.objects.filter(pk__in=group_ids).values('name')
+    ).update(reconcile_action=None)
+
+
+@receiver(post_save, sender=Device)
+def device_changed(instance, **kwargs):
+    # The Slurp'it custom fields of a device can be edited in NetBox, which changes the drift of its imported device
+    for imported in SlurpitImportedDevice.objects.filter(mapped_device_id=instance.pk):
+        imported.mapped_device = instance
+        imported.refresh_drift()
+        SlurpitImportedDevice.objects.filter(pk=imported.pk).update(
+            applied_hash=imported.applied_hash, drift=imported.drift
+        )
+
@@ -1,13 +1,30 @@
 from requests import Request, Session
+from requests.adapters import HTTPAdapter
+
+from .references import plugin_type
 
 
 class SlurpitSession(Session):
-    def __init__(self, url, token, ssl_verify):
+    def __init__(self, url, token, ssl_verify, pool_size=10, retries=0):
         super().__init__()
         self.ssl_verify = ssl_verify
-        self.headers.update(dict(authorization=token))
+        self.verify = ssl_verify
+        self.headers.update({
+            'authorization': token,
+            'useragent': f"{plugin_type}/requests",
+            'accept': 'application/json',
+        })
         self.base_api = url
 
+        # Keep the connections to the Slurp'it server alive across requests and threads
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retries)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    @classmethod
+    def from_setting(cls, setting, pool_size=10, retries=0):
+        return cls(setting.server_url, setting.api_key, False, pool_size=pool_size, retries=retries)
+
     def prepare_request(self, request: Request):
         if ':/' not in request.url:
             glue = '' if request.url.startswith('/') else '/'
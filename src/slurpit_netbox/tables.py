@@ -53,18 +53,17 @@ class ConditionalLink(Column):
         return link(value, value=value, record=record, bound_column=bound_column)
 
 class ConflictedColumn(Column):
+    # Rendered from the conflicting_* annotations of the conflicted queryset
     def render(self, value, bound_column, record):
-        device = Device.objects.filter(name__iexact=record.hostname).first()
-
         original_value = ""
         column_name = bound_column.verbose_name
 
         if column_name == "Manufacturer":
-            original_value = device.device_type.manufacturer
+            original_value = record.conflicting_manufacturer
         elif column_name == "Platform":
-            original_value = device.platform
+            original_value = record.conflicting_platform
         else:
-            original_value = device.device_type
+            original_value = record.conflicting_device_type
 
             if record.mapped_devicetype_id is not None:
                 link = LinkTransform(attrs=self.attrs.get("a", {}), accessor=Accessor("mapped_devicetype"))
@@ -302,8 +301,8 @@ class SlurpitIPAMTable(TenancyColumnsMixin,NetBoxTable):
 
     commit_action = tables.Column(
         verbose_name = _('Commit Action'),
-        empty_values=(),
-        orderable=False
+        accessor=Accessor('reconcile_action'),
+        empty_values=()
     )
 
     pk = ToggleColumn()
@@ -318,10 +317,7 @@ class SlurpitIPAMTable(TenancyColumnsMixin,NetBoxTable):
         default_columns = ('address', 'vrf', 'status', 'commit_action', 'dns_name', 'description', 'last_updated', 'edit')
 
     def render_commit_action(self, record):
-        obj = IPAddress.objects.filter(address=record.address, vrf=record.vrf)
-        if obj:
-            return 'Changing'
-        return 'Adding'
+        return record.get_reconcile_action_display() or '-'
     
 
 class SlurpitInterfaceTable(BaseInterfaceTable):
@@ -345,8 +341,8 @@ class SlurpitInterfaceTable(BaseInterfaceTable):
 
     commit_action = tables.Column(
         verbose_name = _('Commit Action'),
-        empty_values=(),
-        orderable=False
+        accessor=Accessor('reconcile_action'),
+        empty_values=()
     )
 
     edit = tables.TemplateColumn(
@@ -364,10 +360,7 @@ class SlurpitInterfaceTable(BaseInterfaceTable):
         default_columns = ('pk', 'name', 'device', 'commit_action', 'label', 'enabled', 'type', 'duplex', 'description', 'edit')
 
     def render_commit_action(self, record):
-        obj = Interface.objects.filter(name=record.name, device=record.device)
-        if obj:
-            return 'Changing'
-        return 'Adding'
+        return record.get_reconcile_action_display() or '-'
     
 
 # PREFIX_LINK = """
@@ -443,8 +436,8 @@ class SlurpitPrefixTable(TenancyColumnsMixin, NetBoxTable):
 
     commit_action = tables.Column(
         verbose_name = _('Commit Action'),
-        empty_values=(),
-        orderable=False
+        accessor=Accessor('reconcile_action'),
+        empty_values=()
     )
 
     vlan = tables.Column(
@@ -477,10 +470,7 @@ class SlurpitPrefixTable(TenancyColumnsMixin, NetBoxTable):
         }
 
     def render_commit_action(self, record):
-        obj = Prefix.objects.filter(prefix=record.prefix, vrf=record.vrf)
-        if obj:
-            return 'Changing'
-        return 'Adding'
+        return record.get_reconcile_action_display() or '-'
 
 VLAN_LINK = """
 {% if record.pk %}
@@ -541,8 +531,8 @@ class SlurpitVLANTable(TenancyColumnsMixin, NetBoxTable):
 
     commit_action = tables.Column(
         verbose_name = _('Commit Action'),
-        empty_values=(),
-        orderable=False
+        accessor=Accessor('reconcile_action'),
+        empty_values=()
     )
 
     edit = tables.TemplateColumn(
@@ -564,9 +554,4 @@ class SlurpitVLANTable(TenancyColumnsMixin, NetBoxTable):
         }
 
     def render_commit_action(self, record):
-        obj = VLAN.objects.filter(name=record.name, group__name=record.group)
-        if obj is None:
-            obj = VLAN.objects.filter(vid=record.vid, group__name=record.group)
-        if obj:
-            return 'Changing'
-        return 'Adding'
\ No newline at end of file
+        return record.get_reconcile_action_display() or '-'
\ No newline at end of file
@@ -17,9 +17,8 @@ from ..forms import SlurpitMappingForm, SlurpitDeviceForm, SlurpitDeviceStatusFo
 from ..management.choices import *
 from django.contrib import messages
 from dcim.models import Device
-from django.forms.models import model_to_dict
 import requests
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
 from django.http import HttpResponse, JsonResponse
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
@@ -31,21 +30,71 @@ from urllib.parse import urlencode
 from utilities.forms import restrict_form_fields
 from utilities.exceptions import AbortRequest, PermissionsViolation
 from django.db import router, transaction
+from concurrent.futures import ThreadPoolExecutor
+from urllib3.util.retry import Retry
+from ..slurpitch import SlurpitSession
+from ..jobs import JobProgress, enqueue_job, get_job_status, push_devices_job
 
 BATCH_SIZE = 128
+PUSH_CONCURRENCY = 8
+# The device push is a POST, which is only retried when the connection failed before it was sent. A read
+# timeout or an error status can come after Slurp'it stored the devices.
+PUSH_RETRIES = Retry(
+    total=3,
+    backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    raise_on_status=False
+)
+MAX_REPORTED_FAILURES = 100
+
+# Related objects that are exported by their display name instead of their pk
+DEVICE_DISPLAY_LOOKUPS = {
+    'device_type': 'device_type__model',
+    'platform': 'platform__name',
+    'primary_ip4': 'primary_ip4__address',
+    'primary_ip6': 'primary_ip6__address',
+}
+
+def get_device_lookups(mappings):
+    """
+    Translate the target fields of the data mapping into `.values()` lookups on Device, so the mapped
+    devices are read with a single query. Returns {source_field: lookup}, the lookup is None for a
+    target field that can't be read this way.
+    """
+    lookups = {}
+    for mapping in mappings:
+        target_field = mapping.target_field.split('|')[1]
+        if target_field.startswith('cf_'):
+            lookups[mapping.source_field] = f'custom_field_data__{target_field[3:]}'
+            continue
+        try:
+            field = Device._meta.get_field(target_field)
+        except FieldDoesNotExist:
+            lookups[mapping.source_field] = None
+            continue
+
+        if target_field in DEVICE_DISPLAY_LOOKUPS:
+            lookups[mapping.source_field] = DEVICE_DISPLAY_LOOKUPS[target_field]
+        elif field.concrete and not field.many_to_many:
+            lookups[mapping.source_field] = field.attname
+        else:
+            lookups[mapping.source_field] = None
+    return lookups
+
+def get_values_fields(lookups):
+    return {lookup for lookup in lookups.values() if lookup is not None}
 
-def get_device_dict(instance):
-    device_dict = model_to_dict(instance)
-    # Assuming 'device_type' is a ForeignKey, for example.
-    device_dict['device_type'] = str(instance.device_type) if instance.device_type is not None else None
-    device_dict['platform'] = str(instance.platform) if instance.platform is not None else None
-    device_dict['primary_ip4'] = str(instance.primary_ip4) if instance.primary_ip4 is not None else None
-    device_dict['primary_ip6'] = str(instance.primary_ip6) if instance.primary_ip6 is not None else None
+def map_device_values(values, lookups):
+    return {source_field: values[lookup] if lookup else None for source_field, lookup in lookups.items()}
 
-    for custom_field in device_dict['custom_field_data']:
-        device_dict[f'cf_{custom_field}'] = device_dict['custom_field_data'][custom_field]
+def get_mapped_row(values):
+    row = {}
+    for source_field, value in values.items():
+        row[source_field] = str(value) if value is not None else None
 
-    return device_dict
+        if (source_field == 'ipv4' or source_field == 'fqdn') and row[source_field] is not None:
+            row[source_field] = row[source_field].split('/')[0]
+    return row
 
 def post_slurpit_device(row, device_name):
     try:
@@ -78,6 +127,84 @@ def post_slurpit_device(row, device_name):
     
     return None
 
+def get_push_error(res):
+    # Slurp'it answers a rejected device with a status and the messages per field
+    if not isinstance(res, dict):
+        return None
+    if 'error' in res:
+        return res['error']
+    if res.get('status', 200) != 200:
+        return '; '.join(f'{field}: {message}' for field, message in res.get('messages', {}).items()) or f"Status {res['status']}"
+    return None
+
+def push_devices_job_name(device_status=None):
+    # A push of one device status must not be answered with the running push of another
+    return f"push_devices_{device_status or 'all'}"
+
+
+def push_devices(device_status=None, progress=None):
+    """
+    Push the NetBox devices to Slurp'it through the data mapping.
+
+    Devices are read in batches of BATCH_SIZE and posted by up to PUSH_CONCURRENCY workers over one pooled
+    session, which retries failed requests with backoff. Every device Slurp'it rejects is logged.
+    """
+    progress = progress or JobProgress()
+    try:
+        setting = SlurpitSetting.objects.get()
+    except ObjectDoesNotExist:
+        log_message = "Need to set the setting parameter"
+        SlurpitLog.failure(category=LogCategoryChoices.DATA_MAPPING, message=log_message)
+        raise ValueError(log_message)
+
+    lookups = get_device_lookups(SlurpitMapping.objects.all())
+    devices = Device.objects.all()
+    if device_status:
+        devices = devices.filter(status=device_status)
+
+    progress.phase('push', devices.count())
+    counts = {'synced': 0, 'failed': 0}
+    failures = []
+
+    with SlurpitSession.from_setting(setting, pool_size=PUSH_CONCURRENCY, retries=PUSH_RETRIES) as session, \
+            ThreadPoolExecutor(max_workers=PUSH_CONCURRENCY) as executor:
+        session.headers['authorization'] = f'Bearer {setting.api_key}'
+
+        def post(row):
+            try:
+                r = session.post("/api/devices/sync", json={**row, "ignore_plugin": str(1)}, timeout=15)
+                return get_push_error(r.json())
+            except (requests.exceptions.RequestException, ValueError) as e:
+                return str(e)
+
+        last_pk = 0
+        while True:
+            batch = list(
+                devices.filter(pk__gt=last_pk).order_by('pk').values('pk', 'name', *get_values_fields(lookups))[:BATCH_SIZE]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1]['pk']
+
+            rows = [get_mapped_row(map_device_values(values, lookups)) for values in batch]
+            synced = 0
+            for values, error in zip(batch, executor.map(post, rows)):
+                if error is None:
+                    synced += 1
+                    continue
+                log_message = f"Failed to sync {values['name']} to Slurp'it. {error}"
+                SlurpitLog.failure(category=LogCategoryChoices.DATA_MAPPING, message=log_message[:200])
+                if len(failures) < MAX_REPORTED_FAILURES:
+                    failures.append({'device_name': values['name'], 'error': error})
+
+            counts['synced'] += synced
+            counts['failed'] += len(batch) - synced
+            progress.advance(len(batch), synced=synced, failed=len(batch) - synced)
+
+    log_message = f"Synced {counts['synced']} devices from NetBox to Slurp'it, {counts['failed']} failed."
+    SlurpitLog.info(category=LogCategoryChoices.DATA_MAPPING, message=log_message)
+    return {**counts, 'failures': failures}
+
 @method_decorator(slurpit_plugin_registered, name='dispatch')
 class DataMappingView(View):
     template_name = "slurpit_netbox/data_mapping.html"
@@ -89,37 +216,12 @@ class DataMappingView(View):
         tab = request.GET.get('tab', None)
         subtab = request.GET.get('subtab', None)
         if sync is not None:
-            # request_body = []
-
-            netbox_devices = Device.objects.all()
-            devices_array = [get_device_dict(device) for device in netbox_devices]
-
-            objs = SlurpitMapping.objects.all()
-            
-            for device in devices_array:
-                row = {}
-                for obj in objs:
-                    target_field = obj.target_field.split('|')[1]
-                    row[obj.source_field] = str(device[target_field]) if device[target_field] is not None else None
-
-                    if obj.source_field == 'ipv4' or obj.source_field == 'fqdn':
-                        row[obj.source_field] = row[obj.source_field].split('/')[0]
-                # request_body.append(row)
-
-                res = post_slurpit_device(row, device["name"])
-
-                if res is None:
-                    return redirect(f'{request.path}?tab={tab}')
-                
-                if res['status'] != 200:
-                    for error in res["messages"]:
-                        messages.error(request, f'{escape(error)}: {escape(res["messages"][error])}')
-
-                    return redirect(f'{request.path}?tab={tab}')
-                
-            messages.success(request, "Sync from Netbox to Slurpit is done successfully.")
+            job_id = enqueue_job(push_devices_job, name=push_devices_job_name(), unique=True)
+            messages.info(request, f"Started to sync the devices from NetBox to Slurp'it in the background (job {job_id}).")
             return redirect(f'{request.path}?tab={tab}')
 
+        if job_id := request.GET.get('job'):
+            return JsonResponse({"job": get_job_status(job_id)})
 
         form = [
         ]
@@ -200,18 +302,11 @@ class DataMappingView(View):
                 if device_id == "":
                     return JsonResponse({})
                 
-                device = Device.objects.get(id=int(device_id))
-                device = get_device_dict(device)
-
-                row = {}
-                objs = SlurpitMapping.objects.all()
-                for obj in objs:
-                    target_field = obj.target_field.split('|')[1]
-                    row[obj.source_field] = str(device[target_field]) if device[target_field] is not None else None
-                    
-                    if obj.source_field == 'ipv4' or obj.source_field == 'fqdn':
-                        row[obj.source_field] = row[obj.source_field].split('/')[0]
-                    
+                lookups = get_device_lookups(SlurpitMapping.objects.all())
+                device = Device.objects.values('name', *get_values_fields(lookups)).get(id=int(device_id))
+
+                row = get_mapped_row(map_device_values(device, lookups))
+
                 if test is not None:
                     res = post_slurpit_device(row, device["name"])
 
@@ -272,17 +367,9 @@ class DataMappingView(View):
                     
                 return redirect(f'{request.path}?tab={tab}')
             elif action == "sync":
-                device_status = request.POST.get('status')
-                if device_status == "":
-                    netbox_devices = Device.objects.all().values("id", "status")
-                else:
-                    netbox_devices = Device.objects.filter(status=device_status).values("id")
-                device_names = []
-                if netbox_devices:
-                    for device in netbox_devices:
-                        device_names.append(device['id'])
-                
-                return JsonResponse({"device": device_names})
+                device_status = request.POST.get('status') or None
+                job_id = enqueue_job(push_devices_job, device_status, name=push_devices_job_name(device_status), unique=True)
+                return JsonResponse({"job_id": job_id})
 
         elif tab == "slurpit_to_netbox":
             mapping_type = request.POST.get('mappingtype')
@@ -9,7 +9,7 @@ from ..management.choices import *
 
 @method_decorator(slurpit_plugin_registered, name='dispatch')
 class LoggingListView(generic.ObjectListView):
-    queryset = SlurpitLog.objects.all().order_by("-log_time")
+    queryset = SlurpitLog.objects.all().order_by("-log_time", "-pk")
     filterset = LoggingFilterSet
     table = LoggingTable
     template_name = "slurpit_netbox/slurpitlog_list.html"
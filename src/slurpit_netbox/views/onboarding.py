@@ -1,11 +1,15 @@
 import requests
+import time
+
+from functools import wraps
 
 from django.contrib import messages
 from django.contrib.contenttypes.fields import GenericRel
+from django.core.cache import cache
 from django.core.exceptions import FieldDoesNotExist, ValidationError, ObjectDoesNotExist
 from django.db import transaction, connection
-from django.db.models import ManyToManyField, ManyToManyRel, F, Q
-from django.db.models.fields.json import KeyTextTransform
+from django.db.models import ManyToManyField, ManyToManyRel, OuterRef, Q, Subquery
+from django.db.models.functions import Lower
 from django.utils.decorators import method_decorator
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import redirect, render
@@ -17,43 +21,65 @@ from django.utils.text import slugify
 from .. import get_config, forms, importer, models, tables
 from ..models import SlurpitImportedDevice, SlurpitLog, SlurpitSetting
 from ..management.choices import *
-from ..importer import get_dcim_device, import_from_queryset, run_import, get_devices, BATCH_SIZE, import_devices, process_import, start_device_import
+from ..jobs import count_onboarding_tabs_job, enqueue_job, get_job_status, process_import_job
+from ..importer import mark_onboarding_counts_stale, get_onboarding_counts_version, ONBOARDING_COUNTS_CACHE_KEY, get_dcim_device, import_from_queryset, run_import, get_devices, pull_devices, BATCH_SIZE, import_devices, process_import, start_device_import
 from ..decorators import slurpit_plugin_registered
 from ..references import base_name, custom_field_data_name
-from ..references.generic import create_form, get_form_device_data, SlurpitViewMixim, get_default_objects, set_device_custom_fields, status_inventory, get_create_dcim_objects
+from ..references.generic import create_form, get_form_device_data, SlurpitViewMixim, get_default_objects, set_device_custom_fields, status_inventory, get_create_dcim_objects, DcimObjectResolver
 from ..references.imports import * 
 from ..filtersets import SlurpitImportedDeviceFilterSet
 from dcim.models import DeviceType, Interface
 from ipam.models import IPAddress
 
+# Counters older than this are recounted in the background even if nothing flagged them, e.g. for devices
+# added to NetBox directly
+ONBOARDING_COUNTS_MAX_AGE = 60 * 10
+
+
+def count_onboarding_tabs():
+    # Read before counting, a change marked during the count leaves these counters stale
+    version = get_onboarding_counts_version()
+    view = SlurpitImportedDeviceListView
+    counts = {
+        'to_onboard_count': view.to_onboard_queryset.count(),
+        'onboarded_count': view.onboarded_queryset.count(),
+        'migrate_count': view.migrate_queryset.count(),
+        'conflicted_count': view.conflicted_queryset.count(),
+    }
+    cache.set(ONBOARDING_COUNTS_CACHE_KEY, {'counts': counts, 'version': version, 'updated': time.time()}, None)
+    return counts
+
+
+def get_onboarding_counts():
+    """
+    Return the onboarding tab counters from the cache. Stale counters are returned as they are while a
+    background job recounts them.
+    """
+    state = cache.get(ONBOARDING_COUNTS_CACHE_KEY)
+    if state is None:
+        return count_onboarding_tabs()
+    if state.get('version') != get_onboarding_counts_version() or time.time() - state['updated'] > ONBOARDING_COUNTS_MAX_AGE:
+        enqueue_job(count_onboarding_tabs_job, name='count_onboarding_tabs', unique=True)
+    return state['counts']
+
+
+def onboarding_changed(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            mark_onboarding_counts_stale()
+    return wrapper
+
+
 @method_decorator(slurpit_plugin_registered, name='dispatch')
 class SlurpitImportedDeviceListView(SlurpitViewMixim, generic.ObjectListView):
-    conflicted_queryset = models.SlurpitImportedDevice.objects.filter(mapped_device_id__isnull=True, hostname__lower__in=Device.objects.values('name__lower'))
+    conflicted_queryset = models.SlurpitImportedDevice.objects.filter(mapped_device_id__isnull=True, hostname__lower__in=models.SlurpitDeviceName.objects.values('name'))
     to_onboard_queryset = models.SlurpitImportedDevice.objects.filter(mapped_device_id__isnull=True).exclude(pk__in=conflicted_queryset.values('pk'))
     onboarded_queryset = models.SlurpitImportedDevice.objects.filter(mapped_device_id__isnull=False)
-    migrate_queryset = models.SlurpitImportedDevice.objects.filter(
-                mapped_device_id__isnull=False
-            ).annotate(
-                slurpit_devicetype=KeyTextTransform('slurpit_devicetype', 'mapped_device__' + custom_field_data_name),
-                slurpit_hostname=KeyTextTransform('slurpit_hostname', 'mapped_device__' + custom_field_data_name),
-                slurpit_fqdn=KeyTextTransform('slurpit_fqdn', 'mapped_device__' + custom_field_data_name),
-                slurpit_platform=KeyTextTransform('slurpit_platform', 'mapped_device__' + custom_field_data_name),
-                slurpit_manufacturer=KeyTextTransform('slurpit_manufacturer', 'mapped_device__' + custom_field_data_name),
-                slurpit_ipv4=KeyTextTransform('slurpit_ipv4', 'mapped_device__' + custom_field_data_name),
-                fdevicetype=F('device_type'),
-                fhostname=F('hostname'),
-                ffqdn=F('fqdn'),
-                fipv4=F('ipv4'),
-                fdeviceos=F('device_os'),
-                fbrand=F('brand')
-            ).exclude(
-                Q(slurpit_devicetype=F('fdevicetype')) & 
-                Q(slurpit_hostname=F('fhostname')) & 
-                Q(slurpit_fqdn=F('ffqdn')) & 
-                Q(slurpit_platform=F('fdeviceos')) & 
-                Q(slurpit_manufacturer=F('fbrand')) &
-                Q(slurpit_ipv4=F('fipv4'))
-            )
+    # The drift flag is kept up to date whenever an imported device or its mapped device is written
+    migrate_queryset = models.SlurpitImportedDevice.objects.filter(drift=True).select_related('mapped_device')
     
     queryset = to_onboard_queryset
     action_buttons = []
@@ -68,7 +94,14 @@ class SlurpitImportedDeviceListView(SlurpitViewMixim, generic.ObjectListView):
             self.queryset = self.migrate_queryset
             self.table = tables.MigratedDeviceTable
         elif request.GET.get('tab') == "conflicted":
-            self.queryset = self.conflicted_queryset
+            # The conflicting NetBox device is joined in, so its columns render without a query per row
+            conflicting_device = models.SlurpitDeviceName.objects.filter(name=Lower(OuterRef('hostname'))).order_by('device_id')
+            self.queryset = self.conflicted_queryset.select_related('mapped_devicetype').annotate(
+                conflicting_device_id=Subquery(conflicting_device.values('device_id')[:1]),
+                conflicting_device_type=Subquery(conflicting_device.values('device__device_type__model')[:1]),
+                conflicting_manufacturer=Subquery(conflicting_device.values('device__device_type__manufacturer__name')[:1]),
+                conflicting_platform=Subquery(conflicting_device.values('device__platform__name')[:1]),
+            )
             self.table = tables.ConflictDeviceTable
         elif request.GET.get('tab') == "onboarded":
             self.queryset = self.onboarded_queryset
@@ -76,6 +109,7 @@ class SlurpitImportedDeviceListView(SlurpitViewMixim, generic.ObjectListView):
             
         return super().get(request, *args, **kwargs)
     
+    @onboarding_changed
     def post(self, request):
         if request.POST.get('_all'):
             qs = self.queryset
@@ -98,10 +132,7 @@ class SlurpitImportedDeviceListView(SlurpitViewMixim, generic.ObjectListView):
             setting = None
 
         return {
-            'to_onboard_count': self.to_onboard_queryset.count(),
-            'onboarded_count': self.onboarded_queryset.count(),
-            'migrate_count': self.migrate_queryset.count(),
-            'conflicted_count': self.conflicted_queryset.count(),
+            **get_onboarding_counts(),
             'appliance_type': appliance_type,
             'connection_status': connection_status,
             **self.slurpit_data
@@ -122,6 +153,7 @@ class SlurpitImportedDeviceOnboardView(SlurpitViewMixim, generic.BulkEditView):
         kwargs['models_queryset'] = self.queryset
         return kwargs
 
+    @onboarding_changed
     def post(self, request, **kwargs):
         model = self.queryset.model
 
@@ -196,6 +228,8 @@ class SlurpitImportedDeviceOnboardView(SlurpitViewMixim, generic.BulkEditView):
                     obj.save()
                     device.delete() #delete last to prevent cascade delete
             else:
+                resolver = DcimObjectResolver()
+                resolver.prefetch(self.queryset)
                 for obj in self.queryset:
                     device = obj.mapped_device
                     device.name = obj.hostname
@@ -208,12 +242,9 @@ class SlurpitImportedDeviceOnboardView(SlurpitViewMixim, generic.BulkEditView):
                         'slurpit_ipv4': obj.ipv4,
                     })               
 
-                    device.device_type = get_create_dcim_objects(obj)
+                    device.device_type = get_create_dcim_objects(obj, resolver)
                     
-                    try:
-                        device.platform = Platform.objects.get(name=obj.device_os)
-                    except:
-                        device.platform = Platform.objects.get(slug=slugify(obj.device_os))
+                    device.platform = resolver.get_platform(obj.device_os)
 
                     if device.device_type:
                         device.platform = device.device_type.default_platform
@@ -251,11 +282,18 @@ class SlurpitImportedDeviceOnboardView(SlurpitViewMixim, generic.BulkEditView):
 
         elif 'conflicted' in request.GET:
             conflic = request.GET.get('conflicted')
+            # Devices can have been added or renamed in NetBox since the last import
+            models.SlurpitDeviceName.rebuild()
             if conflic == 'create':
-                Device.objects.filter(name__lower__in=self.queryset.values('hostname__lower')).delete()
+                Device.objects.filter(
+                    pk__in=models.SlurpitDeviceName.objects.filter(name__in=self.queryset.values('hostname__lower')).values('device_id')
+                ).delete()
             else:
-                for obj in self.queryset:
-                    device = Device.objects.filter(name__iexact=obj.hostname).first()
+                resolver = DcimObjectResolver()
+                resolver.prefetch(self.queryset)
+                conflicting_device = models.SlurpitDeviceName.objects.filter(name=Lower(OuterRef('hostname'))).order_by('device_id')
+                for obj in self.queryset.annotate(conflicting_device_id=Subquery(conflicting_device.values('device_id')[:1])):
+                    device = Device.objects.filter(pk=obj.conflicting_device_id).first()
 
                     set_device_custom_fields(device, {
                         'slurpit_hostname': obj.hostname,
@@ -267,12 +305,9 @@ class SlurpitImportedDeviceOnboardView(SlurpitViewMixim, generic.BulkEditView):
                     })      
                     obj.mapped_device = device    
 
-                    device.device_type = get_create_dcim_objects(obj)
+                    device.device_type = get_create_dcim_objects(obj, resolver)
 
-                    try:
-                        device.platform = Platform.objects.get(name=obj.device_os)
-                    except:
-                        device.platform = Platform.objects.get(slug=slugify(obj.device_os))
+                    device.platform = resolver.get_platform(obj.device_os)
                     
                     if device.device_type:
                         device.platform = device.device_type.default_platform
@@ -349,6 +384,8 @@ class SlurpitImportedDeviceOnboardView(SlurpitViewMixim, generic.BulkEditView):
         data = get_form_device_data(form)
 
         objs = self.queryset.filter(pk__in=form.cleaned_data['pk'])
+        resolver = DcimObjectResolver()
+        resolver.prefetch(objs)
         
         for obj in objs:
             if obj.mapped_device_id is not None:
@@ -359,7 +396,7 @@ class SlurpitImportedDeviceOnboardView(SlurpitViewMixim, generic.BulkEditView):
                 dt = obj.mapped_devicetype
             
             try:
-                device = get_dcim_device(obj, device_type=dt, **data)
+                device = get_dcim_device(obj, resolver, device_type=dt, **data)
                 obj.mapped_device = device
                 obj.save()
                 updated_objects.append(obj)
@@ -385,6 +422,23 @@ class ImportDevices(View):
     def get(self, request, *args, **kwargs):
         offset = request.GET.get("offset", None)
         try:
+            if request.GET.get("pull") is not None:
+                count, log_message = pull_devices()
+                if count is None:
+                    messages.error(request, log_message)
+                    return JsonResponse({"action": "error", "error": "ERROR"})
+                return JsonResponse({"action": "pulled", "count": count})
+
+            job_id = request.GET.get("job")
+            if job_id is not None:
+                job = get_job_status(job_id)
+                if job is None or job['status'] == 'failed':
+                    messages.error(request, "Failed to sync the devices from Slurp'it.")
+                    return JsonResponse({"action": "error", "error": "ERROR"})
+                if job['status'] == 'finished':
+                    messages.info(request, "Synced the devices from Slurp'it.")
+                return JsonResponse({"action": "job", "job": job})
+
             if offset is not None:
                 offset = int(offset)
                 if offset == 0:
@@ -399,9 +453,8 @@ class ImportDevices(View):
                     return JsonResponse({"action": "error", "error": "ERROR"})
                 return JsonResponse({"action": "import", "offset": offset})
             
-            process_import()
-            messages.info(request, "Synced the devices from Slurp'it.")
-            return JsonResponse({"action": "process"})
+            job_id = enqueue_job(process_import_job, name='process_import', unique=True)
+            return JsonResponse({"action": "process", "job_id": job_id})
         except requests.exceptions.RequestException as e:
             messages.error(request, "An error occured during querying Slurp'it!")
             SlurpitLog.failure(category=LogCategoryChoices.ONBOARD, message=f"An error occured during querying Slurp'it! {e}")
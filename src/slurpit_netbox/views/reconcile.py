@@ -5,15 +5,18 @@ from ..models import SlurpitInitIPAddress, SlurpitLog, SlurpitInterface, Slurpit
 from .. import forms, importer, models, tables
 from ..decorators import slurpit_plugin_registered
 from django.utils.decorators import method_decorator
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
 from ipam.models import FHRPGroup, VRF, IPAddress, Prefix, VLAN, VLANGroup
-from utilities.data import shallow_compare_dict
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.contrib import messages
 from ..management.choices import *
 from ..importer import BATCH_SIZE
+from ..jobs import JobProgress, enqueue_job, accept_reconcile_job, refresh_reconcile_diffs_job
+from ..reconcile import mark_reconcile_rows_stale, refresh_reconcile_diffs, vrf_q
 from django.db import transaction
+from django.db.models import Q
+from netbox.search.backends import search_backend
 from dcim.models import Interface
 from urllib.parse import urlencode
 from ..filtersets import SlurpitIPAddressFilterSet, SlurpitInterfaceFilterSet, SlurpitPrefixFilterSet, SlurpitVLANFilterSet
@@ -62,7 +65,20 @@ class ReconcileView(generic.ObjectListView):
             self.table = tables.SlurpitInterfaceTable
             self.filterset = SlurpitInterfaceFilterSet
 
+        # Diffs are stored with each row, stale rows are recomputed in the background and on the shown page
+        if self.queryset.filter(reconcile_action__isnull=True).exists():
+            enqueue_job(refresh_reconcile_diffs_job, name='refresh_reconcile_diffs', unique=True)
+
         return super().get(request, *args, **kwargs)
+
+    def get_table(self, data, request, bulk_actions=True):
+        table = super().get_table(data, request, bulk_actions)
+        page = getattr(table, 'page', None)
+        stale = [row.record.pk for row in page.object_list if row.record.reconcile_action is None] if page else []
+        if stale:
+            refresh_reconcile_diffs(data.filter(pk__in=stale))
+            table = super().get_table(data, request, bulk_actions)
+        return table
     
     def get_extra_context(self, request, *args, **kwargs):
         reconcile_type = request.GET.get('tab')
@@ -71,168 +87,8 @@ class ReconcileView(generic.ObjectListView):
         """
         GET handler for rendering child objects.
         """
-        title = ""
-
         if pk:
-            if reconcile_type == 'interface':
-                self.queryset = models.SlurpitInterface.objects.all()
-                # instance = models.SlurpitInterface.object.get(pk=pk, **kwargs)
-                diff_added = None
-                diff_removed = None
-                action = 'Updated'
-                
-
-                interface_fields = ['name', 'label','description', 'device', 'module', 'type', 'duplex', 'speed']
-
-                incomming_queryset = SlurpitInterface.objects.filter(pk=pk)
-                incomming_obj = incomming_queryset.values(*interface_fields).first()
-
-                name = str(incomming_queryset.first().name)
-                updated_time = incomming_queryset.first().last_updated
-                title = name
-                device = incomming_obj['device']
-                incomming_obj['device'] = device
-
-                incomming_change = {**incomming_obj}
-
-                current_queryset = Interface.objects.filter(name=name, device=device)
-
-                if current_queryset:
-                    current_obj = current_queryset.values(*interface_fields).first()
-                    current_obj['name'] = name
-                    current_state = {**current_obj}
-                    instance = current_queryset.first()
-                else:
-                    current_state = None
-                    instance = None
-                    action = 'Created'
-                
-
-                if current_state and incomming_change:
-                    diff_added = shallow_compare_dict(
-                        current_state or dict(),
-                        incomming_change or dict(),
-                        exclude=['last_updated'],
-                    )
-                    diff_removed = {
-                        x: current_state.get(x) for x in diff_added
-                    } if current_state else {}
-                else:
-                    diff_added = None
-                    diff_removed = None
-
-                object_type = f'{Interface._meta.app_label} | {Interface._meta.verbose_name}'
-            
-            elif reconcile_type == 'prefix':
-                self.queryset = models.SlurpitPrefix.objects.all()
-                # instance = models.SlurpitPrefix.objects.get(pk=pk, **kwargs)
-                diff_added = None
-                diff_removed = None
-                action = 'Updated'
-                
-                prefix_fields = ['prefix', 'status','vrf', 'vlan', 'tenant', 'site', 'role', 'description']
-
-                incomming_queryset = SlurpitPrefix.objects.filter(pk=pk)
-                incomming_change = incomming_queryset.values(*prefix_fields).first()
-                incomming_change['prefix'] = str(incomming_change['prefix'])
-
-                prefix = str(incomming_queryset.first().prefix)
-                updated_time = incomming_queryset.first().last_updated
-                title = prefix
-                vrf = None
-
-                if incomming_change['vrf'] is not None:
-                    vrf = VRF.objects.get(pk=incomming_change['vrf'])
-                current_queryset = Prefix.objects.filter(prefix=prefix, vrf=vrf)
-
-                if current_queryset:
-                    current_obj = current_queryset.values(*prefix_fields).first()
-                    current_state = {**current_obj}
-                    current_state['prefix'] = str(current_state['prefix'])
-                    
-                    instance = current_queryset.first()
-                else:
-                    current_state = None
-                    instance = None
-                    action = 'Created'
-                
-                if current_state and incomming_change:
-                    diff_added = shallow_compare_dict(
-                        current_state or dict(),
-                        incomming_change or dict(),
-                        exclude=['last_updated'],
-                    )
-                    diff_removed = {
-                        x: current_state.get(x) for x in diff_added
-                    } if current_state else {}
-                else:
-                    diff_added = None
-                    diff_removed = None
-
-
-                object_type = f'{Prefix._meta.app_label} | {Prefix._meta.verbose_name}'
-
-            else:
-                # instance = models.SlurpitInitIPAddress.objects.get(pk=pk, **kwargs)
-                diff_added = None
-                diff_removed = None
-                action = 'Updated'
-
-                ipam_fields = ['address', 'status', 'dns_name', 'description', 'vrf', 'tenant', 'role']
-
-                incomming_queryset = SlurpitInitIPAddress.objects.filter(pk=pk)
-                incomming_obj = incomming_queryset.values(*ipam_fields).first()
-
-                ipaddress = str(incomming_queryset.first().address)
-                updated_time = incomming_queryset.first().last_updated
-
-
-                title = ipaddress
-                vrf = incomming_obj['vrf']
-                
-                incomming_obj['address'] = ipaddress
-                incomming_change = {**incomming_obj}
-
-                
-
-                current_queryset = IPAddress.objects.filter(address=ipaddress, vrf=vrf)
-                if current_queryset:
-                    current_obj = current_queryset.values(*ipam_fields).first()
-                    current_obj['address'] = ipaddress
-                    current_state = {**current_obj}
-                    instance = current_queryset.first()
-                else:
-                    current_state = None
-                    instance = None
-                    action = 'Created'
-                
-
-                if current_state and incomming_change:
-                    diff_added = shallow_compare_dict(
-                        current_state or dict(),
-                        incomming_change or dict(),
-                        exclude=['last_updated'],
-                    )
-                    diff_removed = {
-                        x: current_state.get(x) for x in diff_added
-                    } if current_state else {}
-                else:
-                    diff_added = None
-                    diff_removed = None
-
-                object_type = f'{IPAddress._meta.app_label} | {IPAddress._meta.verbose_name}'
-
-            return_values = {
-                'object': instance,
-                'title': title,
-                'diff_added': diff_added,
-                'diff_removed': diff_removed,
-                'incomming_change': incomming_change,
-                'current_state': current_state,
-                'updated_time': updated_time,
-                'action': action,
-                'object_type': object_type
-            }
+            return_values = get_reconcile_context(reconcile_type, pk)
 
         if reconcile_type == 'interface':
             edit_bulk_url = reverse("plugins:slurpit_netbox:slurpitinterface_bulk_edit")
@@ -261,210 +117,7 @@ class ReconcileView(generic.ObjectListView):
 
         if action == 'get':
             pk = request.POST.get('pk')
-
-            if tab == 'interface':
-                self.queryset = models.SlurpitInterface.objects.all()
-                # instance = models.SlurpitInterface.object.get(pk=pk, **kwargs)
-                diff_added = None
-                diff_removed = None
-                action = 'Updated'
-                
-                interface_fields = ['name', 'label','description', 'device', 'module', 'type', 'duplex', 'speed']
-
-                incomming_queryset = SlurpitInterface.objects.filter(pk=pk)
-                incomming_obj = incomming_queryset.values(*interface_fields).first()
-
-                name = str(incomming_queryset.first().name)
-                updated_time = incomming_queryset.first().last_updated
-                title = name
-                device = incomming_obj['device']
-                incomming_obj['device'] = device
-
-                incomming_change = {**incomming_obj}
-
-                current_queryset = Interface.objects.filter(name=name, device=device)
-
-                if current_queryset:
-                    current_obj = current_queryset.values(*interface_fields).first()
-                    current_obj['name'] = name
-                    current_state = {**current_obj}
-                    instance = current_queryset.first()
-                else:
-                    current_state = None
-                    instance = None
-                    action = 'Created'
-                
-
-                if current_state and incomming_change:
-                    diff_added = shallow_compare_dict(
-                        current_state or dict(),
-                        incomming_change or dict(),
-                        exclude=['last_updated'],
-                    )
-                    diff_removed = {
-                        x: current_state.get(x) for x in diff_added
-                    } if current_state else {}
-                else:
-                    diff_added = None
-                    diff_removed = None
-
-                object_type = f'{Interface._meta.app_label} | {Interface._meta.verbose_name}'
-            
-            elif tab == 'prefix':
-                self.queryset = models.SlurpitPrefix.objects.all()
-                # instance = models.SlurpitPrefix.objects.get(pk=pk, **kwargs)
-                diff_added = None
-                diff_removed = None
-                action = 'Updated'
-                
-                prefix_fields = ['prefix', 'status','vrf', 'vlan', 'tenant', 'site', 'role', 'description']
-
-                incomming_queryset = SlurpitPrefix.objects.filter(pk=pk)
-                incomming_change = incomming_queryset.values(*prefix_fields).first()
-                incomming_change['prefix'] = str(incomming_change['prefix'])
-
-                prefix = str(incomming_queryset.first().prefix)
-                updated_time = incomming_queryset.first().last_updated
-                title = prefix
-                vrf = None
-
-                if incomming_change['vrf'] is not None:
-                    vrf = VRF.objects.get(pk=incomming_change['vrf'])
-                current_queryset = Prefix.objects.filter(prefix=prefix, vrf=vrf)
-
-                if current_queryset:
-                    current_obj = current_queryset.values(*prefix_fields).first()
-                    current_state = {**current_obj}
-                    current_state['prefix'] = str(current_state['prefix'])
-                    
-                    instance = current_queryset.first()
-                else:
-                    current_state = None
-                    instance = None
-                    action = 'Created'
-                
-                if current_state and incomming_change:
-                    diff_added = shallow_compare_dict(
-                        current_state or dict(),
-                        incomming_change or dict(),
-                        exclude=['last_updated'],
-                    )
-                    diff_removed = {
-                        x: current_state.get(x) for x in diff_added
-                    } if current_state else {}
-                else:
-                    diff_added = None
-                    diff_removed = None
-
-
-                object_type = f'{Prefix._meta.app_label} | {Prefix._meta.verbose_name}'
-
-            elif tab == 'vlan':
-                self.queryset = models.SlurpitVLAN.objects.all()
-
-                diff_added = None
-                diff_removed = None
-                action = 'Updated'
-                
-
-                vlan_fields = ['name', 'group', 'vid', 'status', 'role', 'tenant', 'description']
-
-                incomming_queryset = SlurpitVLAN.objects.filter(pk=pk)
-                incomming_obj = incomming_queryset.values(*vlan_fields).first()
-
-                name = str(incomming_queryset.first().name)
-                updated_time = incomming_queryset.first().last_updated
-                title = name
-
-                incomming_change = {**incomming_obj}
-
-                current_queryset = VLAN.objects.filter(name=name, group__name=incomming_change['group'])
-                current_queryset = current_queryset or VLAN.objects.filter(vid=incomming_change['vid'], group__name=incomming_change['group'])
-
-                if current_queryset:
-                    current_obj = current_queryset.values(*vlan_fields).first()
-                    current_obj['name'] = name
-                    current_state = {**current_obj}
-                else:
-                    current_state = None
-                    action = 'Created'
-                
-
-                if current_state and incomming_change:
-                    diff_added = shallow_compare_dict(
-                        current_state or dict(),
-                        incomming_change or dict(),
-                        exclude=['last_updated'],
-                    )
-                    diff_removed = {
-                        x: current_state.get(x) for x in diff_added
-                    } if current_state else {}
-                else:
-                    diff_added = None
-                    diff_removed = None
-
-                object_type = f'{VLAN._meta.app_label} | {VLAN._meta.verbose_name}'
-            else:
-                diff_added = None
-                diff_removed = None
-                action = 'Updated'
-
-                ipam_fields = ['address', 'status', 'dns_name', 'description', 'vrf', 'tenant', 'role']
-
-                incomming_queryset = SlurpitInitIPAddress.objects.filter(pk=pk)
-                incomming_obj = incomming_queryset.values(*ipam_fields).first()
-
-                ipaddress = str(incomming_queryset.first().address)
-                updated_time = incomming_queryset.first().last_updated
-
-
-                title = ipaddress
-                vrf = incomming_obj['vrf']
-                
-                incomming_obj['address'] = ipaddress
-                incomming_change = {**incomming_obj}
-
-                
-
-                current_queryset = IPAddress.objects.filter(address=ipaddress, vrf=vrf)
-                if current_queryset:
-                    current_obj = current_queryset.values(*ipam_fields).first()
-                    current_obj['address'] = ipaddress
-                    current_state = {**current_obj}
-                    instance = current_queryset.first()
-                else:
-                    current_state = None
-                    instance = None
-                    action = 'Created'
-                
-
-                if current_state and incomming_change:
-                    diff_added = shallow_compare_dict(
-                        current_state or dict(),
-                        incomming_change or dict(),
-                        exclude=['last_updated'],
-                    )
-                    diff_removed = {
-                        x: current_state.get(x) for x in diff_added
-                    } if current_state else {}
-                else:
-                    diff_added = None
-                    diff_removed = None
-
-                object_type = f'{IPAddress._meta.app_label} | {IPAddress._meta.verbose_name}'
-
-            return_values = {
-                'title': title,
-                'diff_added': diff_added,
-                'diff_removed': diff_removed,
-                'incomming_change': incomming_change,
-                'current_state': current_state,
-                'updated_time': updated_time,
-                'action': action,
-                'object_type': object_type
-            }
-
-            return JsonResponse(return_values)
+            return JsonResponse(get_reconcile_context(tab, pk))
         
         if _all or len(pk_list):
             if action == 'decline':
@@ -504,377 +157,8 @@ class ReconcileView(generic.ObjectListView):
                     else:
                         messages.warning(request, "Failed to decline IP Addresses.")
             else:
-                batch_insert_qs = []
-                batch_update_qs = []
-                batch_insert_ids = []
-                batch_update_ids = []
-
-                if tab == 'interface':
-                    if _all:
-                        reconcile_items = SlurpitInterface.objects.exclude(name='')
-                    else:
-                        reconcile_items = SlurpitInterface.objects.filter(pk__in=pk_list)
-
-                    initial_obj = SlurpitInterface.objects.filter(name='').values(
-                        'ignore_module', 'ignore_type', 'ignore_speed', 'ignore_duplex'
-                    ).first()
-                    initial_interface_values = {}
-                    interface_update_ignore_values = []
-
-                    if initial_obj:
-                        initial_interface_values = {**initial_obj}
-
-                        for key in initial_interface_values.keys():
-                            if initial_interface_values[key]:
-                                interface_update_ignore_values.append(key)
-
-                    updated_fields = ['label', 'speed', 'description', 'type', 'duplex', 'module']
-                    fields_to_remove = []
-                    
-                    for field in updated_fields:
-                        ignore_field = f'ignore_{field}'
-                        if ignore_field in interface_update_ignore_values:
-                            fields_to_remove.append(field)
-
-                    updated_fields = list(set(updated_fields) - set(fields_to_remove))
-
-                    for item in reconcile_items:
-                        netbox_interface = Interface.objects.filter(name=item.name, device=item.device)
-                        # If the interface is existed in netbox
-                        if netbox_interface:
-                            netbox_interface = netbox_interface.first()
-
-                            
-                            for field in item._meta.fields:
-                                field_name = field.name
-                                field_value = getattr(item, field_name)
-                                if field_name in updated_fields and field_value is not None and field_value != "":
-                                    setattr(netbox_interface, field_name, field_value)
-
-                            batch_update_qs.append(netbox_interface)
-                            batch_update_ids.append(item.pk)
-                        else:
-                            batch_insert_qs.append(
-                                Interface(
-                                    name = item.name,
-                                    label = item.label, 
-                                    device = item.device,
-                                    speed = item. speed, 
-                                    type = item.type,
-                                    description = item.description,
-                                    duplex = item.duplex,
-                                    module = item.module
-                            ))
-                            batch_insert_ids.append(item.pk)
-                        
-                    count = len(batch_insert_qs)
-                    offset = 0
-                    while offset < count:
-                        batch_qs = batch_insert_qs[offset:offset + BATCH_SIZE]
-                        batch_ids = batch_insert_ids[offset:offset + BATCH_SIZE]
-                        to_import = []        
-                        for interface_item in batch_qs:
-                            to_import.append(interface_item)
-
-                        with transaction.atomic():
-                            Interface.objects.bulk_create(to_import)
-                            SlurpitInterface.objects.filter(pk__in=batch_ids).delete()
-                        offset += BATCH_SIZE
-
-                    count = len(batch_update_qs)
-                    offset = 0
-                    while offset < count:
-                        batch_qs = batch_update_qs[offset:offset + BATCH_SIZE]
-                        batch_ids = batch_update_ids[offset:offset + BATCH_SIZE]
-                        to_import = []        
-                        for interface_item in batch_qs:
-                            to_import.append(interface_item)
-
-                        with transaction.atomic():
-                            Interface.objects.bulk_update(to_import, fields=updated_fields)
-                        
-                            SlurpitInterface.objects.filter(pk__in=batch_ids).delete()
-
-                        offset += BATCH_SIZE
-                elif tab == 'vlan':
-                    if _all:
-                        reconcile_items = SlurpitVLAN.objects.exclude(name='')
-                    else:
-                        reconcile_items = SlurpitVLAN.objects.filter(pk__in=pk_list)
-
-                    initial_obj = SlurpitVLAN.objects.filter(name='').values(
-                        'ignore_status', 'ignore_role', 'ignore_tenant', 'ignore_description'
-                    ).first()
-                    initial_vlan_values = {}
-                    vlan_update_ignore_values = []
-
-                    if initial_obj:
-                        initial_vlan_values = {**initial_obj}
-
-                        for key in initial_vlan_values.keys():
-                            if initial_vlan_values[key]:
-                                vlan_update_ignore_values.append(key)
-
-                    updated_fields = ['status', 'role', 'tenant', 'description']
-                    fields_to_remove = []
-                    
-                    for field in updated_fields:
-                        ignore_field = f'ignore_{field}'
-                        if ignore_field in vlan_update_ignore_values:
-                            fields_to_remove.append(field)
-
-                    updated_fields = list(set(updated_fields) - set(fields_to_remove))
-
-                    for item in reconcile_items:
-                        netbox_vlan = VLAN.objects.filter(name=item.name, group__name=item.group)
-                        if netbox_vlan is None:
-                            netbox_vlan = VLAN.objects.filter(vid=item.vid, group__name=item.group)
-
-                        # If the vlan is existed in netbox
-                        if netbox_vlan:
-                            netbox_vlan = netbox_vlan.first()
-                            
-                            for field in item._meta.fields:
-                                field_name = field.name
-                                field_value = getattr(item, field_name)
-                                if field_name in updated_fields and field_value is not None and field_value != "":
-                                    setattr(netbox_vlan, field_name, field_value)
-
-                            batch_update_qs.append(netbox_vlan)
-                            batch_update_ids.append(item.pk)
-                        else:
-                            group = VLANGroup.objects.filter(name=item.group)
-                            print("vlan")
-                            print(group)
-                            if group:
-                                group = group.first()
-                            else:
-                                group = VLANGroup.objects.create(name=item.group, slug=item.group)
-                                
-                            batch_insert_qs.append(
-                                VLAN(
-                                    name = item.name,
-                                    group = group, 
-                                    vid = item. vid, 
-                                    status = item.status,
-                                    description = item.description,
-                                    role = item.role,
-                                    tenant = item.tenant
-                            ))
-                            batch_insert_ids.append(item.pk)
-                        
-                    count = len(batch_insert_qs)
-                    offset = 0
-                    while offset < count:
-                        batch_qs = batch_insert_qs[offset:offset + BATCH_SIZE]
-                        batch_ids = batch_insert_ids[offset:offset + BATCH_SIZE]
-                        to_import = []        
-                        for vlan_item in batch_qs:
-                            to_import.append(vlan_item)
-
-                        with transaction.atomic():
-                            VLAN.objects.bulk_create(to_import)
-                            SlurpitVLAN.objects.filter(pk__in=batch_ids).delete()
-                        offset += BATCH_SIZE
-
-                    count = len(batch_update_qs)
-                    offset = 0
-                    while offset < count:
-                        batch_qs = batch_update_qs[offset:offset + BATCH_SIZE]
-                        batch_ids = batch_update_ids[offset:offset + BATCH_SIZE]
-                        to_import = []        
-                        for vlan_item in batch_qs:
-                            to_import.append(vlan_item)
-
-                        with transaction.atomic():
-                            VLAN.objects.bulk_update(to_import, fields=updated_fields)
-                        
-                            SlurpitVLAN.objects.filter(pk__in=batch_ids).delete()
-
-                        offset += BATCH_SIZE
-                elif tab == 'prefix':
-                    if _all:
-                        reconcile_items =SlurpitPrefix.objects.exclude(prefix=None)
-                    else:
-                        reconcile_items =SlurpitPrefix.objects.filter(pk__in=pk_list)
-                    
-                    initial_obj = SlurpitPrefix.objects.filter(prefix=None).values(
-                        'ignore_status', 'ignore_vrf', 'ignore_role', 'ignore_site', 'ignore_vlan', 'ignore_tenant', 'ignore_description'
-                    ).first()
-                    initial_prefix_values = {}
-                    prefix_update_ignore_values = []
-
-                    if initial_obj:
-                        initial_prefix_values = {**initial_obj}
-
-                        for key in initial_prefix_values.keys():
-                            if initial_prefix_values[key]:
-                                prefix_update_ignore_values.append(key)
-
-                    updated_fields = ['status', 'tenant', 'description', 'role', 'vlan', 'site']
-                    fields_to_remove = []
-                    
-                    for field in updated_fields:
-                        ignore_field = f'ignore_{field}'
-                        if ignore_field in prefix_update_ignore_values:
-                            fields_to_remove.append(field)
-
-                    updated_fields = list(set(updated_fields) - set(fields_to_remove))
-
-                    for item in reconcile_items:
-                        netbox_prefix = Prefix.objects.filter(prefix=item.prefix, vrf=item.vrf)
-                        # If the prefix is existed in netbox
-                        if netbox_prefix:
-                            netbox_prefix = netbox_prefix.first()
-                            
-                            for field in item._meta.fields:
-                                field_name = field.name
-                                field_value = getattr(item, field_name)
-                                if field_name in updated_fields and field_value is not None and field_value != "":
-                                    setattr(netbox_prefix, field_name, field_value)
-
-                            if item.description is None:
-                                netbox_prefix.description = ""
-                            
-                            batch_update_qs.append(netbox_prefix)
-                            batch_update_ids.append(item.pk)
-                        else:
-                            batch_insert_qs.append(
-                                Prefix(
-                                    prefix = item.prefix,
-                                    status = item.status, 
-                                    vrf = item.vrf,
-                                    role = item. role, 
-                                    vlan = item.vlan,
-                                    description = item.description,
-                                    tenant = item.tenant,
-                                    site = item.site
-                            ))
-                            batch_insert_ids.append(item.pk)
-                        
-                    count = len(batch_insert_qs)
-                    offset = 0
-                    while offset < count:
-                        batch_qs = batch_insert_qs[offset:offset + BATCH_SIZE]
-                        batch_ids = batch_insert_ids[offset:offset + BATCH_SIZE]
-                        to_import = []        
-                        for prefix_item in batch_qs:
-                            to_import.append(prefix_item)
-
-                        with transaction.atomic():
-                            Prefix.objects.bulk_create(to_import)
-                            SlurpitPrefix.objects.filter(pk__in=batch_ids).delete()
-                        offset += BATCH_SIZE
-
-                    count = len(batch_update_qs)
-                    offset = 0
-                    while offset < count:
-                        batch_qs = batch_update_qs[offset:offset + BATCH_SIZE]
-                        batch_ids = batch_update_ids[offset:offset + BATCH_SIZE]
-                        to_import = []        
-                        for prefix_item in batch_qs:
-                            to_import.append(prefix_item)
-
-                        with transaction.atomic():
-                            Prefix.objects.bulk_update(to_import, fields=updated_fields)
-                        
-                            SlurpitPrefix.objects.filter(pk__in=batch_ids).delete()
-
-                        offset += BATCH_SIZE
-                else:
-                    if _all:
-                        reconcile_items =SlurpitInitIPAddress.objects.exclude(address=None)
-                    else:
-                        reconcile_items =SlurpitInitIPAddress.objects.filter(pk__in=pk_list)
-
-                    initial_obj = SlurpitInitIPAddress.objects.filter(address=None).values(
-                        'ignore_status', 'ignore_vrf', 'ignore_tenant', 'ignore_role', 'ignore_description'
-                    ).first()
-
-                    initial_ipaddress_values = {}
-                    ipaddress_update_ignore_values = []
-
-                    if initial_obj:
-                        initial_ipaddress_values = {**initial_obj}
-
-                        for key in initial_ipaddress_values.keys():
-                            if initial_ipaddress_values[key]:
-                                ipaddress_update_ignore_values.append(key)
-
-                    updated_fields = ['status', 'role', 'tenant', 'dns_name', 'description']
-                    fields_to_remove = []
-                    
-                    for field in updated_fields:
-                        ignore_field = f'ignore_{field}'
-                        if ignore_field in ipaddress_update_ignore_values:
-                            fields_to_remove.append(field)
-
-                    updated_fields = list(set(updated_fields) - set(fields_to_remove))
-
-                    for item in reconcile_items:
-                        netbox_ipaddress = IPAddress.objects.filter(address=item.address, vrf=item.vrf)
-                        # If the ip address is existed in netbox
-                        if netbox_ipaddress:
-                            netbox_ipaddress = netbox_ipaddress.first()
-
-                            for field in item._meta.fields:
-                                field_name = field.name
-                                field_value = getattr(item, field_name)
-                                if field_name in updated_fields and field_value is not None and field_value != "":
-                                    setattr(netbox_ipaddress, field_name, field_value)
-
-                            
-                            if item.dns_name is None:
-                                netbox_ipaddress.dns_name = ""
-
-                            if item.description is None:
-                                netbox_ipaddress.description = ""
-
-                            batch_update_qs.append(netbox_ipaddress)
-                            batch_update_ids.append(item.pk)
-                        else:
-                            batch_insert_qs.append(
-                                IPAddress(
-                                    address = item.address, 
-                                    vrf = item.vrf,
-                                    status = item. status, 
-                                    role = item.role,
-                                    description = item.description,
-                                    tenant = item.tenant,
-                                    dns_name = item.dns_name,
-                            ))
-
-                            batch_insert_ids.append(item.pk)
-                        
-                    count = len(batch_insert_qs)
-                    offset = 0
-                    while offset < count:
-                        batch_qs = batch_insert_qs[offset:offset + BATCH_SIZE]
-                        batch_ids = batch_insert_ids[offset:offset + BATCH_SIZE]
-                        to_import = []        
-                        for ipaddress_item in batch_qs:
-                            to_import.append(ipaddress_item)
-
-                        with transaction.atomic():
-                            IPAddress.objects.bulk_create(to_import)
-                            SlurpitInitIPAddress.objects.filter(pk__in=batch_ids).delete()
-                        offset += BATCH_SIZE
-
-                    count = len(batch_update_qs)
-                    offset = 0
-                    while offset < count:
-                        batch_qs = batch_update_qs[offset:offset + BATCH_SIZE]
-                        batch_ids = batch_update_ids[offset:offset + BATCH_SIZE]
-                        to_import = []        
-                        for ipaddress_item in batch_qs:
-                            to_import.append(ipaddress_item)
-
-                        with transaction.atomic():
-                            IPAddress.objects.bulk_update(to_import, fields=updated_fields)
-                        
-                            SlurpitInitIPAddress.objects.filter(pk__in=batch_ids).delete()
-
-                        offset += BATCH_SIZE
+                job_id = enqueue_job(accept_reconcile_job, tab, pk_list, bool(_all), name=f'reconcile_{tab or "ipam"}')
+                messages.info(request, f"Started to accept the selected reconcile items in the background (job {job_id}).")
         else:
             messages.warning(request, "No Reconcile Items were selected.")
 
@@ -909,177 +193,299 @@ class ReconcileView(generic.ObjectListView):
 
         return redirect(url_with_querystring)
     
-class ReconcileDetailView(generic.ObjectView):
-    queryset = models.SlurpitInitIPAddress.objects.all()
-
-    template_name = 'slurpit_netbox/reconcile_detail.html'
-
-    def get(self, request, pk, reconcile_type, **kwargs):
-        """
-        GET handler for rendering child objects.
-        """
-        title = ""
-        if reconcile_type == 'interface':
-            self.queryset = models.SlurpitInterface.objects.all()
-            instance = self.get_object(pk=pk, **kwargs)
-            diff_added = None
-            diff_removed = None
-            action = 'Updated'
-            
-
-            interface_fields = ['name', 'label','description', 'device', 'module', 'type', 'duplex', 'speed']
-
-            incomming_queryset = SlurpitInterface.objects.filter(pk=pk)
-            incomming_obj = incomming_queryset.values(*interface_fields).first()
-
-            name = str(incomming_queryset.first().name)
-            updated_time = incomming_queryset.first().last_updated
-            title = name
-            device = incomming_obj['device']
-            incomming_obj['device'] = device
-
-            incomming_change = {**incomming_obj}
-
-            current_queryset = Interface.objects.filter(name=name, device=device)
-
-            if current_queryset:
-                current_obj = current_queryset.values(*interface_fields).first()
-                current_obj['name'] = name
-                current_state = {**current_obj}
-                instance = current_queryset.first()
-            else:
-                current_state = None
-                instance = None
-                action = 'Created'
-            
-
-            if current_state and incomming_change:
-                diff_added = shallow_compare_dict(
-                    current_state or dict(),
-                    incomming_change or dict(),
-                    exclude=['last_updated'],
-                )
-                diff_removed = {
-                    x: current_state.get(x) for x in diff_added
-                } if current_state else {}
-            else:
-                diff_added = None
-                diff_removed = None
-
-            object_type = f'{Interface._meta.app_label} | {Interface._meta.verbose_name}'
-        
-        elif reconcile_type == 'prefix':
-            self.queryset = models.SlurpitPrefix.objects.all()
-            instance = self.get_object(pk=pk, **kwargs)
-            diff_added = None
-            diff_removed = None
-            action = 'Updated'
-            
-            prefix_fields = ['prefix', 'status','vrf', 'vlan', 'tenant', 'site', 'role', 'description']
-
-            incomming_queryset = SlurpitPrefix.objects.filter(pk=pk)
-            incomming_change = incomming_queryset.values(*prefix_fields).first()
-            incomming_change['prefix'] = str(incomming_change['prefix'])
-
-            prefix = str(incomming_queryset.first().prefix)
-            updated_time = incomming_queryset.first().last_updated
-            title = prefix
-            vrf = None
-
-            if incomming_change['vrf'] is not None:
-                vrf = VRF.objects.get(pk=incomming_change['vrf'])
-            current_queryset = Prefix.objects.filter(prefix=prefix, vrf=vrf)
-
-            if current_queryset:
-                current_obj = current_queryset.values(*prefix_fields).first()
-                current_state = {**current_obj}
-                current_state['prefix'] = str(current_state['prefix'])
-                
-                instance = current_queryset.first()
-            else:
-                current_state = None
-                instance = None
-                action = 'Created'
-            
-            if current_state and incomming_change:
-                diff_added = shallow_compare_dict(
-                    current_state or dict(),
-                    incomming_change or dict(),
-                    exclude=['last_updated'],
-                )
-                diff_removed = {
-                    x: current_state.get(x) for x in diff_added
-                } if current_state else {}
-            else:
-                diff_added = None
-                diff_removed = None
-
-
-            object_type = f'{Prefix._meta.app_label} | {Prefix._meta.verbose_name}'
 
+def get_update_fields(model, initial_filter, update_fields, ignore_fields):
+    """
+    Drop the fields the initial (settings) row of `model` marks as ignored from `update_fields`.
+    """
+    initial_obj = model.objects.filter(**initial_filter).values(*ignore_fields).first() or {}
+    return [field for field in update_fields if not initial_obj.get(f'ignore_{field}')]
+
+
+def copy_reconcile_values(item, netbox_obj, update_fields):
+    for field_name in update_fields:
+        field_value = getattr(item, field_name)
+        if field_value is not None and field_value != "":
+            setattr(netbox_obj, field_name, field_value)
+
+
+RECONCILE_TABS = {
+    'interface': (SlurpitInterface, Interface, 'name'),
+    'prefix': (SlurpitPrefix, Prefix, 'prefix'),
+    'vlan': (SlurpitVLAN, VLAN, 'name'),
+    'ipam': (SlurpitInitIPAddress, IPAddress, 'address'),
+}
+
+
+def get_reconcile_context(tab, pk):
+    """
+    Build the "current vs incoming" comparison of a reconcile item from its stored diff.
+    """
+    model, netbox_model, title_field = RECONCILE_TABS.get(tab, RECONCILE_TABS['ipam'])
+    item = get_object_or_404(model, pk=pk)
+    if item.reconcile_action is None:
+        refresh_reconcile_diffs(model.objects.filter(pk=item.pk))
+        item.refresh_from_db(fields=('reconcile_action', 'reconcile_diff'))
+
+    diff = item.reconcile_diff
+    current_state = diff['current']
+    incomming_change = diff['incoming']
+    if current_state:
+        diff_added = {field: incomming_change[field] for field in diff['changed']}
+        diff_removed = {field: current_state[field] for field in diff['changed']}
+    else:
+        diff_added = None
+        diff_removed = None
+
+    return {
+        'title': str(incomming_change[title_field]),
+        'diff_added': diff_added,
+        'diff_removed': diff_removed,
+        'incomming_change': incomming_change,
+        'current_state': current_state,
+        'updated_time': item.last_updated,
+        'reconcile_action': item.reconcile_action,
+        'action': 'Created' if current_state is None else 'Updated',
+        'object_type': f'{netbox_model._meta.app_label} | {netbox_model._meta.verbose_name}'
+    }
+
+
+def accept_interfaces(batch, update_fields):
+    existing = {
+        (interface.device_id, interface.name): interface
+        for interface in Interface.objects.filter(
+            device_id__in={item.device_id for item in batch},
+            name__in={item.name for item in batch}
+        )
+    }
+
+    to_create = []
+    to_update = []
+    for item in batch:
+        netbox_interface = existing.get((item.device_id, item.name))
+        # If the interface is existed in netbox
+        if netbox_interface:
+            copy_reconcile_values(item, netbox_interface, update_fields)
+            to_update.append(netbox_interface)
         else:
-            instance = self.get_object(pk=pk, **kwargs)
-            diff_added = None
-            diff_removed = None
-            action = 'Updated'
-
-            ipam_fields = ['address', 'status', 'dns_name', 'description', 'vrf', 'tenant', 'role']
+            to_create.append(
+                Interface(
+                    name = item.name,
+                    label = item.label, 
+                    device = item.device,
+                    speed = item.speed, 
+                    type = item.type,
+                    description = item.description,
+                    duplex = item.duplex,
+                    module = item.module
+            ))
+    return to_create, to_update
+
+
+def accept_vlans(batch, update_fields):
+    # VLAN groups are named after the host and created up front for the whole batch
+    group_names = {item.group for item in batch}
+    groups = {}
+    for group in VLANGroup.objects.filter(name__in=group_names):
+        groups.setdefault(group.name, group)
+    new_groups = VLANGroup.objects.bulk_create([
+        VLANGroup(name=name, slug=name) for name in group_names if name not in groups
+    ])
+    if new_groups:
+        search_backend.cache(new_groups)
+    for group in new_groups:
+        groups[group.name] = group
+
+    existing_by_name = {}
+    existing_by_vid = {}
+    for vlan in VLAN.objects.filter(group__in=groups.values()).filter(
+        Q(name__in={item.name for item in batch}) | Q(vid__in={item.vid for item in batch})
+    ):
+        existing_by_name.setdefault((vlan.group_id, vlan.name), vlan)
+        existing_by_vid.setdefault((vlan.group_id, vlan.vid), vlan)
+
+    to_create = []
+    to_update = []
+    for item in batch:
+        group = groups[item.group]
+        netbox_vlan = existing_by_name.get((group.pk, item.name)) or existing_by_vid.get((group.pk, item.vid))
+
+        # If the vlan is existed in netbox
+        if netbox_vlan:
+            copy_reconcile_values(item, netbox_vlan, update_fields)
+            to_update.append(netbox_vlan)
+        else:
+            to_create.append(
+                VLAN(
+                    name = item.name,
+                    group = group, 
+                    vid = item.vid, 
+                    status = item.status,
+                    description = item.description,
+                    role = item.role,
+                    tenant = item.tenant
+            ))
+    return to_create, to_update
+
+
+def accept_prefixes(batch, update_fields):
+    existing = {
+        (prefix.vrf_id, str(prefix.prefix)): prefix
+        for prefix in Prefix.objects.filter(
+            vrf_q({item.vrf_id for item in batch}),
+            prefix__in={str(item.prefix) for item in batch}
+        )
+    }
+
+    to_create = []
+    to_update = []
+    for item in batch:
+        netbox_prefix = existing.get((item.vrf_id, str(item.prefix)))
+        # If the prefix is existed in netbox
+        if netbox_prefix:
+            copy_reconcile_values(item, netbox_prefix, update_fields)
+            if item.description is None:
+                netbox_prefix.description = ""
+            to_update.append(netbox_prefix)
+        else:
+            to_create.append(
+                Prefix(
+                    prefix = item.prefix,
+                    status = item.status, 
+                    vrf = item.vrf,
+                    role = item.role, 
+                    vlan = item.vlan,
+                    description = item.description,
+                    tenant = item.tenant,
+                    site = item.site
+            ))
+    return to_create, to_update
+
+
+def accept_ipaddresses(batch, update_fields):
+    existing = {
+        (ipaddress.vrf_id, str(ipaddress.address)): ipaddress
+        for ipaddress in IPAddress.objects.filter(
+            vrf_q({item.vrf_id for item in batch}),
+            address__in={str(item.address) for item in batch}
+        )
+    }
+
+    to_create = []
+    to_update = []
+    for item in batch:
+        netbox_ipaddress = existing.get((item.vrf_id, str(item.address)))
+        # If the ip address is existed in netbox
+        if netbox_ipaddress:
+            copy_reconcile_values(item, netbox_ipaddress, update_fields)
+            if item.dns_name is None:
+                netbox_ipaddress.dns_name = ""
+            if item.description is None:
+                netbox_ipaddress.description = ""
+            to_update.append(netbox_ipaddress)
+        else:
+            to_create.append(
+                IPAddress(
+                    address = item.address, 
+                    vrf = item.vrf,
+                    status = item.status, 
+                    role = item.role,
+                    description = item.description,
+                    tenant = item.tenant,
+                    dns_name = item.dns_name,
+            ))
+    return to_create, to_update
+
+
+def accept_reconcile_items(tab, pk_list, accept_all, progress=None):
+    """
+    Apply the selected reconcile items of `tab` to NetBox and remove them from the reconcile list.
+
+    Items are processed in chunks of BATCH_SIZE: each chunk looks up the NetBox objects it touches with one
+    keyed query and is committed on its own, so a large queue makes steady progress.
+    """
+    progress = progress or JobProgress()
+
+    if tab == 'interface':
+        reconcile_qs = SlurpitInterface.objects.exclude(name='').select_related('device', 'module')
+        netbox_model = Interface
+        accept_batch = accept_interfaces
+        update_fields = get_update_fields(
+            SlurpitInterface, {'name': ''},
+            ['label', 'speed', 'description', 'type', 'duplex', 'module'],
+            ['ignore_module', 'ignore_type', 'ignore_speed', 'ignore_duplex']
+        )
+    elif tab == 'vlan':
+        reconcile_qs = SlurpitVLAN.objects.exclude(name='').select_related('role', 'tenant')
+        netbox_model = VLAN
+        accept_batch = accept_vlans
+        update_fields = get_update_fields(
+            SlurpitVLAN, {'name': ''},
+            ['status', 'role', 'tenant', 'description'],
+            ['ignore_status', 'ignore_role', 'ignore_tenant', 'ignore_description']
+        )
+    elif tab == 'prefix':
+        reconcile_qs = SlurpitPrefix.objects.exclude(prefix=None).select_related('vrf', 'role', 'vlan', 'tenant', 'site')
+        netbox_model = Prefix
+        accept_batch = accept_prefixes
+        update_fields = get_update_fields(
+            SlurpitPrefix, {'prefix': None},
+            ['status', 'tenant', 'description', 'role', 'vlan', 'site'],
+            ['ignore_status', 'ignore_vrf', 'ignore_role', 'ignore_site', 'ignore_vlan', 'ignore_tenant', 'ignore_description']
+        )
+    else:
+        reconcile_qs = SlurpitInitIPAddress.objects.exclude(address=None).select_related('vrf', 'tenant')
+        netbox_model = IPAddress
+        accept_batch = accept_ipaddresses
+        update_fields = get_update_fields(
+            SlurpitInitIPAddress, {'address': None},
+            ['status', 'role', 'tenant', 'dns_name', 'description'],
+            ['ignore_status', 'ignore_vrf', 'ignore_tenant', 'ignore_role', 'ignore_description']
+        )
 
-            incomming_queryset = SlurpitInitIPAddress.objects.filter(pk=pk)
-            incomming_obj = incomming_queryset.values(*ipam_fields).first()
+    if not accept_all:
+        reconcile_qs = reconcile_qs.filter(pk__in=pk_list)
 
-            ipaddress = str(incomming_queryset.first().address)
-            updated_time = incomming_queryset.first().last_updated
+    progress.phase(tab, reconcile_qs.count())
+    counts = {'created': 0, 'updated': 0}
+    last_pk = 0
+    while True:
+        batch = list(reconcile_qs.filter(pk__gt=last_pk).order_by('pk')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
 
+        to_create, to_update = accept_batch(batch, update_fields)
+        with transaction.atomic():
+            netbox_model.objects.bulk_create(to_create)
+            if update_fields:
+                netbox_model.objects.bulk_update(to_update, fields=update_fields)
+            reconcile_qs.model.objects.filter(pk__in=[item.pk for item in batch]).delete()
+            mark_reconcile_rows_stale([*to_create, *to_update])
 
-            title = ipaddress
-            vrf = incomming_obj['vrf']
-            
-            incomming_obj['address'] = ipaddress
-            incomming_change = {**incomming_obj}
+        counts['created'] += len(to_create)
+        counts['updated'] += len(to_update)
+        progress.advance(len(batch))
 
-            current_queryset = IPAddress.objects.filter(address=ipaddress, vrf=vrf)
-            if current_queryset:
-                current_obj = current_queryset.values(*ipam_fields).first()
-                current_obj['address'] = ipaddress
-                current_state = {**current_obj}
-                instance = current_queryset.first()
-            else:
-                current_state = None
-                instance = None
-                action = 'Created'
-            
+    return counts
 
-            if current_state and incomming_change:
-                diff_added = shallow_compare_dict(
-                    current_state or dict(),
-                    incomming_change or dict(),
-                    exclude=['last_updated'],
-                )
-                diff_removed = {
-                    x: current_state.get(x) for x in diff_added
-                } if current_state else {}
-            else:
-                diff_added = None
-                diff_removed = None
 
-            object_type = f'{IPAddress._meta.app_label} | {IPAddress._meta.verbose_name}'
+class ReconcileDetailView(generic.ObjectView):
+    queryset = models.SlurpitInitIPAddress.objects.all()
 
+    template_name = 'slurpit_netbox/reconcile_detail.html'
 
+    def get(self, request, pk, reconcile_type, **kwargs):
+        """
+        GET handler for rendering child objects.
+        """
+        context = get_reconcile_context(reconcile_type, pk)
         return render(
             request,
             self.template_name,
-            
             {
-                'object_action': instance.action,
-                'title': title,
-                'diff_added': diff_added,
-                'diff_removed': diff_removed,
-                'incomming_change': incomming_change,
-                'current_state': current_state,
-                'updated_time': updated_time,
-                'action': action,
-                'object_type': object_type
+                'object_action': context.pop('reconcile_action'),
+                **context
             },
         )
     
@@ -1,3 +1,4 @@
+import hashlib
 import requests
 from datetime import datetime
 
@@ -32,19 +33,11 @@ from ..tables import SlurpitPlanningTable
 from ..management.choices import *
 from ..decorators import slurpit_plugin_registered
 from ..utilities import generate_random_string
-from ..importer import get_latest_data_on_planning, import_plannings
+from ..importer import get_latest_data_on_planning, get_snapshot_cache_key, import_plannings, save_snapshots, SNAPSHOT_CACHE_TIMEOUT
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
-from json import JSONEncoder
-import json
 
-class OrderedEncoder(JSONEncoder):
-    def encode(self, o):
-        if isinstance(o, dict):
-            return "{" + ", ".join(f'{self.encode(k)}: {self.encode(v)}' for k, v in o.items()) + "}"
-        return super().encode(o)
-    
 BATCH_SIZE = 128
 
 @method_decorator(slurpit_plugin_registered, name='dispatch')
@@ -139,6 +132,10 @@ class SettingsView(View):
                     "type": "POST",
                     "url": "api/plugins/slurpit/planning/sync/"
                 },
+                {
+                    "type": "POST",
+                    "url": "api/plugins/slurpit/planning/refresh/{planning_id}/"
+                },
                 {
                     "type": "DELETE",
                     "url": "api/plugins/slurpit/planning/delete/{planning_id}/"
@@ -175,6 +172,18 @@ class SettingsView(View):
                     "type": "POST",
                     "url": "api/plugins/slurpit/device/sync_end/"
                 },
+                {
+                    "type": "GET",
+                    "url": "api/plugins/slurpit/device/sync_delta/"
+                },
+                {
+                    "type": "POST",
+                    "url": "api/plugins/slurpit/device/sync_delta/"
+                },
+                {
+                    "type": "GET",
+                    "url": "api/plugins/slurpit/job/{job_id}/"
+                },
                 {
                     "type": "DELETE",
                     "url": "api/plugins/slurpit/device/delete/{hostname}/"
@@ -361,6 +370,48 @@ class SlurpitViewTab(ViewTab):
             'weight': self.weight,
         }
     
+class SnapshotRows:
+    """
+    The result rows of a snapshot as a sequence for the planning table. Searching, ordering and paging run
+    in the database, and only the rows of the requested page are decoded and cached.
+    """
+    def __init__(self, snapshot, cache_key, search='', order_by=None):
+        self.snapshot = snapshot
+        self.search = search
+        self.order_by = order_by
+        # Snapshots are updated in place, the pages are keyed on the time they were last stored
+        digest = hashlib.sha1(f"{search}\x1f{order_by}".encode(), usedforsecurity=False).hexdigest()
+        self.cache_prefix = f"{cache_key}_{snapshot.pk}_{snapshot.last_updated.timestamp()}_{digest}"
+        self.length = None
+
+    def __len__(self):
+        if self.length is None:
+            self.length = cache.get_or_set(
+                f"{self.cache_prefix}_count",
+                lambda: self.snapshot.count_rows(self.search),
+                SNAPSHOT_CACHE_TIMEOUT
+            )
+        return self.length
+
+    def __iter__(self):
+        for start in range(0, len(self), BATCH_SIZE):
+            yield from self[start:start + BATCH_SIZE]
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            index = range(len(self))[key]
+            return self[index:index + 1][0]
+        start, stop, _ = key.indices(len(self))
+        return cache.get_or_set(
+            f"{self.cache_prefix}_{start}_{stop}",
+            lambda: self.snapshot.get_rows(start, stop, self.search, self.order_by),
+            SNAPSHOT_CACHE_TIMEOUT
+        )
+
+    def sort(self, key=None, reverse=False):
+        # The table orders the rows through order_by, which is applied in the database
+        pass
+
 @register_model_view(Device, "Slurpit")
 class SlurpitPlanningning(View):
     template_name = "slurpit_netbox/planning_table.html"
@@ -393,7 +444,7 @@ class SlurpitPlanningning(View):
             if result_type is None:
                 result_type = "planning"
 
-            cache_key = f"slurpit_plan_{planning.planning_id}_{device.name}_{result_type}"
+            cache_key = get_snapshot_cache_key(planning.planning_id, device.name, result_type)
 
             url_no_refresh = get_refresh_url(request, pk)
 
@@ -411,34 +462,32 @@ class SlurpitPlanningning(View):
                     
                 return HttpResponseRedirect(url_no_refresh)
 
-            cached_time, data = cache.get(cache_key, (None, None))
-            if cached_time:
+            # Only the snapshot without its content is cached, the rows of a page are read when it's rendered
+            cached_time, snapshot = cache.get(cache_key, (None, None))
+            if isinstance(snapshot, SlurpitSnapshot):
                 result_status = "Cached"
-
-            if data is None or len(data) == 0:
-                data = []
+            else:
+                snapshot = None
                 try: 
                     result_key = f"{result_type}_result"
-                    temp = SlurpitSnapshot.objects.filter(hostname=device.name, planning_id=planning.planning_id, result_type=result_key)
+                    temp = SlurpitSnapshot.objects.filter(hostname=device.name, planning_id=planning.planning_id, result_type=result_key).defer('content')
+                    snapshot = temp.first()
                     # Empty case
-                    if temp.count() == 0:
-                        if appliance_type != "push":
-                            sync_snapshot(cache_key, device.name, planning)
-                        temp = SlurpitSnapshot.objects.filter(hostname=device.name, planning_id=planning.planning_id, result_type=result_key)
-                    
-                    for r in temp:
-                        try:
-                            r = json.loads(r.content)
-                        except:
-                            r = r.content
-                        # raw = r[result_key]
-                        data.append({**r})
-                    result_status = "Live"
-                    cache.set(cache_key, (datetime.now(), data), 60 * 60 * 8)
+                    if snapshot is None and appliance_type != "push":
+                        sync_snapshot(cache_key, device.name, planning)
+                        snapshot = temp.first()
+
+                    if snapshot is not None:
+                        result_status = "Live"
+                        cache.set(cache_key, (datetime.now(), snapshot), SNAPSHOT_CACHE_TIMEOUT)
                     
                 except Exception as e:
                     messages.error(request, e)
 
+            if snapshot is not None:
+                data = SnapshotRows(snapshot, cache_key, request.GET.get('q', '').strip(), request.GET.get('sort'))
+                columns = snapshot.columns
+
         if refresh == "refresh":
             url_no_refresh = get_refresh_url(request, pk)
             return HttpResponseRedirect(url_no_refresh)
@@ -446,10 +495,6 @@ class SlurpitPlanningning(View):
         if not data:
             data = []
         
-        if len(data) > 0:
-            raw = data[0]
-            columns = list(raw.keys())
-        
         columns = [(k, Column()) for k in columns]
         table = SlurpitPlanningTable(data, extra_columns=columns)
 
@@ -493,22 +538,14 @@ def sync_snapshot(cache_key, device_name, plan, test=False, data={}):
         data = get_latest_data_on_planning(device_name, plan.planning_id)
   
     if data is not None:
-        temp = data[plan.name]["planning_results"]
-        
-        if temp is not None:
-            count = SlurpitSnapshot.objects.filter(hostname=device_name, planning_id=plan.planning_id).delete()[0]
-            SlurpitLog.info(category=LogCategoryChoices.PLANNING, message=f"Sync deleted {count} snapshots for planning {plan.name}")
-
-        new_items = []
-        for item in temp:
-            content = json.dumps(item, cls=OrderedEncoder)
-            new_items.append(SlurpitSnapshot(hostname=device_name, planning_id=plan.planning_id, content=content, result_type="planning_result"))
+        planning_results = data[plan.name]["planning_results"]
+        template_results = data[plan.name]["template_results"]
 
-        temp = data[plan.name]["template_results"]
+        if planning_results is None:
+            return
 
-        for item in temp:
-            content = json.dumps(item, cls=OrderedEncoder)
-            new_items.append(SlurpitSnapshot(hostname=device_name, planning_id=plan.planning_id, content=content, result_type="template_result"))
-        
-        SlurpitSnapshot.objects.bulk_create(new_items, batch_size=BATCH_SIZE, ignore_conflicts=True)
-        SlurpitLog.info(category=LogCategoryChoices.PLANNING, message=f"Sync imported {len(new_items)} snapshots for planning {plan.name}")
+        count = save_snapshots({
+            (device_name, plan.planning_id, "planning_result"): planning_results,
+            (device_name, plan.planning_id, "template_result"): template_results or [],
+        })
+        SlurpitLog.info(category=LogCategoryChoices.PLANNING, message=f"Sync imported {count} snapshot rows for planning {plan.name}")
\ No newline at end of file
@@ -6,6 +6,7 @@ import requests
 from psycopg2.extras import DictCursor, NamedTupleCursor
 from datetime import datetime
 import json
+import time
 
 # from dotenv import load_dotenv
 # # # Load the .env file
@@ -42,6 +43,18 @@ def do_request(url, method="GET", data={}, base_url = 'http://netbox:8080/api/pl
         return requests.delete(f'{base_url}/{url}', headers=headers)
     if method == "POST":
         return requests.post(f'{base_url}/{url}', headers=headers, json=data)
+
+def wait_for_job(job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        response = do_request(f'job/{job_id}/')
+        assert response.status_code == 200, f"Status wasnt 200 \n{response.text}"
+        job = response.json()['job']
+        assert job['status'] != 'failed', f"Job failed \n{job}"
+        if job['status'] == 'finished':
+            return job
+        time.sleep(0.5)
+    assert False, f"Job {job_id} did not finish in {timeout} seconds"
     
 
 def get_plannings():
@@ -92,6 +105,7 @@ def test_plannings(setup):
     response = do_request('planning/sync/', method="POST",data=sync_plannings)
     assert response.status_code == 200, f"Status wasnt 200 \n{response.text}"
     assert response.json()['status'] == "success"
+    wait_for_job(response.json()['job_id'])
 
     compare_plannings(sync_plannings, get_plannings())
     
@@ -104,6 +118,7 @@ def test_plannings(setup):
     response = do_request('planning/sync/', method="POST",data=disable_plannings)
     assert response.status_code == 200, f"Status wasnt 200 \n{response.text}"
     assert response.json()['status'] == "success"
+    wait_for_job(response.json()['job_id'])
 
     assert len(get_plannings()) == 0
 
@@ -157,11 +172,69 @@ def test_devices(setup):
     response = do_request('device/sync_end/', method="POST")
     assert response.status_code == 200, f"Status wasnt 200 \n{response.text}"
     assert response.json()['status'] == "success"
+    job = wait_for_job(response.json()['job_id'])
+    assert job['phase'] == "done"
+    # device/ already imported the device and the sync didn't change it
+    assert job['counts'] == {'parted': 0, 'updated': 0, 'imported': 0}, job['counts']
+    assert job['name'] == "process_import"
+
+    response = do_request('job/slurpit-unknown/')
+    assert response.status_code == 404, f"Status wasnt 404 \n{response.text}"
 
     compare_devices(devices, get_devices())
     # Check if Platform & Manufacturer & Device Type are all created on slurpit.
     check_onboard_device(devices[0])
 
+def test_device_delta(setup):
+    response = do_request('device/sync_delta/')
+    assert response.status_code == 200, f"Status wasnt 200 \n{response.text}"
+    assert response.json()['changeddate'] == "2024-04-04 16:27:23"
+
+    devices = [{
+        "id": 101,
+        "hostname": "slurpit-delta",
+        "fqdn": "slurpit-delta",
+        "ipv4": "192.168.100.101",
+        "device_os": "slurpit",
+        "device_type": "slurpit",
+        "brand": "slurpit",
+        "disabled": "0",
+        "createddate": "2024-05-01 10:00:00",
+        "changeddate": "2024-05-01 10:00:00"
+    }]
+    response = do_request('device/sync_delta/', method="POST", data={'devices': devices, 'deleted': []})
+    assert response.status_code == 200, f"Status wasnt 200 \n{response.text}"
+    job = wait_for_job(response.json()['job_id'])
+    assert job['counts']['imported'] == 1
+    check_onboard_device(devices[0])
+
+    response = do_request('device/sync_delta/', method="POST", data={'devices': [], 'deleted': [101]})
+    assert response.status_code == 200, f"Status wasnt 200 \n{response.text}"
+    job = wait_for_job(response.json()['job_id'])
+    assert job['counts']['parted'] == 1
+
+    response = do_request('device/sync_delta/', method="POST", data=devices)
+    assert response.status_code == 400, f"Status wasnt 400 \n{response.text}"
+    response = do_request('device/sync_delta/', method="POST", data={'devices': [], 'deleted': ['slurpit']})
+    assert response.status_code == 400, f"Status wasnt 400 \n{response.text}"
+
+    # A delta sent while a full import runs is staged and applied under the same lock, so it isn't lost
+    devices[0]['changeddate'] = "2024-05-02 10:00:00"
+    full = do_request('device/sync_end/', method="POST")
+    assert full.status_code == 200, f"Status wasnt 200 \n{full.text}"
+    delta = do_request('device/sync_delta/', method="POST", data={'devices': devices, 'deleted': []})
+    assert delta.status_code == 200, f"Status wasnt 200 \n{delta.text}"
+    wait_for_job(full.json()['job_id'])
+    wait_for_job(delta.json()['job_id'])
+    check_onboard_device(devices[0])
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT changeddate FROM slurpit_netbox_slurpitimporteddevice WHERE slurpit_id=%s", (101,))
+        assert cur.fetchone()[0].strftime('%Y-%m-%d') == "2024-05-02", "The delta wasn't applied"
+
+    # The watermark follows the applied changes, the next delta starts from there
+    response = do_request('device/sync_delta/')
+    assert response.json()['changeddate'] == "2024-05-02 10:00:00"
+
 def check_onboard_device(device):
     with connection() as conn, conn.cursor() as cur:
         cur.execute(
@@ -352,6 +425,11 @@ def test_ipams(setup):
 
     check_reconcile_sync_ipam(valid_ipams)
 
+    # The diff against NetBox is stored with the reconcile row at ingestion
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute('SELECT reconcile_action FROM slurpit_netbox_slurpitinitipaddress WHERE address=%s', ('192.168.200.200/24',))
+        assert cur.fetchone()[0] == 'create', "Reconcile action wasnt stored with the row"
+
 def get_planning_from_id(id):
     with connection() as conn, conn.cursor() as cur:
         cur = conn.cursor(cursor_factory=NamedTupleCursor)
@@ -364,7 +442,8 @@ def compare_snapshots(content, device_name, planning_id):
         cur.execute("SELECT * FROM slurpit_netbox_slurpitsnapshot WHERE hostname=%s and planning_id=%s and result_type='planning_result'", (device_name,planning_id))
         planning_result = cur.fetchone()
         assert planning_result != None, "Imported Planning result is not exsited"
-        assert planning_result.content == content, "Imported Planning result is different with Original Data"
+        assert planning_result.row_count == 1, "Imported Planning result wasnt packed into one snapshot"
+        assert dict(zip(planning_result.columns, planning_result.content[0])) == content, "Imported Planning result is different with Original Data"
     pass
 
 def test_planning_snapshots(setup):
@@ -378,6 +457,7 @@ def test_planning_snapshots(setup):
     response = do_request('planning/sync/', method="POST",data=sync_plannings)
     assert response.status_code == 200, f"Status wasnt 200 \n{response.text}"
     assert response.json()['status'] == "success"
+    wait_for_job(response.json()['job_id'])
 
     compare_plannings(sync_plannings, get_plannings())
     
@@ -417,6 +497,32 @@ def test_planning_snapshots(setup):
     assert response.json()['status'] == "success"
 
     compare_snapshots(content, 'slurpit', 10)
+    stored = get_snapshot_version('slurpit', 10)
+
+    # Results pushed in parts are added to the snapshot of the device
+    response = do_request('planning-data/', method="POST",data=[{
+        'hostname': 'slurpit',
+        'planning_id': '10',
+        'content': {'planning_result': {'name': 'other', 'role': 'other'}, 'template_result': ''},
+        'result_type': 'planning_result'
+    }])
+    assert response.status_code == 200, f"Status wasnt 200 \n{response.text}"
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT row_count FROM slurpit_netbox_slurpitsnapshot WHERE hostname=%s and planning_id=%s and result_type='planning_result'", ('slurpit', 10))
+        assert cur.fetchone()[0] == 2, "Pushed results weren't added to the stored snapshot"
+
+    # The snapshot is updated in place, the device tab keys its cached pages on the row and last_updated
+    pushed = get_snapshot_version('slurpit', 10)
+    assert pushed[0] == stored[0], "The snapshot row was replaced instead of updated"
+    assert pushed[1] > stored[1], "last_updated didn't move, the device tab would show the cached rows"
+
+    response = do_request('planning-data/', method="POST", data=[{'hostname': 'slurpit', 'planning_id': '10', 'content': {'planning_result': 'slurpit', 'template_result': ''}}])
+    assert response.status_code == 400, f"Status wasnt 400 \n{response.text}"
+
+def get_snapshot_version(hostname, planning_id):
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id, last_updated FROM slurpit_netbox_slurpitsnapshot WHERE hostname=%s and planning_id=%s and result_type='planning_result'", (hostname, planning_id))
+        return cur.fetchone()
 
 def compare_mapping_fields():
 
@@ -432,6 +538,32 @@ def test_data_mapping(setup):
     # Test Initial Mapping Fields
     compare_mapping_fields()
 
+    # The NetBox devices are exported through the mapping
+    add_device_to_netbox()
+    response = do_request('netbox-device/all/')
+    assert response.status_code == 200, f"Device export is Failed. Status wasnt 200 \n{response.text}"
+    rows = response.json()['data']
+    assert any(row['hostname'] == "Slurp'it" for row in rows), "Exported devices are missing the NetBox device"
+    assert all(set(row) == {'hostname', 'fqdn', 'ipv4', 'device_os', 'device_type'} for row in rows)
+
+    # Keyset pages and NDJSON return the same devices
+    paged = []
+    cursor = None
+    while True:
+        response = do_request(f'netbox-device/all/?limit=1{"" if cursor is None else f"&after={cursor}"}')
+        assert response.status_code == 200, f"Device page is Failed. Status wasnt 200 \n{response.text}"
+        paged.extend(response.json()['data'])
+        cursor = response.json()['next']
+        if cursor is None:
+            break
+    assert paged == rows
+
+    response = do_request('netbox-device/all/?format=ndjson')
+    assert [json.loads(line) for line in response.text.splitlines()] == rows
+
+    response = do_request('netbox-device/all/?last_updated__gte=2999-01-01T00:00:00Z&limit=10')
+    assert response.json() == {'data': [], 'next': None}
+
 def add_device_to_netbox():
     try:
         with connection() as conn, conn.cursor() as cur:
@@ -588,4 +720,20 @@ def test_vlan(setup):
     ]
     response = do_request('vlan/', method="POST", data=valid_vlans)
     assert response.status_code == 200, f"VLAN import is Failed. Status wasnt 200 \n{response.json()}"
-    check_reconcile_sync_vlan(valid_vlans)
\ No newline at end of file
+    check_reconcile_sync_vlan(valid_vlans)
+
+    # A direct push only marks the staged VLANs of the same group stale
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            'INSERT INTO slurpit_netbox_slurpitvlan (name, status, vid, "group", enable_reconcile, reconcile_action, custom_field_data, description, comments) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)',
+            ('vlan2', "active", 2, 'slurpitvlanother', True, 'noop', json.dumps({}), '', '')
+        )
+        conn.commit()
+    set_reconcile_for_vlan(False)
+    response = do_request('vlan/', method="POST", data=[{'vlan_name': 'vlan2', 'vlan_id': 2, 'hostname': 'slurpitvlan'}])
+    assert response.status_code == 200, f"VLAN import is Failed. Status wasnt 200 \n{response.json()}"
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute('SELECT "group", reconcile_action FROM slurpit_netbox_slurpitvlan WHERE name=%s', ('vlan2',))
+        actions = dict(cur.fetchall())
+        assert actions['slurpitvlan'] is None, "The staged VLAN of the pushed group wasn't marked stale"
+        assert actions['slurpitvlanother'] == 'noop', "A staged VLAN of another group was marked stale"